@@ -1,8 +1,11 @@
 import json
 import os
 import re
+import textwrap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Union
 
 CANONICAL_KEYS = {
     "make": "company",
@@ -26,6 +29,61 @@ CANONICAL_KEYS = {
     "fuel": "fuel",
 }
 
+# Files handed to each worker per task in parallel batch validation.
+DEFAULT_CHUNK_SIZE = 64
+
+# Version of the parsing/validation rules. Bump it whenever they change what a file parses to or which
+# files are valid: cached validation results and stored CarSpec rows of other versions are recomputed.
+CHECKER_VERSION = "1"
+
+
+# Characters str.splitlines() treats as line boundaries.
+_LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+# One "Key: value" pair per line; the key is everything up to the first colon.
+_KV_LINE_RE = re.compile(rf"(?:\A|(?<=[{_LINE_BREAKS}]))\s*([^:\s][^:{_LINE_BREAKS}]*):([^{_LINE_BREAKS}]*)")
+
+# Ranges ("110-320"), approximations ("~300") and units ("km/h") are kept as text.
+_RANGE_OR_UNIT_RE = re.compile(r"[-~–/]|[a-zA-Z]")
+_INT_JUNK_RE = re.compile(r"[^0-9+-]")
+_FLOAT_JUNK_RE = re.compile(r"[^0-9+\-.]")
+
+
+def _numeric_converter(cast, junk_re, reject_re=_RANGE_OR_UNIT_RE):
+    """Build a converter that casts a stripped value, falling back to the original text."""
+
+    def convert(value: str) -> Union[int, float, str, None]:
+        if value == "":
+            return None
+        if reject_re is not None and reject_re.search(value):
+            return value
+        cleaned = junk_re.sub("", value)
+        if cleaned == "":
+            return value
+        try:
+            return cast(cleaned)
+        except ValueError:
+            return value
+
+    return convert
+
+
+_parse_int = _numeric_converter(int, _INT_JUNK_RE)
+_parse_float = _numeric_converter(float, _FLOAT_JUNK_RE)
+# Prices are cleaned even when they carry a currency symbol or code ("€35,000", "USD 20000").
+_parse_price = _numeric_converter(float, _FLOAT_JUNK_RE, reject_re=None)
+
+# Canonical fields without an entry here are stored as the raw string.
+FIELD_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "cc": _parse_int,
+    "hp": _parse_int,
+    "seats": _parse_int,
+    "year": _parse_int,
+    "max_speed_kmh": _parse_float,
+    "acceleration_sec": _parse_float,
+    "price": _parse_price,
+}
+
 
 class CarFileChecker:
     """Parses and validates a simple key:value car spec file used in `car_examples`.
@@ -59,120 +117,19 @@ class CarFileChecker:
         self._validate()
 
     def _parse(self):
-        lines = self.text.strip().splitlines()
-        if not lines:
+        if not self.text.strip():
             self.errors.append("El archivo está vacío.")
             return
 
-        kv_regex = re.compile(r"^\s*([^:]+):\s*(.*)$")
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            m = kv_regex.match(line)
-            if not m:
-                continue
+        raw = self.parsed_data["raw"]
+        for m in _KV_LINE_RE.finditer(self.text):
             key_raw = m.group(1).strip()
             value_raw = m.group(2).strip()
-            key_norm = key_raw.lower()
-            canon = CANONICAL_KEYS.get(key_norm)
-            self.parsed_data["raw"][key_raw] = value_raw
+            raw[key_raw] = value_raw
+            canon = CANONICAL_KEYS.get(key_raw.lower())
             if canon:
-                if canon == "cc":
-                    self.parsed_data[canon] = self._parse_int(value_raw, field="cc")
-                elif canon == "hp":
-                    self.parsed_data[canon] = self._parse_int(value_raw, field="hp")
-                elif canon == "max_speed_kmh":
-                    self.parsed_data[canon] = self._parse_speed(value_raw)
-                elif canon == "acceleration_sec":
-                    self.parsed_data[canon] = self._parse_acceleration(value_raw)
-                elif canon == "price":
-                    self.parsed_data[canon] = self._parse_price(value_raw)
-                elif canon == "seats":
-                    self.parsed_data[canon] = self._parse_int(value_raw, field="seats")
-                elif canon == "year":
-                    self.parsed_data[canon] = self._parse_int(value_raw, field="year")
-                elif canon == "weight_kg":
-                    self.parsed_data[canon] = self._parse_float(value_raw, field="weight_kg")
-                else:
-                    self.parsed_data[canon] = value_raw
-            else:
-                pass
-
-    def _parse_int(self, s: str, field: str) -> Optional[int]:
-        s_strip = (s or "").strip()
-        if s_strip == "":
-            return None
-        if re.search(r"[-~–/]|[a-zA-Z]", s_strip):
-            return s_strip
-        cleaned = re.sub(r"[^0-9+-]", "", s_strip)
-        if cleaned == "":
-            return s_strip
-        try:
-            return int(cleaned)
-        except Exception:
-            return s_strip
-
-    def _parse_float(self, s: str, field: str) -> Optional[float]:
-        try:
-            cleaned = re.sub(r"[^0-9+\-.]", "", s)
-            if cleaned == "":
-                self.errors.append(f"Campo {field} vacío o no numérico: '{s}'")
-                return None
-            return float(cleaned)
-        except Exception:
-            self.errors.append(f"No se pudo parsear float para {field}: '{s}'")
-            return None
-
-    def _parse_speed(self, s: str) -> Optional[float]:
-        s_strip = (s or "").strip()
-        if s_strip == "":
-            return None
-        if re.search(r"[-~–/]|[a-zA-Z]", s_strip):
-            return s_strip
-        cleaned = re.sub(r"[^0-9+\-.]", "", s_strip)
-        if cleaned == "":
-            return s_strip
-        try:
-            return float(cleaned)
-        except Exception:
-            return s_strip
-
-    def _parse_acceleration(self, s: str) -> Optional[float]:
-        s_strip = (s or "").strip()
-        if s_strip == "":
-            return None
-        if re.search(r"[-~–/]|[a-zA-Z]", s_strip):
-            return s_strip
-        cleaned = re.sub(r"[^0-9+\-.]", "", s_strip)
-        if cleaned == "":
-            return s_strip
-        try:
-            return float(cleaned)
-        except Exception:
-            return s_strip
-
-    def _parse_price(self, s: str) -> Optional[float]:
-        s_strip = (s or "").strip()
-        if s_strip == "":
-            return None
-        if re.search(r"[-~–/]|[a-zA-Z]", s_strip):
-            cleaned = re.sub(r"[,€$£\s]", "", s_strip)
-            cleaned = re.sub(r"[^0-9+\-.]", "", cleaned)
-            if cleaned == "":
-                return s_strip
-            try:
-                return float(cleaned)
-            except Exception:
-                return s_strip
-        cleaned = re.sub(r"[,€$£\s]", "", s_strip)
-        cleaned = re.sub(r"[^0-9+\-.]", "", cleaned)
-        if cleaned == "":
-            return s_strip
-        try:
-            return float(cleaned)
-        except Exception:
-            return s_strip
+                converter = FIELD_CONVERTERS.get(canon)
+                self.parsed_data[canon] = converter(value_raw) if converter else value_raw
 
     def _validate(self):
         # required ields
@@ -198,12 +155,6 @@ class CarFileChecker:
             if not (1 <= seats <= 9):
                 self.errors.append(f"Valor de Seats improbable: {seats}")
 
-        year = self.parsed_data.get("year")
-        if isinstance(year, int):
-            current_year = datetime.utcnow().year
-            if not (1886 <= year <= current_year + 1):
-                self.errors.append(f"Valor de Year improbable: {year}")
-
         max_speed = self.parsed_data.get("max_speed_kmh")
         if isinstance(max_speed, (int, float)):
             if not (1 <= float(max_speed) <= 500):
@@ -214,6 +165,11 @@ class CarFileChecker:
             if not (0.5 <= float(accel) <= 60):
                 self.errors.append(f"Valor de Acceleration improbable: {accel}")
 
+        # Last, so that `with_current_year_error` can re-derive it on stored results
+        error = year_error(self.parsed_data.get("year"))
+        if error:
+            self.errors.append(error)
+
     def is_valid(self) -> bool:
         return len(self.errors) == 0
 
@@ -224,30 +180,141 @@ class CarFileChecker:
         return self.errors
 
 
-def process_car_examples_dir(dir_path: str, output_json: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Process all .car files in a directory, return list of results and optionally write JSON."""
-    results = []
+_YEAR_ERROR = "Valor de Year improbable:"
+
+
+def year_error(year) -> Optional[str]:
+    """Error for an implausible model year. Its upper bound moves every January."""
+    if isinstance(year, int) and not (1886 <= year <= datetime.utcnow().year + 1):
+        return f"{_YEAR_ERROR} {year}"
+    return None
+
+
+def with_current_year_error(errors: List[str], year) -> List[str]:
+    """Errors stored in an earlier year, with the `Year` error as the checker would report it today."""
+    errors = [error for error in errors if not error.startswith(_YEAR_ERROR)]
+    error = year_error(year)
+    return errors + [error] if error else errors
+
+
+def checker_version() -> str:
+    """
+    Version used to key cached results. Includes the year because the `Year` bound depends on it; stored
+    CarSpec rows use CHECKER_VERSION alone and re-derive that error with `with_current_year_error`.
+    """
+    return f"{CHECKER_VERSION}-{datetime.utcnow().year}"
+
+
+def check_car_file(file_path: str) -> Dict[str, Any]:
+    """Read and validate a single .car file, returning the same result dict used for batch runs."""
+    fname = os.path.basename(file_path)
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except Exception as e:
+        return {"file": fname, "error": str(e)}
+    checker = CarFileChecker(text)
+    return {
+        "file": fname,
+        "valid": checker.is_valid(),
+        "data": checker.get_parsed_data(),
+        "errors": checker.get_errors(),
+    }
+
+
+def list_car_files(dir_path: str) -> List[str]:
+    """Return the paths of the .car files in a directory, sorted by filename."""
     if not os.path.isdir(dir_path):
         raise FileNotFoundError(f"Directorio no encontrado: {dir_path}")
-    for fname in sorted(os.listdir(dir_path)):
-        if not fname.lower().endswith(".car"):
-            continue
-        fpath = os.path.join(dir_path, fname)
-        try:
-            with open(fpath, "r", encoding="utf-8") as f:
-                text = f.read()
-        except Exception as e:
-            results.append({"file": fname, "error": str(e)})
-            continue
-        checker = CarFileChecker(text)
-        results.append(
-            {
-                "file": fname,
-                "valid": checker.is_valid(),
-                "data": checker.get_parsed_data(),
-                "errors": checker.get_errors(),
-            }
-        )
+    return [os.path.join(dir_path, fname) for fname in sorted(os.listdir(dir_path)) if fname.lower().endswith(".car")]
+
+
+def _check_car_files(paths: List[str]) -> List[Dict[str, Any]]:
+    return [check_car_file(path) for path in paths]
+
+
+def iter_car_examples_dir(
+    dir_path: str, workers: Optional[int] = 1, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """Yield the result of every .car file in a directory, in filename order, as soon as it is ready.
+
+    With ``workers`` greater than 1 (or 0 or ``None`` for one per CPU) files are checked in a
+    process pool, ``chunk_size`` files per task. Only a few chunks per worker are in flight
+    at any time, so memory does not grow with the size of the directory.
+    """
+    if workers is not None and workers < 0:
+        raise ValueError(f"Número de procesos no válido: {workers}")
+    workers = workers or os.cpu_count() or 1
+    paths = list_car_files(dir_path)
+    if workers == 1 or len(paths) <= 1:
+        for path in paths:
+            yield check_car_file(path)
+        return
+
+    chunk_size = max(1, chunk_size)
+    max_pending = 2 * workers
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(paths), chunk_size):
+            pending.append(executor.submit(_check_car_files, paths[start : start + chunk_size]))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class NDJSONResultWriter:
+    """Writes one JSON document per line and flushes after each, so output can be tailed."""
+
+    def __init__(self, out: TextIO):
+        self.out = out
+
+    def write(self, result: Dict[str, Any]):
+        self.out.write(json.dumps(result, ensure_ascii=False))
+        self.out.write("\n")
+        self.out.flush()
+
+    def close(self):
+        self.out.flush()
+
+
+class JSONArrayResultWriter:
+    """Writes results as an indented JSON array incrementally, matching `json.dump(results, indent=2)`."""
+
+    def __init__(self, out: TextIO):
+        self.out = out
+        self.count = 0
+
+    def write(self, result: Dict[str, Any]):
+        self.out.write("[\n" if self.count == 0 else ",\n")
+        self.out.write(textwrap.indent(json.dumps(result, ensure_ascii=False, indent=2), "  "))
+        self.count += 1
+
+    def close(self):
+        self.out.write("\n]" if self.count else "[]")
+        self.out.flush()
+
+
+RESULT_WRITERS = {"json": JSONArrayResultWriter, "ndjson": NDJSONResultWriter}
+
+
+def write_results(results: Iterable[Dict[str, Any]], out: TextIO, fmt: str = "ndjson") -> Iterator[Dict[str, Any]]:
+    """Write each result to ``out`` as it arrives and yield it back, keeping nothing in memory."""
+    writer = RESULT_WRITERS[fmt](out)
+    for result in results:
+        writer.write(result)
+        yield result
+    writer.close()
+
+
+def process_car_examples_dir(
+    dir_path: str,
+    output_json: Optional[str] = None,
+    workers: Optional[int] = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> List[Dict[str, Any]]:
+    """Process all .car files in a directory, return list of results and optionally write JSON."""
+    results = list(iter_car_examples_dir(dir_path, workers=workers, chunk_size=chunk_size))
     if output_json:
         try:
             with open(output_json, "w", encoding="utf-8") as out:
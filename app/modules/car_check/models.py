@@ -6,3 +6,58 @@ class CarCheck(db.Model):
 
     def __repr__(self):
         return f"CarCheck<{self.id}>"
+
+
+class CarSpec(db.Model):
+    """Parsed fields of a CAR file, stored once at upload time so specs can be queried without reading files."""
+
+    __tablename__ = "car_spec"
+    id = db.Column(db.Integer, primary_key=True)
+    hubfile_id = db.Column(db.Integer, db.ForeignKey("file.id"), unique=True, nullable=False)
+    feature_model_id = db.Column(db.Integer, db.ForeignKey("feature_model.id"), nullable=False, index=True)
+
+    company = db.Column(db.String(120), index=True)
+    model = db.Column(db.String(120), index=True)
+    engine = db.Column(db.String(120))
+    fuel = db.Column(db.String(120), index=True)
+    battery_capacity = db.Column(db.String(120))
+
+    # Numeric columns are NULL when the file gives a range or approximation ("110-320", "~300");
+    # the original text is always available in `data`.
+    cc = db.Column(db.Integer, index=True)
+    hp = db.Column(db.Integer, index=True)
+    seats = db.Column(db.Integer, index=True)
+    year = db.Column(db.Integer, index=True)
+    max_speed_kmh = db.Column(db.Float, index=True)
+    acceleration_sec = db.Column(db.Float, index=True)
+    price = db.Column(db.Float, index=True)
+
+    valid = db.Column(db.Boolean, nullable=False)
+    errors = db.Column(db.JSON, nullable=False)
+    data = db.Column(db.JSON, nullable=False)
+    checker_version = db.Column(db.String(32), nullable=False)
+
+    hubfile = db.relationship("Hubfile", backref=db.backref("car_spec", uselist=False, cascade="all, delete-orphan"))
+    feature_model = db.relationship("FeatureModel", backref=db.backref("car_specs", lazy=True))
+
+    def to_dict(self):
+        return {
+            "hubfile_id": self.hubfile_id,
+            "feature_model_id": self.feature_model_id,
+            "company": self.company,
+            "model": self.model,
+            "engine": self.engine,
+            "fuel": self.fuel,
+            "battery_capacity": self.battery_capacity,
+            "cc": self.cc,
+            "hp": self.hp,
+            "seats": self.seats,
+            "year": self.year,
+            "max_speed_kmh": self.max_speed_kmh,
+            "acceleration_sec": self.acceleration_sec,
+            "price": self.price,
+            "valid": self.valid,
+        }
+
+    def __repr__(self):
+        return f"CarSpec<{self.id}>"
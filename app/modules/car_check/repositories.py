@@ -1,7 +1,33 @@
-from app.modules.car_check.models import CarCheck
+from typing import List
+
+from app.modules.car_check.models import CarCheck, CarSpec
+from app.modules.hubfile.models import Hubfile
 from core.repositories.BaseRepository import BaseRepository
 
 
 class CarCheckRepository(BaseRepository):
     def __init__(self):
         super().__init__(CarCheck)
+
+
+class CarSpecRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(CarSpec)
+
+    def get_hubfiles_without_spec(self, limit: int, after_id: int = 0) -> List[Hubfile]:
+        return (
+            self.session.query(Hubfile)
+            .outerjoin(CarSpec, CarSpec.hubfile_id == Hubfile.id)
+            .filter(CarSpec.id.is_(None), Hubfile.id > after_id)
+            .order_by(Hubfile.id)
+            .limit(limit)
+            .all()
+        )
+
+    def get_outdated(self, checker_version: str, limit: int, after_id: int = 0) -> List[CarSpec]:
+        return (
+            self.model.query.filter(self.model.checker_version != checker_version, self.model.id > after_id)
+            .order_by(self.model.id)
+            .limit(limit)
+            .all()
+        )
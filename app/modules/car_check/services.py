@@ -1,7 +1,198 @@
-from app.modules.car_check.repositories import CarCheckRepository
+import logging
+import os
+
+from app.modules.car_check.check_car import CHECKER_VERSION, CarFileChecker, checker_version, with_current_year_error
+from app.modules.car_check.models import CarSpec
+from app.modules.car_check.repositories import CarCheckRepository, CarSpecRepository
+from app.modules.explore.search import SearchIndexService
+from app.modules.hubfile.models import Hubfile
+from core.caching.cache import LRUCache, RedisCache, get_redis_client
 from core.services.BaseService import BaseService
 
+logger = logging.getLogger(__name__)
+
+
+class ValidationResultCache:
+    """
+    Caches CarFileChecker results by file checksum and checker version.
+
+    Results are kept in an in-process LRU and, when REDIS_URL is configured, in Redis so
+    that every gunicorn worker shares them. Changing the checker rules changes the version
+    and therefore every key, so stale results are never served.
+    """
+
+    def __init__(self, maxsize=None, redis_client=None, ttl=None):
+        maxsize = int(os.getenv("CAR_CHECK_CACHE_SIZE", "1024")) if maxsize is None else maxsize
+        ttl = int(os.getenv("CAR_CHECK_CACHE_TTL", str(7 * 24 * 3600))) if ttl is None else ttl
+        self.local = LRUCache(maxsize=maxsize)
+        self.remote = RedisCache(redis_client, prefix="car_check", ttl=ttl) if redis_client is not None else None
+
+    @staticmethod
+    def key(checksum: str) -> str:
+        return f"{checker_version()}:{checksum}"
+
+    def get(self, checksum: str):
+        key = self.key(checksum)
+        result = self.local.get(key)
+        if result is None and self.remote is not None:
+            result = self.remote.get(key)
+            if result is not None:
+                self.local.set(key, result)
+        return result
+
+    def set(self, checksum: str, result: dict):
+        key = self.key(checksum)
+        self.local.set(key, result)
+        if self.remote is not None:
+            self.remote.set(key, result)
+
+    def clear(self):
+        self.local.clear()
+
+
+validation_cache = ValidationResultCache(redis_client=get_redis_client())
+
 
 class CarCheckService(BaseService):
-    def __init__(self):
+    def __init__(self, cache: ValidationResultCache = None):
         super().__init__(CarCheckRepository())
+        self.cache = cache or validation_cache
+
+    def check_hubfile(self, hubfile: Hubfile) -> dict:
+        """
+        Validate the CAR file of a Hubfile, reusing the cached result for its checksum when available.
+
+        Returns:
+            dict: {"valid": bool, "errors": list, "parsed_data": dict}
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        result = self.cache.get(hubfile.checksum)
+        if result is not None:
+            return result
+
+        spec = hubfile.car_spec
+        if spec is not None and spec.checker_version == CHECKER_VERSION:
+            errors = with_current_year_error(spec.errors, spec.data.get("year"))
+            result = {"valid": not errors, "errors": errors, "parsed_data": spec.data}
+        else:
+            with open(hubfile.get_path(), "r", encoding="utf-8") as f:
+                checker = CarFileChecker(f.read())
+            result = {
+                "valid": checker.is_valid(),
+                "errors": checker.get_errors(),
+                "parsed_data": checker.get_parsed_data(),
+            }
+
+        self.cache.set(hubfile.checksum, result)
+        return result
+
+
+class CarSpecService(BaseService):
+    NUMERIC_FIELDS = {
+        "cc": int,
+        "hp": int,
+        "seats": int,
+        "year": int,
+        "max_speed_kmh": float,
+        "acceleration_sec": float,
+        "price": float,
+    }
+    TEXT_FIELDS = ("company", "model", "engine", "fuel", "battery_capacity")
+
+    def __init__(self):
+        super().__init__(CarSpecRepository())
+        self.search_index_service = SearchIndexService()
+
+    def spec_fields(self, checker: CarFileChecker) -> dict:
+        """Map a checker's parsed data onto CarSpec columns."""
+        data = checker.get_parsed_data()
+        fields = {
+            "valid": checker.is_valid(),
+            "errors": checker.get_errors(),
+            "data": data,
+            "checker_version": CHECKER_VERSION,
+        }
+        for name in self.TEXT_FIELDS:
+            value = data.get(name)
+            fields[name] = str(value)[:120] if value is not None else None
+        for name, kind in self.NUMERIC_FIELDS.items():
+            value = data.get(name)
+            fields[name] = kind(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+        return fields
+
+    def parse_file(self, file_path: str) -> CarFileChecker:
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            return CarFileChecker(f.read())
+
+    def create_for_hubfile(self, hubfile: Hubfile, file_path: str = None, commit: bool = True) -> CarSpec:
+        """Parse the hubfile's CAR file (from `file_path` if it is not in its final location yet) and store it."""
+        checker = self.parse_file(file_path or hubfile.get_path())
+        return self.repository.create(
+            commit=commit,
+            hubfile_id=hubfile.id,
+            feature_model_id=hubfile.feature_model_id,
+            **self.spec_fields(checker),
+        )
+
+    def refresh(self, spec: CarSpec, commit: bool = True) -> CarSpec:
+        """Re-parse the file behind an existing spec, e.g. after the checker rules changed."""
+        for key, value in self.spec_fields(self.parse_file(spec.hubfile.get_path())).items():
+            setattr(spec, key, value)
+        if commit:
+            self.repository.session.commit()
+        return spec
+
+    def backfill(self, rebuild: bool = False, batch_size: int = 100):
+        """
+        Create specs for hubfiles that have none and, with `rebuild`, refresh specs parsed by an older checker.
+
+        Returns:
+            tuple: (created, refreshed, failed) counts.
+        """
+        created = refreshed = failed = 0
+
+        last_id = 0
+        while True:
+            hubfiles = self.repository.get_hubfiles_without_spec(batch_size, after_id=last_id)
+            if not hubfiles:
+                break
+            changed = {}
+            for hubfile in hubfiles:
+                try:
+                    self.create_for_hubfile(hubfile, commit=False)
+                    created += 1
+                    changed[hubfile.feature_model.data_set_id] = hubfile.feature_model.data_set
+                except Exception as exc:
+                    logger.warning(f"Could not parse CAR spec for {hubfile}: {exc}")
+                    failed += 1
+            last_id = hubfiles[-1].id
+            self._reindex(changed.values())
+            self.repository.session.commit()
+
+        if rebuild:
+            last_id = 0
+            while True:
+                specs = self.repository.get_outdated(CHECKER_VERSION, batch_size, after_id=last_id)
+                if not specs:
+                    break
+                changed = {}
+                for spec in specs:
+                    try:
+                        self.refresh(spec, commit=False)
+                        refreshed += 1
+                        changed[spec.feature_model.data_set_id] = spec.feature_model.data_set
+                    except Exception as exc:
+                        logger.warning(f"Could not refresh {spec}: {exc}")
+                        failed += 1
+                last_id = specs[-1].id
+                self._reindex(changed.values())
+                self.repository.session.commit()
+
+        return created, refreshed, failed
+
+    def _reindex(self, datasets):
+        # The search documents include the car specs, so they are rebuilt in the same commit
+        for dataset in datasets:
+            self.search_index_service.index_dataset(dataset, commit=False)
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for CarFileChecker.
+
+Measures how many .car files per second the checker parses and validates, using the
+bundled `car_examples`. Another version of `check_car.py` can be passed as a baseline
+to compare both implementations on the same input, e.g.:
+
+    git show <rev>:app/modules/car_check/check_car.py > /tmp/check_car_baseline.py
+    python app/modules/car_check/tests/benchmark.py --baseline /tmp/check_car_baseline.py
+"""
+
+import argparse
+import os
+import time
+from importlib.util import module_from_spec, spec_from_file_location
+
+MODULE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_EXAMPLES_DIR = os.path.abspath(os.path.join(MODULE_DIR, "..", "dataset", "car_examples"))
+
+
+def load_checker(path, name):
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_examples(dir_path):
+    texts = []
+    for fname in sorted(os.listdir(dir_path)):
+        if fname.lower().endswith(".car"):
+            with open(os.path.join(dir_path, fname), "r", encoding="utf-8") as f:
+                texts.append(f.read())
+    return texts
+
+
+def files_per_second(module, texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            checker = module.CarFileChecker(text)
+            checker.is_valid()
+    elapsed = time.perf_counter() - start
+    return (rounds * len(texts)) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CarFileChecker on the bundled car examples.")
+    parser.add_argument("--examples", default=DEFAULT_EXAMPLES_DIR, help="Directory with .car files.")
+    parser.add_argument("--rounds", type=int, default=2000, help="Times each file is checked.")
+    parser.add_argument("--baseline", help="Path to another check_car.py to compare against.")
+    args = parser.parse_args()
+
+    texts = read_examples(args.examples)
+    if not texts:
+        print(f"No .car files found in {args.examples}")
+        return
+
+    current = load_checker(os.path.join(MODULE_DIR, "check_car.py"), "check_car")
+    current_rate = files_per_second(current, texts, args.rounds)
+    print(f"Checked {len(texts)} files x {args.rounds} rounds")
+    print(f"current : {current_rate:,.0f} files/s")
+
+    if args.baseline:
+        baseline = load_checker(args.baseline, "check_car_baseline")
+        baseline_rate = files_per_second(baseline, texts, args.rounds)
+        print(f"baseline: {baseline_rate:,.0f} files/s")
+        print(f"speedup : {current_rate / baseline_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
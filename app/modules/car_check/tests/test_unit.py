@@ -3,6 +3,8 @@ import os
 from importlib.machinery import SourceFileLoader
 from unittest.mock import MagicMock, mock_open, patch
 
+import pytest
+
 
 def load_checker():
     mod_path = os.path.join(os.path.dirname(__file__), "..", "check_car.py")
@@ -82,6 +84,27 @@ def test_battery_and_fuel_and_price_parsing(tmp_path):
     assert data["price"] == 35000.0
 
 
+def test_parse_crlf_and_blank_lines():
+    mod = load_checker()
+    text = "\r\n  Company: LineCo\r\n\r\nModel: CR\r\nEngine: I4\r\nYear: 2001\r\nnot a pair\r\n"
+    checker = mod.CarFileChecker(text)
+    assert checker.is_valid()
+    data = checker.get_parsed_data()
+    assert data["company"] == "LineCo"
+    assert data["year"] == 2001
+    assert data["raw"] == {"Company": "LineCo", "Model": "CR", "Engine": "I4", "Year": "2001"}
+
+
+def test_field_converters_table():
+    mod = load_checker()
+    assert set(mod.FIELD_CONVERTERS) == {"cc", "hp", "seats", "year", "max_speed_kmh", "acceleration_sec", "price"}
+    assert mod.FIELD_CONVERTERS["hp"]("~300") == "~300"
+    assert mod.FIELD_CONVERTERS["max_speed_kmh"]("250.5") == 250.5
+    assert mod.FIELD_CONVERTERS["price"]("USD 20000") == 20000.0
+    assert mod.FIELD_CONVERTERS["price"]("20000-25000") == "20000-25000"
+    assert mod.FIELD_CONVERTERS["cc"]("") is None
+
+
 def test_process_car_examples_dir_and_output(tmp_path):
     mod = load_checker()
     d = tmp_path / "examples"
@@ -96,6 +119,49 @@ def test_process_car_examples_dir_and_output(tmp_path):
     assert isinstance(loaded, list) and len(loaded) == 2
 
 
+def test_process_car_examples_dir_parallel_keeps_filename_order(tmp_path):
+    mod = load_checker()
+    d = tmp_path / "examples"
+    d.mkdir()
+    for name in ["c.car", "a.car", "b.car", "notes.txt"]:
+        (d / name).write_text(f"Company: {name}\nModel: M\nEngine: I4\n")
+    sequential = mod.process_car_examples_dir(str(d))
+    parallel = mod.process_car_examples_dir(str(d), workers=2, chunk_size=1)
+    assert [r["file"] for r in parallel] == ["a.car", "b.car", "c.car"]
+    assert parallel == sequential
+    assert mod.process_car_examples_dir(str(d), workers=0, chunk_size=1) == sequential
+    with pytest.raises(ValueError):
+        mod.process_car_examples_dir(str(d), workers=-1)
+
+
+def test_iter_car_examples_dir_streams_ndjson(tmp_path):
+    mod = load_checker()
+    d = tmp_path / "examples"
+    d.mkdir()
+    (d / "a.car").write_text("Company: A\nModel: A1\nEngine: I4\n")
+    (d / "b.car").write_text("Model: B1\n")
+    out_path = tmp_path / "out.ndjson"
+    with open(out_path, "w", encoding="utf-8") as out:
+        results = mod.write_results(mod.iter_car_examples_dir(str(d), workers=2, chunk_size=1), out, fmt="ndjson")
+        first = next(results)
+        assert first["file"] == "a.car"
+        assert json.loads(out_path.read_text(encoding="utf-8")) == first
+        remaining = list(results)
+    lines = out_path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["file"] for line in lines] == ["a.car", "b.car"]
+    assert remaining[0]["valid"] is False
+
+
+def test_json_array_writer_matches_json_dump(tmp_path):
+    mod = load_checker()
+    results = [{"file": "a.car", "valid": True}, {"file": "b.car", "errors": ["x"]}]
+    for data in (results, []):
+        out_path = tmp_path / "out.json"
+        with open(out_path, "w", encoding="utf-8") as out:
+            list(mod.write_results(iter(data), out, fmt="json"))
+        assert out_path.read_text(encoding="utf-8") == json.dumps(data, ensure_ascii=False, indent=2)
+
+
 def test_empty_file():
     mod = load_checker()
     checker = mod.CarFileChecker("")
@@ -108,6 +174,8 @@ def test_empty_file():
 def test_check_car_valid_file(mock_hubfile_service, test_client):
     mock_hubfile = MagicMock()
     mock_hubfile.get_path.return_value = "dummy/path/car.car"
+    mock_hubfile.checksum = "valid-checksum"
+    mock_hubfile.car_spec = None
     mock_hubfile_service.return_value.get_by_id.return_value = mock_hubfile
 
     valid_content = "Company: TestCo\n" "Model: Speedster\n" "Engine: I4\n" "CC: 1998\n" "HP: 250\n"
@@ -126,6 +194,8 @@ def test_check_car_valid_file(mock_hubfile_service, test_client):
 def test_check_car_invalid_file(mock_hubfile_service, test_client):
     mock_hubfile = MagicMock()
     mock_hubfile.get_path.return_value = "dummy/path/car.car"
+    mock_hubfile.checksum = "invalid-checksum"
+    mock_hubfile.car_spec = None
     mock_hubfile_service.return_value.get_by_id.return_value = mock_hubfile
 
     invalid_content = "Model: NoMake\nEngine: I4\n"
@@ -147,3 +217,127 @@ def test_check_car_file_not_found(mock_hubfile_service, test_client):
     assert response.status_code == 404
     data = response.get_json() if hasattr(response, "get_json") else json.loads(response.data)
     assert data.get("error") == "Hubfile no encontrado"
+
+
+@patch("app.modules.car_check.routes.HubfileService")
+def test_check_car_result_is_cached_by_checksum(mock_hubfile_service, test_client):
+    mock_hubfile = MagicMock()
+    mock_hubfile.get_path.return_value = "dummy/path/car.car"
+    mock_hubfile.checksum = "cached-checksum"
+    mock_hubfile.car_spec = None
+    mock_hubfile_service.return_value.get_by_id.return_value = mock_hubfile
+
+    m_open = mock_open(read_data="Company: CacheCo\nModel: C\nEngine: I4\n")
+    with patch("builtins.open", m_open):
+        first = test_client.get("/car_check/1")
+        second = test_client.get("/car_check/1")
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert second.get_json()["parsed_data"]["company"] == "CacheCo"
+    assert m_open.call_count == 1
+
+
+def test_stored_spec_year_error_follows_the_calendar():
+    from datetime import datetime
+
+    from app.modules.car_check.check_car import CHECKER_VERSION
+    from app.modules.car_check.services import CarCheckService, ValidationResultCache
+
+    next_year = datetime.utcnow().year + 1
+    mock_hubfile = MagicMock()
+    mock_hubfile.checksum = "stored-last-year"
+    # Parsed last year, when next year's models were still implausible
+    mock_hubfile.car_spec = MagicMock(
+        checker_version=CHECKER_VERSION,
+        valid=False,
+        errors=[f"Valor de Year improbable: {next_year}"],
+        data={"company": "Y", "year": next_year},
+    )
+    service = CarCheckService(cache=ValidationResultCache(maxsize=8))
+    with patch("builtins.open", side_effect=AssertionError("the file was read again")):
+        result = service.check_hubfile(mock_hubfile)
+    assert result == {"valid": True, "errors": [], "parsed_data": {"company": "Y", "year": next_year}}
+
+    mock_hubfile.checksum = "stored-bad-year"
+    mock_hubfile.car_spec.data = {"year": 1800}
+    mock_hubfile.car_spec.errors = ["Falta 'Model'."]
+    result = service.check_hubfile(mock_hubfile)
+    assert result["errors"] == ["Falta 'Model'.", "Valor de Year improbable: 1800"] and not result["valid"]
+
+
+def test_validation_cache_is_invalidated_by_checker_version():
+    from app.modules.car_check.services import ValidationResultCache
+
+    class FakeRedis(dict):
+        def get(self, key):
+            return super().get(key)
+
+        def set(self, key, value, ex=None):
+            self[key] = value
+
+    redis_client = FakeRedis()
+    cache = ValidationResultCache(maxsize=8, redis_client=redis_client)
+    cache.set("abc", {"valid": True})
+    assert any(key.startswith("car_check:") for key in redis_client)
+
+    cache.clear()
+    assert cache.get("abc") == {"valid": True}
+
+    with patch("app.modules.car_check.services.checker_version", return_value="new-rules"):
+        assert cache.get("abc") is None
+
+
+def _create_hubfile(name, checksum):
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+    from app.modules.featuremodel.models import FeatureModel, FMMetaData
+    from app.modules.hubfile.models import Hubfile
+
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="Specs", description="Specs", publication_type=PublicationType.NONE)
+    fm_meta = FMMetaData(car_filename=name, title=name, description=name, publication_type=PublicationType.NONE)
+    db.session.add_all([meta, fm_meta])
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+    fm = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+    db.session.add(fm)
+    db.session.flush()
+    hubfile = Hubfile(name=name, checksum=checksum, size=1, feature_model_id=fm.id)
+    db.session.add(hubfile)
+    db.session.commit()
+    return hubfile
+
+
+def test_car_spec_stored_and_backfilled(test_client, tmp_path):
+    from app import db
+    from app.modules.car_check.models import CarSpec
+    from app.modules.car_check.services import CarSpecService
+
+    car_file = tmp_path / "spec.car"
+    car_file.write_text("Company: SpecCo\nModel: S1\nEngine: V6\nHP: 110-320\nPrice: $30000\nSeats: 4\n")
+
+    service = CarSpecService()
+    hubfile = _create_hubfile("spec.car", "spec-checksum")
+    spec = service.create_for_hubfile(hubfile, file_path=str(car_file))
+    assert spec.company == "SpecCo" and spec.seats == 4 and spec.price == 30000.0
+    assert spec.hp is None and spec.data["hp"] == "110-320"
+    assert hubfile.car_spec is spec
+
+    other = _create_hubfile("other.car", "other-checksum")
+    with patch("app.modules.hubfile.models.Hubfile.get_path", return_value=str(car_file)):
+        created, refreshed, failed = service.backfill(batch_size=1)
+    assert (created, refreshed, failed) == (1, 0, 0)
+    assert CarSpec.query.filter_by(hubfile_id=other.id, company="SpecCo").count() == 1
+    # The search document of the dataset includes the new spec
+    assert "specco" in other.feature_model.data_set.search_document.content
+
+    spec.checker_version = "old"
+    db.session.commit()
+    car_file.write_text("Company: RebuiltCo\nModel: S1\nEngine: V6\n")
+    with patch("app.modules.hubfile.models.Hubfile.get_path", return_value=str(car_file)):
+        assert service.backfill(rebuild=True, batch_size=1) == (0, 1, 0)
+    assert spec.company == "RebuiltCo"
+    assert "rebuiltco" in hubfile.feature_model.data_set.search_document.content
@@ -70,10 +70,16 @@ class DataSet(db.Model):
 
     ds_meta_data_id = db.Column(db.Integer, db.ForeignKey("ds_meta_data.id"), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Stored file aggregates, kept up to date by DataSetService and `rosemary dataset:aggregates`
+    files_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total_size_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
 
     ds_meta_data = db.relationship("DSMetaData", backref=db.backref("data_set", uselist=False))
     feature_models = db.relationship("FeatureModel", backref="data_set", lazy=True, cascade="all, delete")
 
+    # Explore pages through datasets by (created_at, id)
+    __table_args__ = (db.Index("ix_data_set_created_at_id", "created_at", "id"),)
+
     def name(self):
         return self.ds_meta_data.title
 
@@ -91,10 +97,10 @@ class DataSet(db.Model):
         return f"https://zenodo.org/record/{self.ds_meta_data.deposition_id}" if self.ds_meta_data.dataset_doi else None
 
     def get_files_count(self):
-        return sum(len(fm.files) for fm in self.feature_models)
+        return self.files_count
 
     def get_file_total_size(self):
-        return sum(file.size for fm in self.feature_models for file in fm.files)
+        return self.total_size_bytes
 
     def get_file_total_size_for_human(self):
         from app.modules.dataset.services import SizeService
@@ -106,8 +112,11 @@ class DataSet(db.Model):
 
         return DataSetService().get_carhub_doi(self)
 
-    def to_dict(self):
-        return {
+    def to_dict(self, include_files=True):
+        from app.modules.dataset.services import SizeService
+
+        size_service = SizeService()
+        data = {
             "title": self.ds_meta_data.title,
             "id": self.id,
             "created_at": self.created_at,
@@ -121,23 +130,38 @@ class DataSet(db.Model):
             "url": self.get_carhub_doi(),
             "download": f'{request.host_url.rstrip("/")}/dataset/download/{self.id}',
             "zenodo": self.get_zenodo_url(),
-            "files": [file.to_dict() for fm in self.feature_models for file in fm.files],
-            "files_count": self.get_files_count(),
-            "total_size_in_bytes": self.get_file_total_size(),
-            "total_size_in_human_format": self.get_file_total_size_for_human(),
+            "files_count": self.files_count,
+            "total_size_in_bytes": self.total_size_bytes,
+            "total_size_in_human_format": size_service.get_human_readable_size(self.total_size_bytes),
         }
+        if include_files:
+            data["files"] = [file.to_dict(size_service) for file in self.files()]
+        return data
 
     def __repr__(self):
         return f"DataSet<{self.id}>"
 
 
-class DSDownloadRecord(db.Model):
+class RecordUserKeyMixin:
+    """
+    View and download records are unique per (object, cookie, user_key). user_key is user_id with anonymous
+    (NULL) as 0, so that the unique index also covers anonymous records, which are most of them.
+    """
+
+    user_key = db.Column(db.Integer, db.Computed("coalesce(user_id, 0)", persisted=True))
+
+
+class DSDownloadRecord(RecordUserKeyMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id"))
     download_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     download_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
 
+    __table_args__ = (
+        db.Index("uq_ds_download_record_dataset_cookie_user", "dataset_id", "download_cookie", "user_key", unique=True),
+    )
+
     def __repr__(self):
         return (
             f"<Download id={self.id} "
@@ -147,13 +171,17 @@ class DSDownloadRecord(db.Model):
         )
 
 
-class DSViewRecord(db.Model):
+class DSViewRecord(RecordUserKeyMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id"))
     view_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     view_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
 
+    __table_args__ = (
+        db.Index("uq_ds_view_record_dataset_cookie_user", "dataset_id", "view_cookie", "user_key", unique=True),
+    )
+
     def __repr__(self):
         return f"<View id={self.id} dataset_id={self.dataset_id} date={self.view_date} cookie={self.view_cookie}>"
 
@@ -3,9 +3,12 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from flask_login import current_user
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, select, update
+from sqlalchemy.orm import selectinload
 
 from app.modules.dataset.models import Author, DataSet, DOIMapping, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import Hubfile
 from core.repositories.BaseRepository import BaseRepository
 
 logger = logging.getLogger(__name__)
@@ -61,9 +64,35 @@ class DataSetRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
 
+    @staticmethod
+    def with_details(query):
+        """
+        Eager-load what the dataset lists and `DataSet.to_dict(include_files=False)` read (metadata and
+        authors), with one extra SELECT per relationship for the whole page instead of one per dataset.
+        File counts and sizes are stored on the dataset, so the file table is not read at all.
+        """
+        return query.options(selectinload(DataSet.ds_meta_data).selectinload(DSMetaData.authors))
+
+    def refresh_file_aggregates(self, dataset_ids=None) -> int:
+        """Recompute the stored file count and total size of the given datasets (all when None)."""
+        files = (
+            select(Hubfile.id, Hubfile.size)
+            .join(FeatureModel, Hubfile.feature_model_id == FeatureModel.id)
+            .where(FeatureModel.data_set_id == DataSet.id)
+        )
+        statement = update(DataSet).values(
+            files_count=files.with_only_columns(func.count(Hubfile.id)).scalar_subquery(),
+            total_size_bytes=files.with_only_columns(func.coalesce(func.sum(Hubfile.size), 0)).scalar_subquery(),
+        )
+        if dataset_ids is not None:
+            statement = statement.where(DataSet.id.in_(dataset_ids))
+        result = self.session.execute(statement.execution_options(synchronize_session=False))
+        self.session.commit()
+        return result.rowcount
+
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return (
-            self.model.query.join(DSMetaData)
+            self.with_details(self.model.query.join(DSMetaData))
             .filter(DataSet.user_id == current_user_id, DSMetaData.dataset_doi.isnot(None))
             .order_by(self.model.created_at.desc())
             .all()
@@ -71,7 +100,7 @@ class DataSetRepository(BaseRepository):
 
     def get_unsynchronized(self, current_user_id: int) -> DataSet:
         return (
-            self.model.query.join(DSMetaData)
+            self.with_details(self.model.query.join(DSMetaData))
             .filter(DataSet.user_id == current_user_id, DSMetaData.dataset_doi.is_(None))
             .order_by(self.model.created_at.desc())
             .all()
@@ -92,7 +121,7 @@ class DataSetRepository(BaseRepository):
 
     def latest_synchronized(self):
         return (
-            self.model.query.join(DSMetaData)
+            self.with_details(self.model.query.join(DSMetaData))
             .filter(DSMetaData.dataset_doi.isnot(None))
             .order_by(desc(self.model.id))
             .limit(5)
@@ -1,27 +1,37 @@
-import json
 import logging
 import os
 import shutil
-import tempfile
 import uuid
-from datetime import datetime, timezone
-from zipfile import ZipFile
 
-from flask import abort, jsonify, make_response, redirect, render_template, request, send_from_directory, url_for
+from flask import (
+    Response,
+    abort,
+    current_app,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
 from flask_login import current_user, login_required
 
 from app.modules.dataset import dataset_bp
 from app.modules.dataset.forms import DataSetForm
-from app.modules.dataset.models import DSDownloadRecord
 from app.modules.dataset.services import (
+    UPLOAD_DIGESTS_SUFFIX,
     AuthorService,
+    DataSetArchiveService,
     DataSetService,
     DOIMappingService,
-    DSDownloadRecordService,
     DSMetaDataService,
     DSViewRecordService,
+    save_upload,
 )
-from app.modules.zenodo.services import ZenodoService
+from app.modules.flamapy.services import conversion_artifact_store
+from app.modules.statistics.tracking import record_tracker
+from app.modules.zenodo.services import ZenodoSyncService
+from core.downloads.offload import send_download
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +39,9 @@ logger = logging.getLogger(__name__)
 dataset_service = DataSetService()
 author_service = AuthorService()
 dsmetadata_service = DSMetaDataService()
-zenodo_service = ZenodoService()
+zenodo_sync_service = ZenodoSyncService()
 doi_mapping_service = DOIMappingService()
+dataset_archive_service = DataSetArchiveService()
 ds_view_record_service = DSViewRecordService()
 
 
@@ -54,37 +65,17 @@ def create_dataset():
             logger.exception(f"Exception while create dataset data in local {exc}")
             return jsonify({"Exception while create dataset data in local: ": str(exc)}), 400
 
-        # send dataset as deposition to Zenodo
-        data = {}
-        try:
-            zenodo_response_json = zenodo_service.create_new_deposition(dataset)
-            response_data = json.dumps(zenodo_response_json)
-            data = json.loads(response_data)
-        except Exception as exc:
-            data = {}
-            zenodo_response_json = {}
-            logger.exception(f"Exception while create dataset data in Zenodo {exc}")
-
-        if data.get("conceptrecid"):
-            deposition_id = data.get("id")
-
-            # update dataset with deposition id in Zenodo
-            dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
-
+        if current_app.config.get("FLAMAPY_PRECOMPUTE_ON_UPLOAD"):
             try:
-                # iterate for each feature model (one feature model = one request to Zenodo)
-                for feature_model in dataset.feature_models:
-                    zenodo_service.upload_file(dataset, deposition_id, feature_model)
-
-                # publish deposition
-                zenodo_service.publish_deposition(deposition_id)
+                conversion_artifact_store.enqueue(dataset)
+            except Exception as exc:
+                logger.exception(f"Exception while queueing the conversions of dataset {dataset.id} {exc}")
 
-                # update DOI
-                deposition_doi = zenodo_service.get_doi(deposition_id)
-                dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
-            except Exception as e:
-                msg = f"it has not been possible upload feature models in Zenodo and update the DOI: {e}"
-                return jsonify({"message": msg}), 200
+        # publish the dataset on Zenodo in the background; its progress is at zenodo.sync_status
+        try:
+            zenodo_sync_service.enqueue(dataset)
+        except Exception as exc:
+            logger.exception(f"Exception while queueing dataset {dataset.id} for Zenodo {exc}")
 
         # Delete temp folder
         file_path = current_user.temp_folder()
@@ -134,7 +125,7 @@ def upload():
         new_filename = file.filename
 
     try:
-        file.save(file_path)
+        save_upload(file, file_path)
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
@@ -158,6 +149,8 @@ def delete():
 
     if os.path.exists(filepath):
         os.remove(filepath)
+        if os.path.exists(filepath + UPLOAD_DIGESTS_SUFFIX):
+            os.remove(filepath + UPLOAD_DIGESTS_SUFFIX)
         return jsonify({"message": "File deleted successfully"})
 
     return jsonify({"error": "Error: File not found"})
@@ -167,59 +160,32 @@ def delete():
 def download_dataset(dataset_id):
     dataset = dataset_service.get_or_404(dataset_id)
 
-    file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
-
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
-
-    with ZipFile(zip_path, "w") as zipf:
-        for subdir, dirs, files in os.walk(file_path):
-            for file in files:
-                full_path = os.path.join(subdir, file)
-
-                relative_path = os.path.relpath(full_path, file_path)
-
-                zipf.write(
-                    full_path,
-                    arcname=os.path.join(os.path.basename(zip_path[:-4]), relative_path),
-                )
+    cached_archive = dataset_archive_service.cached(dataset)
+    if cached_archive:
+        # Conditional requests get ETag (304) and Range (206) support, from the web server if it is offloaded
+        archive_path, archive_key = cached_archive
+        resp = send_download(archive_path, f"dataset_{dataset_id}.zip", mimetype="application/zip", etag=archive_key)
+    else:
+        # Streamed while it is generated (and cached for the next downloads, unless it is too large)
+        chunks, archive_key = dataset_archive_service.stream(dataset)
+        resp = Response(chunks, mimetype="application/zip")
+        resp.headers.set("Content-Disposition", "attachment", filename=f"dataset_{dataset_id}.zip")
+        resp.set_etag(archive_key)
+        resp.make_conditional(request)
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())  # Generate a new unique identifier if it does not exist
         # Save the cookie to the user's browser
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                f"dataset_{dataset_id}.zip",
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
-
-    # Check if the download record already exists for this cookie
-    existing_record = DSDownloadRecord.query.filter_by(
+
+    # Record the download once per cookie; written in the background, in batches
+    record_tracker.track(
+        "dataset_download",
+        dataset_id,
+        user_cookie,
         user_id=current_user.id if current_user.is_authenticated else None,
-        dataset_id=dataset_id,
-        download_cookie=user_cookie,
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        DSDownloadRecordService().create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset_id,
-            download_date=datetime.now(timezone.utc),
-            download_cookie=user_cookie,
-        )
+    )
 
     return resp
 
@@ -1,13 +1,17 @@
 import os
-import shutil
 from datetime import datetime, timezone
 
 from dotenv import load_dotenv
 
 from app.modules.auth.models import User
+from app.modules.car_check.services import CarSpecService
 from app.modules.dataset.models import Author, DataSet, DSMetaData, DSMetrics, PublicationType
+from app.modules.dataset.repositories import DataSetRepository
+from app.modules.explore.search import SearchIndexService
 from app.modules.featuremodel.models import FeatureModel, FMMetaData
 from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.services import HubfileService
+from core.hashing.digests import hash_file
 from core.seeders.BaseSeeder import BaseSeeder
 
 
@@ -99,26 +103,29 @@ class DataSetSeeder(BaseSeeder):
         ]
         seeded_feature_models = self.seed(feature_models)
 
-        # Create files, associate them with FeatureModels and copy files
+        # Create files, associate them with FeatureModels and copy their content to the blob store
         load_dotenv()
         working_dir = os.getenv("WORKING_DIR", "")
         src_folder = os.path.join(working_dir, "app", "modules", "dataset", "car_examples")
+        car_spec_service = CarSpecService()
+        hubfile_service = HubfileService()
         for i in range(12):
             file_name = f"file{i+1}.car"
             feature_model = seeded_feature_models[i]
-            dataset = next(ds for ds in seeded_datasets if ds.id == feature_model.data_set_id)
-            user_id = dataset.user_id
 
-            dest_folder = os.path.join(working_dir, "uploads", f"user_{user_id}", f"dataset_{dataset.id}")
-            os.makedirs(dest_folder, exist_ok=True)
-            shutil.copy(os.path.join(src_folder, file_name), dest_folder)
-
-            file_path = os.path.join(dest_folder, file_name)
+            src_path = os.path.join(src_folder, file_name)
+            digests = hash_file(src_path)
 
             car_file = Hubfile(
                 name=file_name,
-                checksum=f"checksum{i+1}",
-                size=os.path.getsize(file_path),
+                checksum=digests.md5,
+                sha256=digests.sha256,
+                size=digests.size,
                 feature_model_id=feature_model.id,
             )
-            self.seed([car_file])
+            seeded_car_file = self.seed([car_file])[0]
+            hubfile_service.store_blob(seeded_car_file, src_path, move=False)
+            car_spec_service.create_for_hubfile(seeded_car_file, file_path=src_path)
+
+        DataSetRepository().refresh_file_aggregates([dataset.id for dataset in seeded_datasets])
+        SearchIndexService().reindex_all()
@@ -1,13 +1,17 @@
 import hashlib
+import json
 import logging
 import os
-import shutil
+import tempfile
+import time
 import uuid
-from typing import Optional
+from typing import Iterator, List, Optional, Tuple
 
 from flask import request
+from flask_login import current_user
 
 from app.modules.auth.services import AuthenticationService
+from app.modules.car_check.services import CarSpecService
 from app.modules.dataset.models import DataSet, DSMetaData, DSViewRecord
 from app.modules.dataset.repositories import (
     AuthorRepository,
@@ -17,23 +21,44 @@ from app.modules.dataset.repositories import (
     DSMetaDataRepository,
     DSViewRecordRepository,
 )
+from app.modules.explore.search import SearchIndexService
 from app.modules.featuremodel.repositories import FeatureModelRepository, FMMetaDataRepository
 from app.modules.hubfile.repositories import (
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from app.modules.hubfile.services import HubfileService
+from app.modules.statistics.tracking import record_tracker
+from core.archives.zip_stream import COMPRESSION_METHODS, iter_zip
+from core.hashing.digests import FileDigests, hash_file, save_and_hash
 from core.services.BaseService import BaseService
 
 logger = logging.getLogger(__name__)
 
 
-def calculate_checksum_and_size(file_path):
-    file_size = os.path.getsize(file_path)
-    with open(file_path, "rb") as file:
-        content = file.read()
-        hash_md5 = hashlib.md5(content, usedforsecurity=False).hexdigest()
-        return hash_md5, file_size
+# Digests computed while a file is uploaded are kept next to it, so creating the dataset doesn't re-read it
+UPLOAD_DIGESTS_SUFFIX = ".digests.json"
+
+
+def save_upload(file_storage, file_path: str) -> FileDigests:
+    digests = save_and_hash(file_storage.stream, file_path)
+    with open(file_path + UPLOAD_DIGESTS_SUFFIX, "w") as f:
+        json.dump({**digests._asdict(), "mtime_ns": os.stat(file_path).st_mtime_ns}, f)
+    return digests
+
+
+def upload_digests(file_path: str) -> FileDigests:
+    """Digests recorded when the file was uploaded, or computed now if it has changed since (or has none)."""
+    stat = os.stat(file_path)
+    try:
+        with open(file_path + UPLOAD_DIGESTS_SUFFIX) as f:
+            stored = json.load(f)
+        if stored["size"] == stat.st_size and stored["mtime_ns"] == stat.st_mtime_ns:
+            return FileDigests(stored["md5"], stored["sha256"], stored["size"])
+    except (OSError, ValueError, KeyError):
+        pass
+    return hash_file(file_path)
 
 
 class DataSetService(BaseService):
@@ -48,19 +73,18 @@ class DataSetService(BaseService):
         self.hubfilerepository = HubfileRepository()
         self.dsviewrecord_repostory = DSViewRecordRepository()
         self.hubfileviewrecord_repository = HubfileViewRecordRepository()
+        self.car_spec_service = CarSpecService()
+        self.search_index_service = SearchIndexService()
+        self.hubfile_service = HubfileService()
 
     def move_feature_models(self, dataset: DataSet):
+        """Move the uploaded files of a new dataset into the blob store; files already stored are just dropped."""
         current_user = AuthenticationService().get_authenticated_user()
         source_dir = current_user.temp_folder()
 
-        working_dir = os.getenv("WORKING_DIR", "")
-        dest_dir = os.path.join(working_dir, "uploads", f"user_{current_user.id}", f"dataset_{dataset.id}")
-
-        os.makedirs(dest_dir, exist_ok=True)
-
         for feature_model in dataset.feature_models:
-            car_filename = feature_model.fm_meta_data.car_filename
-            shutil.move(os.path.join(source_dir, car_filename), dest_dir)
+            for file in feature_model.files:
+                self.hubfile_service.store_blob(file, os.path.join(source_dir, file.name))
 
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return self.repository.get_synchronized(current_user_id)
@@ -105,7 +129,9 @@ class DataSetService(BaseService):
                 author = self.author_repository.create(commit=False, ds_meta_data_id=dsmetadata.id, **author_data)
                 dsmetadata.authors.append(author)
 
-            dataset = self.create(commit=False, user_id=current_user.id, ds_meta_data_id=dsmetadata.id)
+            dataset = self.create(
+                commit=False, user_id=current_user.id, ds_meta_data_id=dsmetadata.id, files_count=0, total_size_bytes=0
+            )
 
             for feature_model in form.feature_models:
                 car_filename = feature_model.car_filename.data
@@ -120,12 +146,24 @@ class DataSetService(BaseService):
 
                 # associated files in feature model
                 file_path = os.path.join(current_user.temp_folder(), car_filename)
-                checksum, size = calculate_checksum_and_size(file_path)
+                digests = upload_digests(file_path)
 
                 file = self.hubfilerepository.create(
-                    commit=False, name=car_filename, checksum=checksum, size=size, feature_model_id=fm.id
+                    commit=False,
+                    name=car_filename,
+                    checksum=digests.md5,
+                    sha256=digests.sha256,
+                    size=digests.size,
+                    feature_model_id=fm.id,
                 )
                 fm.files.append(file)
+                dataset.files_count += 1
+                dataset.total_size_bytes += digests.size
+
+                # parsed car spec, stored so lookups and filters don't need to re-read the file
+                self.car_spec_service.create_for_hubfile(file, file_path=file_path, commit=False)
+
+            self.search_index_service.index_dataset(dataset, commit=False)
             self.repository.session.commit()
         except Exception as exc:
             logger.info(f"Exception creating dataset from form...: {exc}")
@@ -133,8 +171,14 @@ class DataSetService(BaseService):
             raise exc
         return dataset
 
+    def refresh_file_aggregates(self, dataset_ids=None) -> int:
+        return self.repository.refresh_file_aggregates(dataset_ids)
+
     def update_dsmetadata(self, id, **kwargs):
-        return self.dsmetadata_repository.update(id, **kwargs)
+        dsmetadata = self.dsmetadata_repository.update(id, **kwargs)
+        if dsmetadata and dsmetadata.data_set:
+            self.search_index_service.index_dataset(dsmetadata.data_set)
+        return dsmetadata
 
     def get_carhub_doi(self, dataset: DataSet) -> str:
         domain = os.getenv("DOMAIN", "localhost")
@@ -178,10 +222,10 @@ class DSViewRecordService(BaseService):
         if not user_cookie:
             user_cookie = str(uuid.uuid4())
 
-        existing_record = self.the_record_exists(dataset=dataset, user_cookie=user_cookie)
-
-        if not existing_record:
-            self.create_new_record(dataset=dataset, user_cookie=user_cookie)
+        # Written in the background, in batches, instead of a lookup and an insert per view
+        record_tracker.track(
+            "dataset_view", dataset.id, user_cookie, user_id=current_user.id if current_user.is_authenticated else None
+        )
 
         return user_cookie
 
@@ -198,6 +242,160 @@ class DOIMappingService(BaseService):
             return None
 
 
+class DataSetArchiveService:
+    """
+    ZIP archives of datasets, streamed as they are generated and cached under uploads/archives.
+
+    An archive is named after its dataset and a key derived from the checksums of the dataset files, so it is
+    built once and rebuilt only when the files change. Datasets larger than DATASET_ARCHIVE_MAX_CACHED_BYTES
+    are always streamed and never cached, and the least recently served archives are removed once the cache
+    grows over DATASET_ARCHIVE_CACHE_BYTES.
+    """
+
+    # Bump to rebuild every archive when their layout changes
+    ARCHIVE_VERSION = "1"
+    # Leftovers of interrupted builds older than this (in seconds) are removed by the garbage collector
+    PARTIAL_BUILD_TTL = 3600
+
+    def __init__(
+        self,
+        archive_dir: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        max_cached_bytes: Optional[int] = None,
+        compression: Optional[str] = None,
+    ):
+        working_dir = os.getenv("WORKING_DIR", "")
+        self.archive_dir = archive_dir or os.path.join(working_dir, "uploads", "archives")
+        if max_bytes is None:
+            max_bytes = int(os.getenv("DATASET_ARCHIVE_CACHE_BYTES", str(2 * 1024**3)))
+        self.max_bytes = max_bytes
+        if max_cached_bytes is None:
+            max_cached_bytes = int(os.getenv("DATASET_ARCHIVE_MAX_CACHED_BYTES", str(512 * 1024**2)))
+        self.max_cached_bytes = max_cached_bytes
+        self.compression = compression or os.getenv("DATASET_ARCHIVE_COMPRESSION", "deflate").lower()
+        if self.compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Unknown archive compression: {self.compression}")
+        self.hubfile_service = HubfileService()
+
+    def archive_key(self, dataset: DataSet) -> str:
+        digest = hashlib.sha256(f"{self.ARCHIVE_VERSION}\0{self.compression}\n".encode())
+        for file in sorted(dataset.files(), key=lambda file: file.name):
+            digest.update(f"{file.name}\0{file.checksum}\0{file.size}\n".encode())
+        return digest.hexdigest()[:20]
+
+    def archive_path(self, dataset: DataSet, key: str) -> str:
+        return os.path.join(self.archive_dir, f"dataset_{dataset.id}_{key}.zip")
+
+    def is_cacheable(self, dataset: DataSet) -> bool:
+        return (dataset.total_size_bytes or 0) <= self.max_cached_bytes
+
+    def entries(self, dataset: DataSet) -> List[Tuple[str, str]]:
+        """Files of the dataset as (path, name in the archive), in a stable order."""
+        entries = []
+        for file in sorted(dataset.files(), key=lambda file: file.name):
+            path = self.hubfile_service.get_path_by_hubfile(file)
+            if not os.path.exists(path):
+                logger.warning(f"File {file.id} of dataset {dataset.id} is missing from {path}")
+                continue
+            entries.append((path, os.path.join(f"dataset_{dataset.id}", file.name)))
+        return entries
+
+    def cached(self, dataset: DataSet) -> Optional[Tuple[str, str]]:
+        """Return the path and key (used as ETag) of the cached archive of the dataset, if there is one."""
+        key = self.archive_key(dataset)
+        path = self.archive_path(dataset, key)
+        try:
+            # The modification time orders archives for the garbage collector
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path, key
+
+    def get_or_build(self, dataset: DataSet) -> Tuple[str, str]:
+        """Return the path and key of the dataset archive, building it if needed."""
+        cached = self.cached(dataset)
+        if cached:
+            return cached
+        key = self.archive_key(dataset)
+        path = self.archive_path(dataset, key)
+        for _ in self._write_through(dataset, self.entries(dataset), path):
+            pass
+        return path, key
+
+    def stream(self, dataset: DataSet) -> Tuple[Iterator[bytes], str]:
+        """
+        Generate the dataset archive without waiting for it to be written anywhere, returning the chunks and
+        the archive key. Unless the dataset is too large, the chunks are also saved as its cached archive.
+        """
+        key = self.archive_key(dataset)
+        # Resolved now: the generator runs after the request (and its database session) has ended
+        entries = self.entries(dataset)
+        if not self.is_cacheable(dataset):
+            return iter_zip(entries, self.compression), key
+        return self._write_through(dataset, entries, self.archive_path(dataset, key)), key
+
+    def _write_through(self, dataset: DataSet, entries: List[Tuple[str, str]], path: str) -> Iterator[bytes]:
+        # Written next to its final name and renamed, so concurrent downloads never see a partial archive
+        os.makedirs(self.archive_dir, exist_ok=True)
+        prefix = f"dataset_{dataset.id}_"
+        fd, partial_path = tempfile.mkstemp(dir=self.archive_dir, prefix=prefix, suffix=".part")
+        completed = False
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter_zip(entries, self.compression):
+                    out.write(chunk)
+                    yield chunk
+            os.replace(partial_path, path)
+            completed = True
+        finally:
+            # Also reached when the client disconnects and the server closes the generator
+            if not completed:
+                self._remove(partial_path)
+        logger.info(f"Built archive {path} ({os.path.getsize(path)} bytes)")
+        self.remove_stale(prefix, keep=path)
+        self.collect_garbage(keep=path)
+
+    def remove_stale(self, prefix: str, keep: str):
+        for name in os.listdir(self.archive_dir):
+            path = os.path.join(self.archive_dir, name)
+            if name.startswith(prefix) and name.endswith(".zip") and path != keep:
+                self._remove(path)
+
+    def collect_garbage(self, keep: Optional[str] = None) -> int:
+        """Remove the least recently served archives until the cache fits its budget; returns the bytes freed."""
+        if not os.path.isdir(self.archive_dir):
+            return 0
+        archives = []
+        now = time.time()
+        for name in os.listdir(self.archive_dir):
+            path = os.path.join(self.archive_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(".part") and now - stat.st_mtime > self.PARTIAL_BUILD_TTL:
+                self._remove(path)
+            elif name.endswith(".zip"):
+                archives.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in archives)
+        freed = 0
+        for _, size, path in sorted(archives):
+            if total - freed <= self.max_bytes:
+                break
+            if path != keep and self._remove(path):
+                freed += size
+        return freed
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
 class SizeService:
 
     def __init__(self):
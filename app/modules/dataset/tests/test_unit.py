@@ -0,0 +1,240 @@
+import hashlib
+import io
+import os
+from types import SimpleNamespace
+from zipfile import ZIP_STORED, ZipFile
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.conftest import login, logout
+from app.modules.dataset import routes
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.dataset.repositories import DataSetRepository
+from app.modules.dataset.services import UPLOAD_DIGESTS_SUFFIX, DataSetArchiveService, DataSetService, upload_digests
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.services import HubfileService, hubfile_location_cache
+
+
+@pytest.fixture(scope="module")
+def test_client(test_client):
+    """
+    Extends the test_client fixture to add additional specific data for module testing.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email="test@example.com").first()
+        meta = DSMetaData(
+            title="Archived", description="archived", publication_type=PublicationType.NONE, tags="archive"
+        )
+        db.session.add(meta)
+        db.session.flush()
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+        fm_meta = FMMetaData(
+            car_filename="archive.car", title="archive", description="archive", publication_type=PublicationType.NONE
+        )
+        db.session.add_all([dataset, fm_meta])
+        db.session.flush()
+        feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+        db.session.add(feature_model)
+        db.session.flush()
+        db.session.add(Hubfile(name="archive.car", checksum="c1", size=12, feature_model_id=feature_model.id))
+        db.session.commit()
+    hubfile_location_cache.clear()
+
+    yield test_client
+
+
+@pytest.fixture
+def archive_service(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    # Stored in its dataset folder, as files uploaded before the blob store
+    file_path = HubfileService().get_legacy_path_by_hubfile(DataSet.query.first().files()[0])
+    os.makedirs(os.path.dirname(file_path))
+    with open(file_path, "w") as f:
+        f.write("Company: ACME")
+    service = DataSetArchiveService()
+    monkeypatch.setattr(routes, "dataset_archive_service", service)
+    return service
+
+
+def test_archive_is_built_once(test_client, archive_service):
+    dataset = DataSet.query.first()
+    path, key = archive_service.get_or_build(dataset)
+    with ZipFile(path) as zipf:
+        assert zipf.namelist() == [f"dataset_{dataset.id}/archive.car"]
+        assert zipf.read(f"dataset_{dataset.id}/archive.car") == b"Company: ACME"
+
+    os.utime(path, (0, 0))
+    assert archive_service.get_or_build(dataset) == (path, key)
+    # Served again without rebuilding, and marked as recently used
+    assert os.stat(path).st_mtime > 0
+    assert os.listdir(archive_service.archive_dir) == [os.path.basename(path)]
+
+
+def test_changed_files_rebuild_the_archive(test_client, archive_service):
+    dataset = DataSet.query.first()
+    old_path, old_key = archive_service.get_or_build(dataset)
+
+    hubfile = dataset.files()[0]
+    hubfile.checksum = "c2"
+    db.session.commit()
+    try:
+        new_path, new_key = archive_service.get_or_build(dataset)
+        assert new_key != old_key
+        assert os.listdir(archive_service.archive_dir) == [os.path.basename(new_path)]
+    finally:
+        hubfile.checksum = "c1"
+        db.session.commit()
+
+
+def test_download_is_streamed_then_cached(test_client, archive_service):
+    dataset = DataSet.query.first()
+    response = test_client.get(f"/dataset/download/{dataset.id}")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "application/zip"
+    assert ZipFile(io.BytesIO(response.data)).namelist() == [f"dataset_{dataset.id}/archive.car"]
+    etag = response.headers["ETag"]
+    assert archive_service.cached(dataset) is not None
+
+    response = test_client.get(f"/dataset/download/{dataset.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = test_client.get(f"/dataset/download/{dataset.id}", headers={"Range": "bytes=0-3"})
+    assert response.status_code == 206
+    assert response.data == b"PK\x03\x04"
+
+
+def test_cached_download_can_be_offloaded_to_nginx(test_client, archive_service, monkeypatch):
+    dataset = DataSet.query.first()
+    path, _ = archive_service.get_or_build(dataset)
+    monkeypatch.setitem(test_client.application.config, "DOWNLOAD_OFFLOAD", "nginx")
+
+    response = test_client.get(f"/dataset/download/{dataset.id}")
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Redirect"] == f"/protected-uploads/archives/{os.path.basename(path)}"
+    assert response.headers["Content-Disposition"] == f"attachment; filename=dataset_{dataset.id}.zip"
+    assert response.data == b""
+
+
+def test_large_datasets_are_streamed_without_caching(test_client, archive_service):
+    dataset = DataSet.query.first()
+    service = DataSetArchiveService(archive_dir=archive_service.archive_dir, max_cached_bytes=-1, compression="stored")
+    chunks, _ = service.stream(dataset)
+    with ZipFile(io.BytesIO(b"".join(chunks))) as zipf:
+        info = zipf.getinfo(f"dataset_{dataset.id}/archive.car")
+        assert info.compress_type == ZIP_STORED
+        assert zipf.read(info) == b"Company: ACME"
+    assert not os.path.exists(archive_service.archive_dir)
+
+
+def test_interrupted_stream_leaves_no_archive(test_client, archive_service):
+    dataset = DataSet.query.first()
+    chunks, _ = archive_service.stream(dataset)
+    next(chunks)
+    chunks.close()
+    assert os.listdir(archive_service.archive_dir) == []
+
+
+def test_garbage_collection_keeps_the_budget(test_client, archive_service):
+    os.makedirs(archive_service.archive_dir)
+    for i in range(3):
+        path = os.path.join(archive_service.archive_dir, f"dataset_{100 + i}_key.zip")
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        os.utime(path, (i, i))
+
+    archive_service.max_bytes = 150
+    assert archive_service.collect_garbage() == 200
+    assert os.listdir(archive_service.archive_dir) == ["dataset_102_key.zip"]
+
+
+def test_upload_records_digests_while_saving(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    content = b"Company: ACME\n" * 1000
+    login(test_client, "test@example.com", "test1234")
+    try:
+        response = test_client.post(
+            "/dataset/file/upload",
+            data={"file": (io.BytesIO(content), "digests.car")},
+            content_type="multipart/form-data",
+        )
+    finally:
+        logout(test_client)
+    assert response.status_code == 200
+
+    user = User.query.filter_by(email="test@example.com").first()
+    file_path = os.path.join(tmp_path, "temp", str(user.id), "digests.car")
+    assert os.path.exists(file_path + UPLOAD_DIGESTS_SUFFIX)
+    digests = upload_digests(file_path)
+    assert digests.md5 == hashlib.md5(content).hexdigest()
+    assert digests.sha256 == hashlib.sha256(content).hexdigest()
+    assert digests.size == len(content)
+
+    # A file changed after its upload is hashed again
+    with open(file_path, "wb") as f:
+        f.write(b"changed")
+    assert upload_digests(file_path).sha256 == hashlib.sha256(b"changed").hexdigest()
+
+
+def dataset_form(title, car_filenames):
+    feature_models = [
+        SimpleNamespace(
+            car_filename=SimpleNamespace(data=name),
+            get_fmmetadata=lambda name=name: {
+                "car_filename": name,
+                "title": name,
+                "description": "form",
+                "publication_type": PublicationType.NONE,
+            },
+            get_authors=lambda: [],
+        )
+        for name in car_filenames
+    ]
+    return SimpleNamespace(
+        get_dsmetadata=lambda: {
+            "title": title,
+            "description": "form",
+            "publication_type": PublicationType.NONE,
+            "tags": "form",
+        },
+        get_authors=lambda: [],
+        feature_models=feature_models,
+    )
+
+
+def test_create_from_form_stores_file_aggregates(test_client, tmp_path):
+    contents = {"first.car": b"Company: ACME\n", "second.car": b"Company: ACME\nModel: Roadster\n"}
+    for name, content in contents.items():
+        (tmp_path / name).write_bytes(content)
+    user = User.query.filter_by(email="test@example.com").first()
+    uploader = SimpleNamespace(
+        id=user.id,
+        profile=SimpleNamespace(surname="Doe", name="Jane", affiliation=None, orcid=None),
+        temp_folder=lambda: str(tmp_path),
+    )
+
+    dataset = DataSetService().create_from_form(dataset_form("Aggregated", contents), uploader)
+    assert dataset.files_count == 2
+    assert dataset.total_size_bytes == sum(len(content) for content in contents.values())
+
+    empty = DataSetService().create_from_form(dataset_form("Empty", []), uploader)
+    assert (empty.files_count, empty.total_size_bytes) == (0, 0)
+
+
+def test_refresh_file_aggregates_recomputes_them(test_client):
+    aggregated = DataSet.query.join(DSMetaData).filter(DSMetaData.title == "Aggregated").one()
+    empty = DataSet.query.join(DSMetaData).filter(DSMetaData.title == "Empty").one()
+    expected = (aggregated.files_count, aggregated.total_size_bytes)
+    aggregated.files_count, aggregated.total_size_bytes = 0, 0
+    # No files: the sum is NULL, stored as 0
+    empty.files_count, empty.total_size_bytes = 3, 300
+    db.session.commit()
+
+    assert DataSetRepository().refresh_file_aggregates([aggregated.id, empty.id]) == 2
+    db.session.refresh(aggregated)
+    db.session.refresh(empty)
+    assert (aggregated.files_count, aggregated.total_size_bytes) == expected
+    assert (empty.files_count, empty.total_size_bytes) == (0, 0)
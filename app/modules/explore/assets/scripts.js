@@ -2,6 +2,11 @@ document.addEventListener('DOMContentLoaded', () => {
     send_query();
 });
 
+// Criteria and cursor of the current search; "Load more" fetches the next page with them
+let currentCriteria = null;
+let nextCursor = null;
+let loadedCount = 0;
+
 function send_query() {
 
     console.log("send query...")
@@ -21,117 +26,219 @@ function send_query() {
                 query: document.querySelector('#query').value,
                 publication_type: document.querySelector('#publication_type').value,
                 sorting: document.querySelector('[name="sorting"]:checked').value,
+                specs: get_spec_ranges(),
+                facets: get_selected_facets(),
             };
 
             console.log(document.querySelector('#publication_type').value);
 
-            fetch('/explore', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(searchCriteria),
-            })
-                .then(response => response.json())
-                .then(data => {
-
-                    console.log(data);
-                    document.getElementById('results').innerHTML = '';
-
-                    // results counter
-                    const resultCount = data.length;
-                    const resultText = resultCount === 1 ? 'dataset' : 'datasets';
-                    document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
-
-                    if (resultCount === 0) {
-                        console.log("show not found icon");
-                        document.getElementById("results_not_found").style.display = "block";
-                    } else {
-                        document.getElementById("results_not_found").style.display = "none";
-                    }
-
-
-                    data.forEach(dataset => {
-                        let card = document.createElement('div');
-                        card.className = 'col-12';
-                        card.innerHTML = `
-                            <div class="card">
-                                <div class="card-body">
-                                    <div class="d-flex align-items-center justify-content-between">
-                                        <h3><a href="${dataset.url}">${dataset.title}</a></h3>
-                                        <div>
-                                            <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
-                                        </div>
-                                    </div>
-                                    <p class="text-secondary">${formatDate(dataset.created_at)}</p>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Description
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <p class="card-text">${dataset.description}</p>
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Authors
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.authors.map(author => `
-                                                <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
-                                            `).join('')}
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Tags
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row">
-
-                                        <div class="col-md-4 col-12">
-
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                View dataset
-                                            </a>
-                                            <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                Download (${dataset.total_size_in_human_format})
-                                            </a>
-                                        </div>
-
-
-                                    </div>
-
-                                </div>
-                            </div>
-                        `;
-
-                        document.getElementById('results').appendChild(card);
+            currentCriteria = searchCriteria;
+            load_facets(searchCriteria);
+            fetch_page(searchCriteria, null);
+        });
+    });
+
+    document.getElementById('load_more').addEventListener('click', () => {
+        if (currentCriteria && nextCursor) {
+            fetch_page(currentCriteria, nextCursor);
+        }
+    });
+}
+
+function fetch_page(searchCriteria, cursor) {
+    fetch('/explore', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({...searchCriteria, cursor: cursor}),
+    })
+        .then(response => response.json())
+        .then(data => {
+
+            console.log(data);
+            if (searchCriteria !== currentCriteria) {
+                // a newer search started while this page was loading
+                return;
+            }
+            if (cursor === null) {
+                document.getElementById('results').innerHTML = '';
+                loadedCount = 0;
+            }
+            nextCursor = data.next_cursor;
+            loadedCount += data.datasets.length;
+
+            // results counter
+            const resultText = loadedCount === 1 ? 'dataset' : 'datasets';
+            if (nextCursor) {
+                document.getElementById('results_number').textContent = `Showing the first ${loadedCount} ${resultText}`;
+            } else if (data.truncated) {
+                // the search kept only its most relevant matches
+                document.getElementById('results_number').textContent =
+                    `Showing the ${loadedCount} most relevant ${resultText}: refine your query to find the others`;
+            } else {
+                document.getElementById('results_number').textContent = `${loadedCount} ${resultText} found`;
+            }
+            document.getElementById('load_more').style.display = nextCursor ? 'inline-block' : 'none';
+
+            if (loadedCount === 0) {
+                console.log("show not found icon");
+                document.getElementById("results_not_found").style.display = "block";
+            } else {
+                document.getElementById("results_not_found").style.display = "none";
+            }
+
+            data.datasets.forEach(dataset => {
+                document.getElementById('results').appendChild(render_dataset(dataset));
+            });
+        });
+}
+
+function render_dataset(dataset) {
+    let card = document.createElement('div');
+    card.className = 'col-12';
+    card.innerHTML = `
+        <div class="card">
+            <div class="card-body">
+                <div class="d-flex align-items-center justify-content-between">
+                    <h3><a href="${dataset.url}">${dataset.title}</a></h3>
+                    <div>
+                        <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
+                    </div>
+                </div>
+                <p class="text-secondary">${formatDate(dataset.created_at)}</p>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Description
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        <p class="card-text">${dataset.description}</p>
+                    </div>
+
+                </div>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Authors
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        ${dataset.authors.map(author => `
+                            <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
+                        `).join('')}
+                    </div>
+
+                </div>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Tags
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
+                    </div>
+
+                </div>
+
+                <div class="row">
+
+                    <div class="col-md-4 col-12">
+
+                    </div>
+                    <div class="col-md-8 col-12">
+                        <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                            View dataset
+                        </a>
+                        <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                            Download (${dataset.total_size_in_human_format})
+                        </a>
+                    </div>
+
+
+                </div>
+
+            </div>
+        </div>
+    `;
+
+    return card;
+}
+
+function get_spec_ranges() {
+    const specs = {};
+    document.querySelectorAll('#filters [data-spec]').forEach(input => {
+        if (input.value === '') {
+            return;
+        }
+        specs[input.dataset.spec] = specs[input.dataset.spec] || {};
+        specs[input.dataset.spec][input.dataset.bound] = Number(input.value);
+    });
+    return specs;
+}
+
+function get_selected_facets() {
+    const facets = {};
+    document.querySelectorAll('#facets [data-facet]:checked').forEach(checkbox => {
+        facets[checkbox.dataset.facet] = facets[checkbox.dataset.facet] || [];
+        facets[checkbox.dataset.facet].push(checkbox.value);
+    });
+    return facets;
+}
+
+function load_facets(searchCriteria) {
+    fetch('/explore/facets', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(searchCriteria),
+    })
+        .then(response => response.json())
+        .then(counts => {
+            const selected = searchCriteria.facets || {};
+            const container = document.getElementById('facets');
+            container.innerHTML = '';
+
+            Object.entries(counts).forEach(([facet, values]) => {
+                if (values.length === 0) {
+                    return;
+                }
+                const group = document.createElement('div');
+                group.className = 'mt-2';
+                group.innerHTML = `<p class="mb-1 text-secondary">${facet.charAt(0).toUpperCase() + facet.slice(1)}</p>`;
+
+                values.forEach(({value, count}) => {
+                    const label = document.createElement('label');
+                    label.className = 'form-check';
+                    const checkbox = document.createElement('input');
+                    checkbox.className = 'form-check-input';
+                    checkbox.type = 'checkbox';
+                    checkbox.value = value;
+                    checkbox.dataset.facet = facet;
+                    checkbox.checked = (selected[facet] || []).includes(value);
+                    checkbox.addEventListener('change', () => {
+                        document.querySelector('#query').dispatchEvent(new Event('input', {bubbles: true}));
                     });
+                    const text = document.createElement('span');
+                    text.className = 'form-check-label';
+                    text.textContent = `${value} (${count})`;
+                    label.appendChild(checkbox);
+                    label.appendChild(text);
+                    group.appendChild(label);
                 });
+
+                container.appendChild(group);
+            });
         });
-    });
 }
 
 function formatDate(dateString) {
@@ -179,6 +286,14 @@ function clearFilters() {
         // option.dispatchEvent(new Event('input', {bubbles: true}));
     });
 
+    // Reset the car spec ranges and facets
+    document.querySelectorAll('#filters [data-spec]').forEach(input => {
+        input.value = '';
+    });
+    document.querySelectorAll('#facets [data-facet]').forEach(checkbox => {
+        checkbox.checked = false;
+    });
+
     // Perform a new search with the reset filters
     queryInput.dispatchEvent(new Event('input', {bubbles: true}));
 }
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import DDL, event
+
+from app import db
+
+
+class DataSetSearchDocument(db.Model):
+    """
+    Denormalized, normalized text of a dataset (metadata, authors, feature models and car specs).
+
+    It is the single source for every search backend: MariaDB indexes it with FULLTEXT, SQLite mirrors it
+    into an FTS5 table through triggers and the in-process inverted index syncs from it by `updated_at`.
+    """
+
+    __tablename__ = "dataset_search_document"
+    data_set_id = db.Column(db.Integer, db.ForeignKey("data_set.id"), primary_key=True, autoincrement=False)
+    content = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(
+        db.DateTime, nullable=False, index=True, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None)
+    )
+
+    data_set = db.relationship(
+        "DataSet", backref=db.backref("search_document", uselist=False, cascade="all, delete-orphan")
+    )
+
+    __table_args__ = (
+        db.Index("ix_dataset_search_document_content", "content", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
+    def __repr__(self):
+        return f"DataSetSearchDocument<{self.data_set_id}>"
+
+
+# SQLite stand-in for the MariaDB FULLTEXT index: an external-content FTS5 table kept in sync by triggers.
+SQLITE_FTS_TABLE = "dataset_search_fts"
+
+for _statement in (
+    f"CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5("
+    "content, content='dataset_search_document', content_rowid='data_set_id')",
+    f"CREATE TRIGGER {SQLITE_FTS_TABLE}_ai AFTER INSERT ON dataset_search_document BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, content) VALUES (new.data_set_id, new.content); END",
+    f"CREATE TRIGGER {SQLITE_FTS_TABLE}_ad AFTER DELETE ON dataset_search_document BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, content) "
+    "VALUES ('delete', old.data_set_id, old.content); END",
+    f"CREATE TRIGGER {SQLITE_FTS_TABLE}_au AFTER UPDATE ON dataset_search_document BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, content) "
+    "VALUES ('delete', old.data_set_id, old.content); "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, content) VALUES (new.data_set_id, new.content); END",
+):
+    event.listen(DataSetSearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+event.listen(
+    DataSetSearchDocument.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
@@ -1,44 +1,180 @@
+import base64
+import json
 import re
+from datetime import datetime
 
 import unidecode
-from sqlalchemy import any_, or_
+from sqlalchemy import and_, any_, distinct, func, literal, or_, select, union_all
 
+from app.modules.car_check.models import CarSpec
 from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+from app.modules.dataset.repositories import DataSetRepository
+from app.modules.explore.search import SearchMatches, get_search_backend
 from app.modules.featuremodel.models import FeatureModel, FMMetaData
 from core.repositories.BaseRepository import BaseRepository
 
+# Car spec columns that can be filtered by range, and the text columns used as facets.
+SPEC_RANGE_FIELDS = ("cc", "hp", "seats", "year", "max_speed_kmh", "acceleration_sec", "price")
+SPEC_FACET_FIELDS = ("company", "engine", "fuel")
+
+# Explore API page size: default when the client does not ask for one, and upper bound.
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def spec_conditions(specs=None, facets=None):
+    """Build CarSpec conditions from {"hp": {"min": 200, "max": 400}} ranges and {"fuel": ["Petrol"]} facets."""
+    conditions = []
+    for field, bounds in (specs or {}).items():
+        if field not in SPEC_RANGE_FIELDS or not isinstance(bounds, dict):
+            continue
+        column = getattr(CarSpec, field)
+        for bound, compare in (("min", column.__ge__), ("max", column.__le__)):
+            try:
+                value = float(bounds.get(bound))
+            except (TypeError, ValueError):
+                continue
+            conditions.append(compare(value))
+    for field, values in (facets or {}).items():
+        if field in SPEC_FACET_FIELDS and values:
+            conditions.append(getattr(CarSpec, field).in_(list(values)))
+    return conditions
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode an opaque Explore cursor: {"created_at": ..., "id": ...} after the last dataset of a page sorted by
+    date, or {"offset": ...} for pages sorted by relevance. Raises ValueError on anything else.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if set(position) == {"offset"} and isinstance(position["offset"], int) and position["offset"] >= 0:
+            return position
+        if set(position) == {"created_at", "id"} and isinstance(position["id"], int):
+            return {"created_at": datetime.fromisoformat(position["created_at"]), "id": position["id"]}
+    except (AttributeError, TypeError, ValueError):
+        pass
+    raise ValueError("Invalid cursor")
+
 
 class ExploreRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
 
-    def filter(self, query="", sorting="newest", publication_type="any", tags=[], **kwargs):
+    def filter(self, query="", sorting="newest", publication_type="any", tags=[], specs=None, facets=None, **kwargs):
+        datasets, rank, _ = self._filtered_query(query, publication_type, tags, specs, facets)
+        return datasets.order_by(*self._ordering(sorting, rank)).all()
+
+    def page(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        specs=None,
+        facets=None,
+        cursor=None,
+        limit=DEFAULT_PAGE_SIZE,
+        **kwargs,
+    ):
+        """
+        One page of `filter` results, using keyset pagination on (created_at, id).
+
+        Returns:
+            tuple: (datasets, next_cursor, truncated), where next_cursor is None on the last page and truncated
+            tells that the search kept only its most relevant matches, so there are more than can be paged.
+        """
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        position = decode_cursor(cursor) if cursor else {}
+        datasets, rank, truncated = self._filtered_query(query, publication_type, tags, specs, facets)
+        datasets = datasets.order_by(*self._ordering(sorting, rank))
+
+        relevance = sorting == "relevance" and rank is not None
+        if relevance:
+            # Relevance scores are not stable keys, so these pages are numbered instead
+            if "created_at" in position:
+                raise ValueError("Invalid cursor")
+            datasets = datasets.offset(position.get("offset", 0))
+        elif "offset" in position:
+            raise ValueError("Invalid cursor")
+        elif position:
+            datasets = datasets.filter(self._after(position, ascending=sorting == "oldest"))
+
+        page = DataSetRepository.with_details(datasets).limit(limit + 1).all()
+        if len(page) <= limit:
+            return page, None, truncated
+        page = page[:limit]
+        if relevance:
+            return page, encode_cursor({"offset": position.get("offset", 0) + limit}), truncated
+        return page, encode_cursor({"created_at": page[-1].created_at.isoformat(), "id": page[-1].id}), truncated
+
+    def _ordering(self, sorting, rank):
+        # id breaks created_at ties so that every dataset has a single position in the keyset
+        if sorting == "oldest":
+            return self.model.created_at.asc(), self.model.id.asc()
+        newest = (self.model.created_at.desc(), self.model.id.desc())
+        if sorting == "relevance" and rank is not None:
+            return (rank.desc(),) + newest
+        return newest
+
+    def _after(self, position, ascending):
+        created_at, last_id = position["created_at"], position["id"]
+        if ascending:
+            return or_(
+                self.model.created_at > created_at, and_(self.model.created_at == created_at, self.model.id > last_id)
+            )
+        return or_(
+            self.model.created_at < created_at, and_(self.model.created_at == created_at, self.model.id < last_id)
+        )
+
+    def facet_counts(self, query="", publication_type="any", tags=[], specs=None, facets=None, **kwargs):
+        """
+        Count matching datasets per company, engine and fuel in a single aggregated query.
+
+        Returns:
+            dict: {"company": [{"value": "Toyota", "count": 3}, ...], "engine": [...], "fuel": [...]}
+        """
+        datasets, _, _ = self._filtered_query(query, publication_type, tags, specs, facets)
+        dataset_ids = datasets.with_entities(DataSet.id)
+
+        per_field = []
+        for field in SPEC_FACET_FIELDS:
+            column = getattr(CarSpec, field)
+            per_field.append(
+                select(
+                    literal(field).label("facet"),
+                    column.label("value"),
+                    func.count(distinct(FeatureModel.data_set_id)).label("count"),
+                )
+                .join(FeatureModel, CarSpec.feature_model_id == FeatureModel.id)
+                .where(FeatureModel.data_set_id.in_(dataset_ids.scalar_subquery()), column.isnot(None))
+                .group_by(column)
+            )
+
+        counts = {field: [] for field in SPEC_FACET_FIELDS}
+        for facet, value, count in self.session.execute(union_all(*per_field)):
+            counts[facet].append({"value": value, "count": count})
+        for values in counts.values():
+            values.sort(key=lambda item: (-item["count"], item["value"]))
+        return counts
+
+    def _filtered_query(self, query, publication_type, tags, specs, facets):
+        """Return the SearchMatches of the filtered query (a None score when the matches are not ranked)."""
         # Normalize and remove unwanted characters
         normalized_query = unidecode.unidecode(query).lower()
         cleaned_query = re.sub(r'[,.":\'()\[\]^;!¡¿?]', "", normalized_query)
+        words = cleaned_query.split()
 
-        filters = []
-        for word in cleaned_query.split():
-            filters.append(DSMetaData.title.ilike(f"%{word}%"))
-            filters.append(DSMetaData.description.ilike(f"%{word}%"))
-            filters.append(Author.name.ilike(f"%{word}%"))
-            filters.append(Author.affiliation.ilike(f"%{word}%"))
-            filters.append(Author.orcid.ilike(f"%{word}%"))
-            filters.append(FMMetaData.car_filename.ilike(f"%{word}%"))
-            filters.append(FMMetaData.title.ilike(f"%{word}%"))
-            filters.append(FMMetaData.description.ilike(f"%{word}%"))
-            filters.append(FMMetaData.publication_doi.ilike(f"%{word}%"))
-            filters.append(FMMetaData.tags.ilike(f"%{word}%"))
-            filters.append(DSMetaData.tags.ilike(f"%{word}%"))
-
-        datasets = (
-            self.model.query.join(DataSet.ds_meta_data)
-            .join(DSMetaData.authors)
-            .join(DataSet.feature_models)
-            .join(FeatureModel.fm_meta_data)
-            .filter(or_(*filters))
-            .filter(DSMetaData.dataset_doi.isnot(None))  # Exclude datasets with empty dataset_doi
-        )
+        searched = get_search_backend().filter(self.model.query.join(DataSet.ds_meta_data), words) if words else None
+        if searched is None:
+            searched = SearchMatches(self._ilike_query(words), None)
+        datasets = searched.datasets.filter(
+            DSMetaData.dataset_doi.isnot(None)
+        )  # Exclude datasets with empty dataset_doi
 
         if publication_type != "any":
             matching_type = None
@@ -53,10 +189,44 @@ class ExploreRepository(BaseRepository):
         if tags:
             datasets = datasets.filter(DSMetaData.tags.ilike(any_(f"%{tag}%" for tag in tags)))
 
-        # Order by created_at
-        if sorting == "oldest":
-            datasets = datasets.order_by(self.model.created_at.asc())
-        else:
-            datasets = datasets.order_by(self.model.created_at.desc())
+        # Car spec ranges and facets must all hold for the same car of the dataset
+        conditions = spec_conditions(specs, facets)
+        if conditions:
+            datasets = datasets.filter(DataSet.feature_models.any(FeatureModel.car_specs.any(and_(*conditions))))
+
+        return searched._replace(datasets=datasets)
+
+    def _ilike_query(self, words):
+        # EXISTS subqueries on authors and feature models, so each dataset is matched once instead of once per
+        # author and feature model, and LIMIT applies to datasets
+        dataset_filters, author_filters, fm_filters = [], [], []
+        for word in words:
+            pattern = f"%{word}%"
+            dataset_filters += [
+                DSMetaData.title.ilike(pattern),
+                DSMetaData.description.ilike(pattern),
+                DSMetaData.tags.ilike(pattern),
+            ]
+            author_filters += [
+                Author.name.ilike(pattern),
+                Author.affiliation.ilike(pattern),
+                Author.orcid.ilike(pattern),
+            ]
+            fm_filters += [
+                FMMetaData.car_filename.ilike(pattern),
+                FMMetaData.title.ilike(pattern),
+                FMMetaData.description.ilike(pattern),
+                FMMetaData.publication_doi.ilike(pattern),
+                FMMetaData.tags.ilike(pattern),
+            ]
 
-        return datasets.all()
+        datasets = self.model.query.join(DataSet.ds_meta_data)
+        if words:
+            datasets = datasets.filter(
+                or_(
+                    *dataset_filters,
+                    DSMetaData.authors.any(or_(*author_filters)),
+                    DataSet.feature_models.any(FeatureModel.fm_meta_data.has(or_(*fm_filters))),
+                )
+            )
+        return datasets
@@ -13,6 +13,30 @@ def index():
         return render_template("explore/index.html", form=form, query=query)
 
     if request.method == "POST":
-        criteria = request.get_json()
-        datasets = ExploreService().filter(**criteria)
-        return jsonify([dataset.to_dict() for dataset in datasets])
+        try:
+            datasets, next_cursor, truncated = ExploreService().page(**search_criteria())
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+        return jsonify(
+            {
+                "datasets": [dataset.to_dict(include_files=False) for dataset in datasets],
+                "next_cursor": next_cursor,
+                "truncated": truncated,
+            }
+        )
+
+
+@explore_bp.route("/explore/facets", methods=["POST"])
+def facets():
+    try:
+        return jsonify(ExploreService().facet_counts(**search_criteria()))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+
+def search_criteria() -> dict:
+    """The JSON object posted by the explore page; raises ValueError for a missing, empty or non-object body."""
+    criteria = request.get_json(silent=True) or {}
+    if not isinstance(criteria, dict) or not criteria:
+        raise ValueError("Expected a JSON object with the search criteria")
+    return criteria
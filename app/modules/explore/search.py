@@ -0,0 +1,249 @@
+import math
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import unidecode
+from sqlalchemy import case, column, false, table, text
+from sqlalchemy.dialects.mysql import match
+
+from app import db
+from app.modules.dataset.models import DataSet
+from app.modules.explore.models import SQLITE_FTS_TABLE, DataSetSearchDocument
+
+# InnoDB ignores shorter words (innodb_ft_min_token_size); such queries fall back to ILIKE.
+FULLTEXT_MIN_WORD_LENGTH = 3
+# Maximum number of ranked ids the in-process index hands back to the database query; the matches past it
+# are dropped and the results are flagged as truncated, so the user is asked to refine the query.
+MEMORY_SEARCH_LIMIT = 1000
+
+# Documents are stamped by the app server before their transaction commits, so one may become visible after
+# documents stamped later. Each sync re-reads this many seconds before the newest stamp it has seen.
+MEMORY_SYNC_OVERLAP = timedelta(minutes=5)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text_value: str) -> str:
+    return unidecode.unidecode(text_value or "").lower()
+
+
+def tokenize(text_value: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text_value))
+
+
+def build_document(dataset: DataSet) -> str:
+    """Text indexed for a dataset: the same fields the ILIKE search looks at, plus its car specs."""
+    metadata = dataset.ds_meta_data
+    parts = [metadata.title, metadata.description, metadata.tags]
+    for author in metadata.authors:
+        parts += [author.name, author.affiliation, author.orcid]
+    for feature_model in dataset.feature_models:
+        fm_metadata = feature_model.fm_meta_data
+        if fm_metadata:
+            parts += [
+                fm_metadata.car_filename,
+                fm_metadata.title,
+                fm_metadata.description,
+                fm_metadata.publication_doi,
+                fm_metadata.tags,
+            ]
+        for spec in feature_model.car_specs:
+            parts += [spec.company, spec.model, spec.engine, spec.fuel]
+    return normalize(" ".join(part for part in parts if part))
+
+
+class SearchMatches(NamedTuple):
+    """
+    An Explore query restricted to the datasets matching some words, with their relevance expression (higher
+    is better, None when unranked). `truncated` is set when only the most relevant matches were kept.
+    """
+
+    datasets: Any
+    score: Any
+    truncated: bool = False
+
+
+class SearchBackend:
+    """
+    Restricts an Explore query to the datasets matching some words.
+
+    `filter` returns the SearchMatches, or None when the backend cannot answer those words and the caller
+    should use the ILIKE search instead.
+    """
+
+    name = "like"
+
+    def filter(self, datasets, words: List[str]):
+        return None
+
+
+class MariaDBFullTextBackend(SearchBackend):
+    name = "fulltext"
+
+    def filter(self, datasets, words):
+        terms = [token for word in words for token in tokenize(word) if len(token) >= FULLTEXT_MIN_WORD_LENGTH]
+        if not terms:
+            return None
+        score = match(DataSetSearchDocument.content, against=" ".join(f"{term}*" for term in terms))
+        score = score.in_boolean_mode()
+        datasets = datasets.join(DataSetSearchDocument, DataSetSearchDocument.data_set_id == DataSet.id)
+        return SearchMatches(datasets.filter(score > 0), score)
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    name = "fts5"
+
+    fts = table(SQLITE_FTS_TABLE, column("rowid"), column("rank"))
+
+    def filter(self, datasets, words):
+        terms = [token for word in words for token in tokenize(word)]
+        if not terms:
+            return None
+        expression = " OR ".join(f'"{term}"*' for term in terms)
+        datasets = datasets.join(self.fts, self.fts.c.rowid == DataSet.id).filter(
+            text(f"{SQLITE_FTS_TABLE} MATCH :fts_query").bindparams(fts_query=expression)
+        )
+        # FTS5 rank is bm25, where lower means more relevant
+        return SearchMatches(datasets, -self.fts.c.rank)
+
+
+class InvertedIndexBackend(SearchBackend):
+    """
+    In-process inverted index with TF-IDF ranking and prefix matching.
+
+    It mirrors `dataset_search_document` and pulls only the rows changed since its last sync (with an overlap
+    of MEMORY_SYNC_OVERLAP), so every worker process stays current after datasets are created or updated
+    elsewhere.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._doc_terms: Dict[int, Counter] = {}
+        self._terms: List[str] = []
+        self._synced_at: Optional[datetime] = None
+
+    def _sync(self):
+        query = DataSetSearchDocument.query
+        if self._synced_at is not None:
+            query = query.filter(DataSetSearchDocument.updated_at >= self._synced_at - MEMORY_SYNC_OVERLAP)
+        rows = query.with_entities(
+            DataSetSearchDocument.data_set_id, DataSetSearchDocument.content, DataSetSearchDocument.updated_at
+        ).all()
+        vocabulary_changed = False
+        for data_set_id, content, updated_at in rows:
+            vocabulary_changed |= self._replace(data_set_id, Counter(tokenize(content)))
+            if self._synced_at is None or updated_at > self._synced_at:
+                self._synced_at = updated_at
+        if vocabulary_changed:
+            self._terms = sorted(self._postings)
+
+    def _replace(self, data_set_id: int, terms: Counter) -> bool:
+        """Replace the terms of a document, returning whether terms were added to or removed from the index."""
+        if self._doc_terms.get(data_set_id) == terms:
+            return False
+        changed = False
+        for term in self._doc_terms.pop(data_set_id, ()):
+            postings = self._postings[term]
+            postings.pop(data_set_id, None)
+            if not postings:
+                del self._postings[term]
+                changed = True
+        for term, count in terms.items():
+            changed |= term not in self._postings
+            self._postings[term][data_set_id] = count
+        self._doc_terms[data_set_id] = terms
+        return changed
+
+    def _prefixed(self, prefix: str):
+        start = bisect_left(self._terms, prefix)
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def scores(self, words: List[str]) -> Dict[int, float]:
+        with self._lock:
+            self._sync()
+            total = len(self._doc_terms) or 1
+            scores: Dict[int, float] = defaultdict(float)
+            for token in {token for word in words for token in tokenize(word)}:
+                for term in self._prefixed(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for data_set_id, count in postings.items():
+                        scores[data_set_id] += (1 + math.log(count)) * idf
+        return scores
+
+    def filter(self, datasets, words):
+        if not any(tokenize(word) for word in words):
+            return None
+        scores = self.scores(words)
+        if not scores:
+            return SearchMatches(datasets.filter(false()), None)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:MEMORY_SEARCH_LIMIT]
+        score = case(dict(ranked), value=DataSet.id, else_=0)
+        return SearchMatches(
+            datasets.filter(DataSet.id.in_([data_set_id for data_set_id, _ in ranked])),
+            score,
+            truncated=len(scores) > MEMORY_SEARCH_LIMIT,
+        )
+
+
+_memory_backend = InvertedIndexBackend()
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    Backend selected by SEARCH_BACKEND: "fulltext" (MariaDB), "fts5" (SQLite), "memory" or "like".
+    The default, "auto", picks the full-text index of the database in use.
+    """
+    name = os.getenv("SEARCH_BACKEND", "auto").lower()
+    if name == "auto":
+        name = {"mysql": "fulltext", "mariadb": "fulltext", "sqlite": "fts5"}.get(db.engine.dialect.name, "like")
+    if name == "fulltext":
+        return MariaDBFullTextBackend()
+    if name == "fts5":
+        return SQLiteFTS5Backend()
+    if name == "memory":
+        return _memory_backend
+    return SearchBackend()
+
+
+class SearchIndexService:
+    """Keeps `dataset_search_document` up to date; backends index it from there."""
+
+    def index_dataset(self, dataset: DataSet, commit: bool = True) -> DataSetSearchDocument:
+        content = build_document(dataset)
+        updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        document = db.session.get(DataSetSearchDocument, dataset.id)
+        if document is None:
+            document = DataSetSearchDocument(data_set_id=dataset.id, content=content, updated_at=updated_at)
+            db.session.add(document)
+        else:
+            document.content = content
+            document.updated_at = updated_at
+        if commit:
+            db.session.commit()
+        return document
+
+    def reindex_all(self, batch_size: int = 200) -> int:
+        indexed = 0
+        last_id = 0
+        while True:
+            datasets = DataSet.query.filter(DataSet.id > last_id).order_by(DataSet.id).limit(batch_size).all()
+            if not datasets:
+                break
+            for dataset in datasets:
+                self.index_dataset(dataset, commit=False)
+            db.session.commit()
+            indexed += len(datasets)
+            last_id = datasets[-1].id
+        return indexed
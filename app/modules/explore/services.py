@@ -8,3 +8,9 @@ class ExploreService(BaseService):
 
     def filter(self, query="", sorting="newest", publication_type="any", tags=[], **kwargs):
         return self.repository.filter(query, sorting, publication_type, tags, **kwargs)
+
+    def page(self, query="", sorting="newest", publication_type="any", tags=[], **kwargs):
+        return self.repository.page(query, sorting, publication_type, tags, **kwargs)
+
+    def facet_counts(self, query="", publication_type="any", tags=[], **kwargs):
+        return self.repository.facet_counts(query, publication_type, tags, **kwargs)
@@ -0,0 +1,236 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.car_check.models import CarSpec
+from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+from app.modules.dataset.repositories import DataSetRepository
+from app.modules.explore import search
+from app.modules.explore.models import DataSetSearchDocument
+from app.modules.explore.search import MariaDBFullTextBackend, SearchIndexService
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.models import Hubfile
+
+CARS = [
+    {"company": "Toyota", "engine": "I4", "fuel": "Petrol", "hp": 140, "price": 25000.0, "seats": 5},
+    {"company": "Toyota", "engine": "V6", "fuel": "Hybrid", "hp": 300, "price": 45000.0, "seats": 5},
+    {"company": "Ferrari", "engine": "V8", "fuel": "Petrol", "hp": 750, "price": 300000.0, "seats": 2},
+]
+
+
+@pytest.fixture(scope="module")
+def test_client(test_client):
+    """
+    Extends the test_client fixture to add additional specific data for module testing.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email="test@example.com").first()
+        for i, car in enumerate(CARS):
+            meta = DSMetaData(
+                title=f"Cars {i}",
+                description="Explore test dataset",
+                publication_type=PublicationType.NONE,
+                dataset_doi=f"10.1234/explore{i}",
+            )
+            db.session.add(meta)
+            db.session.flush()
+            db.session.add(Author(name=f"Author {i}", ds_meta_data_id=meta.id))
+            fm_meta = FMMetaData(
+                car_filename=f"car{i}.car", title=f"Car {i}", description="car", publication_type=PublicationType.NONE
+            )
+            dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+            db.session.add_all([fm_meta, dataset])
+            db.session.flush()
+            fm = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+            db.session.add(fm)
+            db.session.flush()
+            hubfile = Hubfile(name=f"car{i}.car", checksum=f"explore{i}", size=1, feature_model_id=fm.id)
+            db.session.add(hubfile)
+            db.session.flush()
+            db.session.add(
+                CarSpec(
+                    hubfile_id=hubfile.id,
+                    feature_model_id=fm.id,
+                    valid=True,
+                    errors=[],
+                    data={},
+                    checker_version="test",
+                    **car,
+                )
+            )
+        db.session.commit()
+        DataSetRepository().refresh_file_aggregates()
+        SearchIndexService().reindex_all()
+
+    yield test_client
+
+
+@pytest.fixture
+def full_text_backend(test_client):
+    """SEARCH_BACKEND of the full-text index of the database the tests run on."""
+    with test_client.application.app_context():
+        dialect = db.engine.dialect.name
+    backend = {"sqlite": "fts5", "mysql": "fulltext", "mariadb": "fulltext"}.get(dialect)
+    if backend is None:
+        pytest.skip(f"No full-text search backend for {dialect}")
+    return backend
+
+
+def titles(response):
+    return sorted(dataset["title"] for dataset in response.get_json()["datasets"])
+
+
+def test_filter_by_spec_ranges(test_client):
+    response = test_client.post("/explore", json={"query": "", "specs": {"hp": {"min": 200, "max": 400}}})
+    assert response.status_code == 200
+    assert titles(response) == ["Cars 1"]
+
+    response = test_client.post("/explore", json={"query": "", "specs": {"price": {"max": 50000}, "seats": {"min": 5}}})
+    assert titles(response) == ["Cars 0", "Cars 1"]
+
+
+def test_filter_by_facet_values(test_client):
+    response = test_client.post("/explore", json={"query": "", "facets": {"fuel": ["Petrol"]}})
+    assert titles(response) == ["Cars 0", "Cars 2"]
+
+
+def test_facet_counts(test_client):
+    response = test_client.post("/explore/facets", json={"query": "", "specs": {"price": {"max": 50000}}})
+    assert response.status_code == 200
+    counts = response.get_json()
+    assert counts["company"] == [{"value": "Toyota", "count": 2}]
+    assert counts["fuel"] == [{"value": "Hybrid", "count": 1}, {"value": "Petrol", "count": 1}]
+    assert len(counts["engine"]) == 2
+
+
+@pytest.mark.parametrize("backend", ["full_text", "memory", "like"])
+def test_search_backends_match_words(test_client, request, monkeypatch, backend):
+    if backend == "full_text":
+        backend = request.getfixturevalue("full_text_backend")
+    monkeypatch.setenv("SEARCH_BACKEND", backend)
+    response = test_client.post("/explore", json={"query": "car2"})
+    assert titles(response) == ["Cars 2"]
+
+
+@pytest.mark.parametrize("backend", ["full_text", "memory"])
+def test_search_relevance_ranking(test_client, request, monkeypatch, backend):
+    if backend == "full_text":
+        backend = request.getfixturevalue("full_text_backend")
+    monkeypatch.setenv("SEARCH_BACKEND", backend)
+    response = test_client.post("/explore", json={"query": "Toyota hybr", "sorting": "relevance"})
+    assert [dataset["title"] for dataset in response.get_json()["datasets"]] == ["Cars 1", "Cars 0"]
+
+
+def test_mariadb_full_text_backend(test_client, full_text_backend):
+    if full_text_backend != "fulltext":
+        pytest.skip("MariaDB full-text search needs MariaDB")
+    with test_client.application.app_context():
+        backend = MariaDBFullTextBackend()
+        # Words shorter than innodb_ft_min_token_size are left to the ILIKE search
+        assert backend.filter(DataSet.query, ["v6"]) is None
+
+        datasets, score, _ = backend.filter(DataSet.query, ["ferr"])
+        assert [dataset.ds_meta_data.title for dataset in datasets] == ["Cars 2"]
+        datasets, score, _ = backend.filter(DataSet.query, ["toyota", "hybrid"])
+        ranked = datasets.order_by(score.desc()).all()
+        assert [dataset.ds_meta_data.title for dataset in ranked] == ["Cars 1", "Cars 0"]
+
+
+def test_search_index_updated_on_dataset_change(test_client, monkeypatch, full_text_backend):
+    monkeypatch.setenv("SEARCH_BACKEND", "memory")
+    assert titles(test_client.post("/explore", json={"query": "roadster"})) == []
+
+    with test_client.application.app_context():
+        meta = DSMetaData.query.filter_by(title="Cars 2").first()
+        meta.description = "Mid-engine roadster"
+        SearchIndexService().index_dataset(meta.data_set)
+
+    for backend in ("memory", full_text_backend):
+        monkeypatch.setenv("SEARCH_BACKEND", backend)
+        assert titles(test_client.post("/explore", json={"query": "roadster"})) == ["Cars 2"]
+
+
+@pytest.mark.parametrize("sorting", ["newest", "oldest", "relevance"])
+def test_cursor_pagination(test_client, sorting):
+    criteria = {"query": "car", "sorting": sorting, "limit": 2}
+    first = test_client.post("/explore", json=criteria).get_json()
+    assert len(first["datasets"]) == 2 and first["next_cursor"]
+
+    second = test_client.post("/explore", json={**criteria, "cursor": first["next_cursor"]}).get_json()
+    assert second["next_cursor"] is None
+
+    everything = test_client.post("/explore", json={**criteria, "limit": 100}).get_json()
+    assert [dataset["id"] for dataset in first["datasets"] + second["datasets"]] == [
+        dataset["id"] for dataset in everything["datasets"]
+    ]
+
+
+def test_memory_search_flags_truncated_results(test_client, monkeypatch):
+    monkeypatch.setenv("SEARCH_BACKEND", "memory")
+    monkeypatch.setattr(search, "MEMORY_SEARCH_LIMIT", 2)
+    criteria = {"query": "car", "sorting": "relevance", "limit": 1}
+    first = test_client.post("/explore", json=criteria).get_json()
+    assert first["truncated"] and first["next_cursor"]
+
+    last = test_client.post("/explore", json={**criteria, "cursor": first["next_cursor"]}).get_json()
+    assert len(last["datasets"]) == 1 and last["next_cursor"] is None and last["truncated"]
+
+    monkeypatch.setattr(search, "MEMORY_SEARCH_LIMIT", 3)
+    assert not test_client.post("/explore", json={"query": "car"}).get_json()["truncated"]
+
+
+def test_invalid_cursor(test_client):
+    response = test_client.post("/explore", json={"query": "", "cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("url", ["/explore", "/explore/facets"])
+@pytest.mark.parametrize("body", [{"json": ["car"]}, {"json": {}}, {"data": "not json"}, {}])
+def test_invalid_criteria(test_client, url, body):
+    response = test_client.post(url, **body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Expected a JSON object with the search criteria"}
+
+
+def count_queries(test_client, criteria):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with test_client.application.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = test_client.post("/explore", json=criteria)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+def test_serializing_a_page_takes_a_constant_number_of_queries(test_client):
+    one, page = count_queries(test_client, {"query": "", "limit": 1})
+    assert len(page["datasets"]) == 1
+    three, page = count_queries(test_client, {"query": "", "limit": 3})
+    assert len(page["datasets"]) == 3
+    assert all(dataset["files_count"] == 1 and dataset["total_size_in_bytes"] == 1 for dataset in page["datasets"])
+    assert one == three
+
+
+def test_memory_index_picks_up_documents_committed_late(test_client):
+    backend = search.InvertedIndexBackend()
+    with test_client.application.app_context():
+        assert backend.scores(["car"])
+        newest = db.session.query(db.func.max(DataSetSearchDocument.updated_at)).scalar()
+        # Stamped before the newest document the index has seen, but only committed now
+        document = DataSetSearchDocument.query.join(DataSet).join(DSMetaData).filter(DSMetaData.title == "Cars 0").one()
+        document.content += " latecomer"
+        document.updated_at = newest - timedelta(seconds=30)
+        db.session.commit()
+
+        assert list(backend.scores(["latecomer"])) == [document.data_set_id]
+        SearchIndexService().index_dataset(document.data_set)
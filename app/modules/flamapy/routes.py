@@ -1,17 +1,15 @@
 import logging
-import os
-import tempfile
 
 from antlr4 import CommonTokenStream, FileStream
 from antlr4.error.ErrorListener import ErrorListener
-from flamapy.metamodels.fm_metamodel.transformations import GlencoeWriter, SPLOTWriter, UVLReader
-from flamapy.metamodels.pysat_metamodel.transformations import DimacsWriter, FmToPysat
-from flask import jsonify, send_file
+from flask import current_app, jsonify
 from uvl.UVLCustomLexer import UVLCustomLexer
 from uvl.UVLPythonParser import UVLPythonParser
 
 from app.modules.flamapy import flamapy_bp
+from app.modules.flamapy.services import conversion_artifact_store
 from app.modules.hubfile.services import HubfileService
+from core.downloads.offload import send_download
 
 logger = logging.getLogger(__name__)
 
@@ -72,45 +70,28 @@ def valid(file_id):
 
 @flamapy_bp.route("/flamapy/to_glencoe/<int:file_id>", methods=["GET"])
 def to_glencoe(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
-    try:
-        hubfile = HubfileService().get_or_404(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        GlencoeWriter(temp_file.name, fm).transform()
-
-        # Return the file in the response
-        return send_file(temp_file.name, as_attachment=True, download_name=f"{hubfile.name}_glencoe.txt")
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+    return send_conversion(file_id, "glencoe")
 
 
 @flamapy_bp.route("/flamapy/to_splot/<int:file_id>", methods=["GET"])
 def to_splot(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".splx", delete=False)
-    try:
-        hubfile = HubfileService().get_by_id(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        SPLOTWriter(temp_file.name, fm).transform()
-
-        # Return the file in the response
-        return send_file(temp_file.name, as_attachment=True, download_name=f"{hubfile.name}_splot.txt")
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+    return send_conversion(file_id, "splot")
 
 
 @flamapy_bp.route("/flamapy/to_cnf/<int:file_id>", methods=["GET"])
 def to_cnf(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".cnf", delete=False)
-    try:
-        hubfile = HubfileService().get_by_id(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        sat = FmToPysat(fm).transform()
-        DimacsWriter(temp_file.name, sat).transform()
-
-        # Return the file in the response
-        return send_file(temp_file.name, as_attachment=True, download_name=f"{hubfile.name}_cnf.txt")
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+    return send_conversion(file_id, "cnf")
+
+
+def send_conversion(file_id, fmt):
+    hubfile = HubfileService().get_or_404(file_id)
+    # Converted once per file and format, then served from the artifact store
+    path = conversion_artifact_store.get_or_build(hubfile, fmt)
+    response = send_download(
+        path,
+        f"{hubfile.name}_{fmt}.txt",
+        mimetype="text/plain",
+        etag=conversion_artifact_store.etag(hubfile, fmt),
+    )
+    response.cache_control.max_age = current_app.config.get("FLAMAPY_ARTIFACT_MAX_AGE", 86400)
+    return response
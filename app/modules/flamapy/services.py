@@ -1,7 +1,211 @@
-from app.modules.flamapy.repositories import FlamapyRepository
-from core.services.BaseService import BaseService
+import logging
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, version
+from typing import Callable, List, NamedTuple, Optional
 
+from flamapy.metamodels.fm_metamodel.models import FeatureModel
+from flamapy.metamodels.fm_metamodel.transformations import GlencoeWriter, SPLOTWriter, UVLReader
+from flamapy.metamodels.pysat_metamodel.models import PySATModel
+from flamapy.metamodels.pysat_metamodel.transformations import DimacsWriter, FmToPysat
+from rq import Queue
 
-class FlamapyService(BaseService):
-    def __init__(self):
-        super().__init__(FlamapyRepository())
+from app.modules.dataset.models import DataSet
+from app.modules.hubfile.services import HubfileService
+from core.caching.cache import LRUCache, get_redis_client
+from core.jobs.context import job_app_context
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def flamapy_version(package: str = "flamapy-fm") -> str:
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def file_key(hubfile) -> str:
+    """Key of the content of a file. MD5 alone can collide, so files without a SHA-256 are keyed by their id."""
+    if hubfile.sha256:
+        return hubfile.sha256
+    return f"hubfile-{hubfile.id}-{hubfile.checksum}"
+
+
+def flamapy_cache_dir() -> str:
+    """Parsed models are pickled here: FLAMAPY_CACHE_DIR, never under the uploads folder the web server serves."""
+    return os.getenv("FLAMAPY_CACHE_DIR") or os.path.join(os.getenv("WORKING_DIR", ""), "flamapy_cache")
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class FeatureModelCache:
+    """
+    Parsed feature models, and their CNF, by `file_key`.
+
+    They are kept in a bounded in-process LRU (FLAMAPY_MODEL_CACHE_SIZE) and pickled on disk, where every
+    gunicorn worker finds them, so a file is parsed once. The disk cache lives in a directory per flamapy
+    version under `flamapy_cache_dir()`, as pickles do not survive changes to its classes.
+    """
+
+    def __init__(self, cache_dir: str = None, maxsize: int = None):
+        if cache_dir is None:
+            cache_dir = os.path.join(flamapy_cache_dir(), f"flamapy-{flamapy_version()}")
+        if maxsize is None:
+            maxsize = int(os.getenv("FLAMAPY_MODEL_CACHE_SIZE", "64"))
+        self.cache_dir = cache_dir
+        self.memory = LRUCache(maxsize=maxsize)
+
+    def model(self, hubfile) -> FeatureModel:
+        return self._get(hubfile, "fm", lambda: UVLReader(hubfile.get_path()).transform())
+
+    def cnf(self, hubfile) -> PySATModel:
+        return self._get(hubfile, "cnf", lambda: FmToPysat(self.model(hubfile)).transform())
+
+    def _get(self, hubfile, kind: str, build: Callable):
+        key = f"{file_key(hubfile)}.{kind}"
+        value = self.memory.get(key)
+        if value is None:
+            value = self._load(key)
+            if value is None:
+                value = build()
+                self._store(key, value)
+            self.memory.set(key, value)
+        return value
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pickle")
+
+    def _load(self, key: str):
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            logger.warning(f"Discarding unreadable cached model {self._path(key)}: {exc}")
+            remove_file(self._path(key))
+            return None
+
+    def _store(self, key: str, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, part_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(part_path, self._path(key))
+        except Exception as exc:
+            # Deeply nested models can exceed the recursion limit of pickle; they stay in memory only
+            logger.warning(f"Could not cache model {key} on disk: {exc}")
+            remove_file(part_path)
+
+    def clear(self):
+        self.memory.clear()
+
+
+feature_model_cache = FeatureModelCache()
+
+
+class ArtifactFormat(NamedTuple):
+    package: str  # Distribution of the writer, whose version is part of the artifact key
+    writer: type
+    source: str  # "model" or "cnf"
+    suffix: str
+
+
+ARTIFACT_FORMATS = {
+    "glencoe": ArtifactFormat("flamapy-fm", GlencoeWriter, "model", ".json"),
+    "splot": ArtifactFormat("flamapy-fm", SPLOTWriter, "model", ".splx"),
+    "cnf": ArtifactFormat("flamapy-sat", DimacsWriter, "cnf", ".cnf"),
+}
+
+FLAMAPY_QUEUE = "flamapy"
+
+
+def get_flamapy_queue() -> Optional[Queue]:
+    """rq queue of the conversions built ahead of time, or None when REDIS_URL is not configured."""
+    connection = get_redis_client()
+    if connection is None:
+        return None
+    return Queue(FLAMAPY_QUEUE, connection=connection)
+
+
+def build_conversion_artifacts(hubfile_ids: List[int]):
+    """rq job: write every conversion of some files before they are first requested."""
+    with job_app_context():
+        hubfile_service = HubfileService()
+        for hubfile_id in hubfile_ids:
+            hubfile = hubfile_service.get_by_id(hubfile_id)
+            if hubfile is not None:
+                conversion_artifact_store.build_all(hubfile)
+
+
+class ConversionArtifactStore:
+    """
+    Glencoe, SPLOT and DIMACS conversions of the files, written once per (`file_key`, format, writer version)
+    under the uploads folder and then served as they are.
+    """
+
+    def __init__(self, root: str = None, model_cache: FeatureModelCache = None):
+        if root is None:
+            root = os.path.join(os.getenv("WORKING_DIR", ""), "uploads", "flamapy_artifacts")
+        self.root = root
+        self.model_cache = model_cache if model_cache is not None else feature_model_cache
+
+    def path(self, hubfile, fmt: str) -> str:
+        spec = ARTIFACT_FORMATS[fmt]
+        return os.path.join(self.root, fmt, flamapy_version(spec.package), f"{file_key(hubfile)}{spec.suffix}")
+
+    def etag(self, hubfile, fmt: str) -> str:
+        return f"{file_key(hubfile)}-{fmt}-{flamapy_version(ARTIFACT_FORMATS[fmt].package)}"
+
+    def get_or_build(self, hubfile, fmt: str) -> str:
+        path = self.path(hubfile, fmt)
+        if not os.path.exists(path):
+            self._build(hubfile, fmt, path)
+        return path
+
+    def build_all(self, hubfile) -> int:
+        """Build the missing conversions of a file, returning how many formats are available."""
+        built = 0
+        for fmt in ARTIFACT_FORMATS:
+            try:
+                self.get_or_build(hubfile, fmt)
+                built += 1
+            except Exception as exc:
+                logger.warning(f"Could not convert file {hubfile.id} to {fmt}: {exc}")
+        return built
+
+    def enqueue(self, dataset: DataSet):
+        """Queue the conversion of the files of a dataset on the rq workers; a no-op without REDIS_URL."""
+        queue = get_flamapy_queue()
+        if queue is None:
+            return None
+        hubfile_ids = [hubfile.id for feature_model in dataset.feature_models for hubfile in feature_model.files]
+        return queue.enqueue(
+            build_conversion_artifacts, hubfile_ids, description=f"Flamapy conversions of dataset {dataset.id}"
+        )
+
+    def _build(self, hubfile, fmt: str, path: str):
+        spec = ARTIFACT_FORMATS[fmt]
+        source = self.model_cache.model(hubfile) if spec.source == "model" else self.model_cache.cnf(hubfile)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, part_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        os.close(fd)
+        try:
+            spec.writer(part_path, source).transform()
+            os.replace(part_path, path)
+        except BaseException:
+            remove_file(part_path)
+            raise
+
+
+conversion_artifact_store = ConversionArtifactStore()
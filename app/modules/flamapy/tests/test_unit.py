@@ -1,4 +1,20 @@
+import os
+from types import SimpleNamespace
+
 import pytest
+from flamapy.metamodels.fm_metamodel.transformations import UVLReader
+from flamapy.metamodels.pysat_metamodel.transformations import DimacsWriter, FmToPysat
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.flamapy import routes, services
+from app.modules.flamapy.services import ConversionArtifactStore, FeatureModelCache
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.services import HubfileService, hubfile_location_cache
+
+UVL_EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "dataset", "uvl_examples", "file1.uvl")
 
 
 @pytest.fixture(scope="module")
@@ -7,9 +23,24 @@ def test_client(test_client):
     Extends the test_client fixture to add additional specific data for module testing.
     """
     with test_client.application.app_context():
-        # Add HERE new elements to the database that you want to exist in the test context.
-        # DO NOT FORGET to use db.session.add(<element>) and db.session.commit() to save the data.
-        pass
+        user = User.query.filter_by(email="test@example.com").first()
+        meta = DSMetaData(title="Flamapy", description="uvl", publication_type=PublicationType.NONE, tags="uvl")
+        db.session.add(meta)
+        db.session.flush()
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+        db.session.add(dataset)
+        db.session.flush()
+        fm_meta = FMMetaData(
+            car_filename="file1.uvl", title="uvl", description="uvl", publication_type=PublicationType.NONE
+        )
+        db.session.add(fm_meta)
+        db.session.flush()
+        feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+        db.session.add(feature_model)
+        db.session.flush()
+        db.session.add(Hubfile(name="file1.uvl", checksum="b" * 32, size=1, feature_model_id=feature_model.id))
+        db.session.commit()
+    hubfile_location_cache.clear()
 
     yield test_client
 
@@ -22,3 +53,71 @@ def test_sample_assertion(test_client):
     """
     greeting = "Hello, World!"
     assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_models_are_parsed_once(test_client, tmp_path, monkeypatch):
+    hubfile = SimpleNamespace(sha256="a" * 64, checksum="md5", get_path=lambda: UVL_EXAMPLE)
+    cache = FeatureModelCache(cache_dir=str(tmp_path), maxsize=4)
+    model = cache.model(hubfile)
+    cnf = cache.cnf(hubfile)
+    assert cache.model(hubfile) is model
+    assert sorted(os.listdir(tmp_path)) == [f"{'a' * 64}.cnf.pickle", f"{'a' * 64}.fm.pickle"]
+
+    def parse_again(*args):
+        raise AssertionError("the model was parsed again")
+
+    monkeypatch.setattr(services, "UVLReader", parse_again)
+    monkeypatch.setattr(services, "FmToPysat", parse_again)
+    # Another worker process: nothing in memory, everything on disk
+    other_worker = FeatureModelCache(cache_dir=str(tmp_path), maxsize=4)
+    assert [feature.name for feature in other_worker.model(hubfile).get_features()] == [
+        feature.name for feature in model.get_features()
+    ]
+    assert other_worker.cnf(hubfile).get_all_clauses().clauses == cnf.get_all_clauses().clauses
+
+
+def test_conversions_are_stored_and_served_with_etags(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    hubfile = Hubfile.query.filter_by(name="file1.uvl").one()
+    path = HubfileService().get_legacy_path_by_hubfile(hubfile)
+    os.makedirs(os.path.dirname(path))
+    with open(UVL_EXAMPLE, "rb") as source, open(path, "wb") as f:
+        f.write(source.read())
+    store = ConversionArtifactStore(
+        root=str(tmp_path / "uploads" / "flamapy_artifacts"), model_cache=FeatureModelCache(str(tmp_path / "fm"), 4)
+    )
+    monkeypatch.setattr(routes, "conversion_artifact_store", store)
+
+    response = test_client.get(f"/flamapy/to_cnf/{hubfile.id}")
+    assert response.status_code == 200
+    assert response.cache_control.max_age == 86400
+    etag = response.headers["ETag"]
+    expected = tmp_path / "expected.cnf"
+    DimacsWriter(str(expected), FmToPysat(UVLReader(UVL_EXAMPLE).transform()).transform()).transform()
+    assert response.data == expected.read_bytes()
+    response.close()
+
+    artifact = store.path(hubfile, "cnf")
+    built_at = os.stat(artifact).st_mtime_ns
+    response = test_client.get(f"/flamapy/to_cnf/{hubfile.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response.close()
+    assert os.stat(artifact).st_mtime_ns == built_at
+
+    assert store.build_all(hubfile) == 3
+    assert test_client.get(f"/flamapy/to_glencoe/{hubfile.id}").status_code == 200
+    assert test_client.get("/flamapy/to_splot/999999").status_code == 404
+
+
+def test_cache_keys_and_location(test_client, tmp_path, monkeypatch):
+    # Files with the same MD5 only share a model when their SHA-256 says they are the same file
+    first = SimpleNamespace(id=1, sha256=None, checksum="c" * 32)
+    second = SimpleNamespace(id=2, sha256=None, checksum="c" * 32)
+    assert services.file_key(first) != services.file_key(second)
+    assert services.file_key(SimpleNamespace(id=1, sha256="a" * 64, checksum="c" * 32)) == "a" * 64
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.delenv("FLAMAPY_CACHE_DIR", raising=False)
+    assert not FeatureModelCache().cache_dir.startswith(str(tmp_path / "uploads"))
+    monkeypatch.setenv("FLAMAPY_CACHE_DIR", str(tmp_path / "cache"))
+    assert FeatureModelCache().cache_dir.startswith(str(tmp_path / "cache"))
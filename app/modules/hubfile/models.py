@@ -4,7 +4,25 @@ from flask import request
 
 from app import db
 from app.modules.auth.models import User
-from app.modules.dataset.models import DataSet
+from app.modules.dataset.models import DataSet, RecordUserKeyMixin
+
+
+class FileBlob(db.Model):
+    """
+    Content stored once in the blob store, shared by every Hubfile with the same SHA-256.
+
+    `ref_count` is kept by mapper events on Hubfile; blobs no longer referenced are removed by
+    `rosemary hubfile:blobs --gc`.
+    """
+
+    __tablename__ = "file_blob"
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"FileBlob<{self.sha256}>"
 
 
 class Hubfile(db.Model):
@@ -12,13 +30,15 @@ class Hubfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     checksum = db.Column(db.String(120), nullable=False)
+    # Content in the blob store; files uploaded before it existed have none and live in their dataset folder
+    sha256 = db.Column(db.String(64), db.ForeignKey("file_blob.sha256"), nullable=True, index=True)
     size = db.Column(db.Integer, nullable=False)
     feature_model_id = db.Column(db.Integer, db.ForeignKey("feature_model.id"), nullable=False)
 
-    def get_formatted_size(self):
+    def get_formatted_size(self, size_service=None):
         from app.modules.dataset.services import SizeService
 
-        return SizeService().get_human_readable_size(self.size)
+        return (size_service or SizeService()).get_human_readable_size(self.size)
 
     def get_owner_user(self) -> User:
         from app.modules.hubfile.services import HubfileService
@@ -35,13 +55,14 @@ class Hubfile(db.Model):
 
         return HubfileService().get_path_by_hubfile(self)
 
-    def to_dict(self):
+    def to_dict(self, size_service=None):
         return {
             "id": self.id,
             "name": self.name,
             "checksum": self.checksum,
+            "sha256": self.sha256,
             "size_in_bytes": self.size,
-            "size_in_human_format": self.get_formatted_size(),
+            "size_in_human_format": self.get_formatted_size(size_service),
             "url": f'{request.host_url.rstrip("/")}/file/download/{self.id}',
         }
 
@@ -49,19 +70,23 @@ class Hubfile(db.Model):
         return f"File<{self.id}>"
 
 
-class HubfileViewRecord(db.Model):
+class HubfileViewRecord(RecordUserKeyMixin, db.Model):
     __tablename__ = "file_view_record"
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     file_id = db.Column(db.Integer, db.ForeignKey("file.id"), nullable=False)
     view_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-    view_cookie = db.Column(db.String(36))
+    view_cookie = db.Column(db.String(36), nullable=False)
+
+    __table_args__ = (
+        db.Index("uq_file_view_record_file_cookie_user", "file_id", "view_cookie", "user_key", unique=True),
+    )
 
     def __repr__(self):
         return "<FileViewRecord {}>".format(self.id)
 
 
-class HubfileDownloadRecord(db.Model):
+class HubfileDownloadRecord(RecordUserKeyMixin, db.Model):
     __tablename__ = "file_download_record"
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
@@ -69,6 +94,10 @@ class HubfileDownloadRecord(db.Model):
     download_date = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     download_cookie = db.Column(db.String(36), nullable=False)
 
+    __table_args__ = (
+        db.Index("uq_file_download_record_file_cookie_user", "file_id", "download_cookie", "user_key", unique=True),
+    )
+
     def __repr__(self):
         return (
             f"<FileDownload id={self.id} "
@@ -1,10 +1,13 @@
-from sqlalchemy import func
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, inspect, select, update
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 from app.modules.featuremodel.models import FeatureModel
-from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.hubfile.models import FileBlob, Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.statistics.tracking import insert_ignoring_duplicates
 from core.repositories.BaseRepository import BaseRepository
 
 
@@ -25,6 +28,19 @@ class HubfileRepository(BaseRepository):
     def get_dataset_by_hubfile(self, hubfile: Hubfile) -> DataSet:
         return db.session.query(DataSet).join(FeatureModel).join(Hubfile).filter(Hubfile.id == hubfile.id).first()
 
+    def get_location_by_hubfile(self, hubfile: Hubfile) -> Optional[Tuple[int, int]]:
+        """(owner id, dataset id) of a Hubfile: from its relationships when loaded, otherwise in a single query."""
+        if "feature_model" not in inspect(hubfile).unloaded:
+            feature_model = hubfile.feature_model
+            if feature_model is not None and "data_set" not in inspect(feature_model).unloaded:
+                return feature_model.data_set.user_id, feature_model.data_set.id
+        row = self.session.execute(
+            select(DataSet.user_id, DataSet.id)
+            .join(FeatureModel, FeatureModel.data_set_id == DataSet.id)
+            .where(FeatureModel.id == hubfile.feature_model_id)
+        ).first()
+        return tuple(row) if row else None
+
 
 class HubfileViewRecordRepository(BaseRepository):
     def __init__(self):
@@ -42,3 +58,57 @@ class HubfileDownloadRecordRepository(BaseRepository):
     def total_hubfile_downloads(self) -> int:
         max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
         return max_id if max_id is not None else 0
+
+
+class FileBlobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(FileBlob)
+
+    @staticmethod
+    def acquire(connection, sha256: str, size: int):
+        """Add a reference to a blob on `connection`, creating its row first if this is its first file."""
+        connection.execute(
+            insert_ignoring_duplicates(FileBlob.__table__, connection.dialect.name).values(
+                sha256=sha256, size=size, ref_count=0
+            )
+        )
+        connection.execute(update(FileBlob).where(FileBlob.sha256 == sha256).values(ref_count=FileBlob.ref_count + 1))
+
+    @staticmethod
+    def release(connection, sha256: str):
+        connection.execute(update(FileBlob).where(FileBlob.sha256 == sha256).values(ref_count=FileBlob.ref_count - 1))
+
+    def unreferenced(self) -> List[str]:
+        return list(self.session.scalars(select(FileBlob.sha256).where(FileBlob.ref_count <= 0)))
+
+    def delete_unreferenced(self, sha256: str) -> bool:
+        """
+        Delete the row of a blob unless it has been referenced again meanwhile, without committing: the row
+        stays locked, so `acquire` waits for the caller to remove the blob and commit.
+        """
+        locked = self.session.scalar(
+            select(FileBlob.sha256).where(FileBlob.sha256 == sha256, FileBlob.ref_count <= 0).with_for_update()
+        )
+        if locked is None:
+            return False
+        result = self.session.execute(delete(FileBlob).where(FileBlob.sha256 == sha256))
+        return result.rowcount == 1
+
+    def existing(self, hashes: Iterable[str], batch_size: int = 500) -> Set[str]:
+        hashes = list(hashes)
+        found = set()
+        for start in range(0, len(hashes), batch_size):
+            batch = hashes[start : start + batch_size]
+            found.update(self.session.scalars(select(FileBlob.sha256).where(FileBlob.sha256.in_(batch))))
+        return found
+
+    def recompute_ref_counts(self) -> int:
+        references = (
+            select(func.count(Hubfile.id))
+            .where(Hubfile.sha256 == FileBlob.sha256)
+            .correlate(FileBlob)
+            .scalar_subquery()
+        )
+        result = self.session.execute(update(FileBlob).values(ref_count=references))
+        self.session.commit()
+        return result.rowcount
@@ -1,21 +1,43 @@
+import logging
 import os
+import time
+from typing import Tuple
+
+from sqlalchemy import event, inspect, select
 
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
+from app.modules.featuremodel.models import FeatureModel
 from app.modules.hubfile.models import Hubfile
 from app.modules.hubfile.repositories import (
+    FileBlobRepository,
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from core.caching.cache import LRUCache
+from core.hashing.digests import hash_file
 from core.services.BaseService import BaseService
+from core.storage.blob_store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+# Owner and dataset of the files of each feature model, which never change once created
+hubfile_location_cache = LRUCache(maxsize=int(os.getenv("HUBFILE_LOCATION_CACHE_SIZE", "4096")))
 
 
 class HubfileService(BaseService):
-    def __init__(self):
+    # Blobs found on disk without a row are only removed once this old (in seconds): their row may not be
+    # committed yet
+    ORPHAN_BLOB_TTL = 3600
+
+    def __init__(self, blob_store: BlobStore = None, location_cache: LRUCache = None):
         super().__init__(HubfileRepository())
+        self.location_cache = location_cache if location_cache is not None else hubfile_location_cache
         self.hubfile_view_record_repository = HubfileViewRecordRepository()
         self.hubfile_download_record_repository = HubfileDownloadRecordRepository()
+        self.file_blob_repository = FileBlobRepository()
+        self.blob_store = blob_store or BlobStore()
 
     def get_owner_user_by_hubfile(self, hubfile: Hubfile) -> User:
         return self.repository.get_owner_user_by_hubfile(hubfile)
@@ -24,16 +46,101 @@ class HubfileService(BaseService):
         return self.repository.get_dataset_by_hubfile(hubfile)
 
     def get_path_by_hubfile(self, hubfile: Hubfile) -> str:
+        if hubfile.sha256:
+            blob_path = self.blob_store.path(hubfile.sha256)
+            if os.path.exists(blob_path):
+                return blob_path
+
+        # Not moved to the blob store yet: still in the folder of its dataset
+        return self.get_legacy_path_by_hubfile(hubfile)
+
+    def get_legacy_path_by_hubfile(self, hubfile: Hubfile) -> str:
+        location = self.location_cache.get(hubfile.feature_model_id)
+        if location is None:
+            location = self.repository.get_location_by_hubfile(hubfile)
+            if location is None:
+                raise ValueError(f"File {hubfile.id} does not belong to any dataset")
+            self.location_cache.set(hubfile.feature_model_id, location)
+        user_id, dataset_id = location
+        working_dir = os.getenv("WORKING_DIR", "")
+
+        return os.path.join(working_dir, "uploads", f"user_{user_id}", f"dataset_{dataset_id}", hubfile.name)
+
+    def store_blob(self, hubfile: Hubfile, source_path: str, move: bool = True) -> bool:
+        """Put the content of a Hubfile in the blob store; returns False if an identical file was already there."""
+        return self.blob_store.add(source_path, hubfile.sha256, move=move)
+
+    def migrate_to_blob_store(self, batch_size: int = 200) -> Tuple[int, int]:
+        """
+        Move the files still stored per dataset into the blob store, hashing those without a SHA-256.
+        Returns how many files were moved and how many of them were duplicates of a stored blob.
+        """
+        moved = duplicates = 0
+        last_id = 0
+        while True:
+            hubfiles = Hubfile.query.filter(Hubfile.id > last_id).order_by(Hubfile.id).limit(batch_size).all()
+            if not hubfiles:
+                break
+            last_id = hubfiles[-1].id
+            for hubfile in hubfiles:
+                legacy_path = self.get_legacy_path_by_hubfile(hubfile)
+                if not os.path.exists(legacy_path):
+                    continue
+                digests = hash_file(legacy_path)
+                # The reference to the blob is taken (and committed) before the file disappears from its folder
+                hubfile.sha256 = digests.sha256
+                self.repository.session.commit()
+                if not self.store_blob(hubfile, legacy_path):
+                    duplicates += 1
+                moved += 1
+        return moved, duplicates
 
-        hubfile_user = self.get_owner_user_by_hubfile(hubfile)
-        hubfile_dataset = self.get_dataset_by_hubfile(hubfile)
-        working_dir = os.getenv("WORKING_DIR")
+    def collect_blob_garbage(self) -> int:
+        """Remove the blobs no file refers to any more; returns how many were removed."""
+        session = self.file_blob_repository.session
+        removed = 0
+        for sha256 in self.file_blob_repository.unreferenced():
+            if not self.file_blob_repository.delete_unreferenced(sha256):
+                session.rollback()
+                continue
+            # The blob leaves its path while the row is locked: an upload of the same content waits for the
+            # commit, then finds neither row nor blob and stores its own copy
+            aside_path = self.blob_store.set_aside(sha256)
+            try:
+                session.commit()
+            except BaseException:
+                session.rollback()
+                if aside_path:
+                    self.blob_store.restore(sha256, aside_path)
+                raise
+            if aside_path:
+                self.blob_store.discard(aside_path)
+                removed += 1
 
-        path = os.path.join(
-            working_dir, "uploads", f"user_{hubfile_user.id}", f"dataset_{hubfile_dataset.id}", hubfile.name
-        )
+        now = time.time()
+        stored = list(self.blob_store)
+        known = self.file_blob_repository.existing(stored)
+        for sha256 in stored:
+            if sha256 in known:
+                continue
+            try:
+                if now - os.path.getmtime(self.blob_store.path(sha256)) > self.ORPHAN_BLOB_TTL:
+                    removed += self._remove_orphan_blob(sha256)
+            except FileNotFoundError:
+                continue
+        return removed
 
-        return path
+    def _remove_orphan_blob(self, sha256: str) -> bool:
+        aside_path = self.blob_store.set_aside(sha256)
+        if aside_path is None:
+            return False
+        # A file may have taken a reference since the blob was listed; end the transaction to see it
+        self.file_blob_repository.session.commit()
+        if self.file_blob_repository.existing([sha256]):
+            self.blob_store.restore(sha256, aside_path)
+            return False
+        self.blob_store.discard(aside_path)
+        return True
 
     def total_hubfile_views(self) -> int:
         return self.hubfile_view_record_repository.total_hubfile_views()
@@ -46,3 +153,38 @@ class HubfileService(BaseService):
 class HubfileDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(HubfileDownloadRecordRepository())
+
+
+# Blob reference counts: mapper events run inside the flush, on the connection that writes the files
+
+
+@event.listens_for(Hubfile, "before_insert")
+def _hubfile_inserted(mapper, connection, target):
+    if target.sha256:
+        FileBlobRepository.acquire(connection, target.sha256, target.size)
+
+
+@event.listens_for(Hubfile, "before_update")
+def _hubfile_content_changed(mapper, connection, target):
+    if not inspect(target).attrs.sha256.history.has_changes():
+        return
+    # The old hash may not be loaded in the session, but the row still holds it
+    old_sha256 = connection.execute(select(Hubfile.sha256).where(Hubfile.id == target.id)).scalar()
+    if old_sha256 == target.sha256:
+        return
+    if target.sha256:
+        FileBlobRepository.acquire(connection, target.sha256, target.size)
+    if old_sha256:
+        FileBlobRepository.release(connection, old_sha256)
+
+
+@event.listens_for(Hubfile, "after_delete")
+def _hubfile_deleted(mapper, connection, target):
+    if target.sha256:
+        FileBlobRepository.release(connection, target.sha256)
+
+
+@event.listens_for(FeatureModel, "after_delete")
+def _feature_model_deleted(mapper, connection, target):
+    # Its id may be reused (SQLite reuses the highest one) by a feature model of another dataset
+    hubfile_location_cache.delete(target.id)
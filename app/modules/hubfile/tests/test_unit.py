@@ -1,4 +1,19 @@
+import hashlib
+import os
+
 import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.models import FileBlob, Hubfile
+from app.modules.hubfile.services import HubfileService, hubfile_location_cache
+from core.storage.blob_store import BlobStore
+
+CONTENT = b"Company: ACME\nModel: Roadster\n"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
 
 
 @pytest.fixture(scope="module")
@@ -7,13 +22,38 @@ def test_client(test_client):
     Extends the test_client fixture to add additional specific data for module testing.
     """
     with test_client.application.app_context():
-        # Add HERE new elements to the database that you want to exist in the test context.
-        # DO NOT FORGET to use db.session.add(<element>) and db.session.commit() to save the data.
-        pass
+        user = User.query.filter_by(email="test@example.com").first()
+        meta = DSMetaData(title="Blobs", description="blobs", publication_type=PublicationType.NONE, tags="blobs")
+        db.session.add(meta)
+        db.session.flush()
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+        db.session.add(dataset)
+        db.session.flush()
+        for i in range(2):
+            fm_meta = FMMetaData(
+                car_filename=f"blob{i}.car", title="blob", description="blob", publication_type=PublicationType.NONE
+            )
+            db.session.add(fm_meta)
+            db.session.flush()
+            db.session.add(FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id))
+        db.session.commit()
+    hubfile_location_cache.clear()
 
     yield test_client
 
 
+@pytest.fixture
+def hubfile_service(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    return HubfileService(blob_store=BlobStore(str(tmp_path / "blobs")))
+
+
+def upload(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(CONTENT)
+    return str(path)
+
+
 def test_sample_assertion(test_client):
     """
     Sample test to verify that the test framework and environment are working correctly.
@@ -22,3 +62,147 @@ def test_sample_assertion(test_client):
     """
     greeting = "Hello, World!"
     assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_identical_files_share_one_blob(test_client, tmp_path, hubfile_service):
+    hubfiles = []
+    for i, feature_model in enumerate(FeatureModel.query.order_by(FeatureModel.id).all()):
+        hubfile = Hubfile(
+            name=f"blob{i}.car", checksum="md5", sha256=SHA256, size=len(CONTENT), feature_model_id=feature_model.id
+        )
+        db.session.add(hubfile)
+        db.session.commit()
+        hubfiles.append(hubfile)
+        assert hubfile_service.store_blob(hubfile, upload(tmp_path, f"blob{i}.car")) == (i == 0)
+
+    assert list(hubfile_service.blob_store) == [SHA256]
+    assert db.session.get(FileBlob, SHA256).ref_count == 2
+    for hubfile in hubfiles:
+        with open(hubfile_service.get_path_by_hubfile(hubfile), "rb") as f:
+            assert f.read() == CONTENT
+
+    db.session.delete(hubfiles[0])
+    db.session.commit()
+    assert hubfile_service.collect_blob_garbage() == 0
+    assert db.session.get(FileBlob, SHA256).ref_count == 1
+
+    db.session.delete(hubfiles[1])
+    db.session.commit()
+    assert hubfile_service.collect_blob_garbage() == 1
+    assert db.session.get(FileBlob, SHA256) is None
+    assert list(hubfile_service.blob_store) == []
+
+
+def test_identical_upload_during_blob_garbage_collection(test_client, tmp_path, hubfile_service, monkeypatch):
+    feature_model = FeatureModel.query.first()
+    hubfile = Hubfile(
+        name="gone.car", checksum="md5", sha256=SHA256, size=len(CONTENT), feature_model_id=feature_model.id
+    )
+    db.session.add(hubfile)
+    db.session.commit()
+    hubfile_service.store_blob(hubfile, upload(tmp_path, "gone.car"))
+    db.session.delete(hubfile)
+    db.session.commit()
+
+    uploaded = []
+    discard = hubfile_service.blob_store.discard
+
+    def upload_then_discard(aside_path):
+        # The earliest an identical upload can take its reference: right after the collector commits
+        again = Hubfile(
+            name="again.car", checksum="md5", sha256=SHA256, size=len(CONTENT), feature_model_id=feature_model.id
+        )
+        db.session.add(again)
+        db.session.commit()
+        assert hubfile_service.store_blob(again, upload(tmp_path, "again.car"))
+        uploaded.append(again)
+        discard(aside_path)
+
+    monkeypatch.setattr(hubfile_service.blob_store, "discard", upload_then_discard)
+    assert hubfile_service.collect_blob_garbage() == 1
+    monkeypatch.setattr(hubfile_service.blob_store, "discard", discard)
+
+    with open(hubfile_service.get_path_by_hubfile(uploaded[0]), "rb") as f:
+        assert f.read() == CONTENT
+    assert db.session.get(FileBlob, SHA256).ref_count == 1
+    db.session.delete(uploaded[0])
+    db.session.commit()
+    assert hubfile_service.collect_blob_garbage() == 1
+
+
+def test_orphan_blob_referenced_during_collection_is_kept(test_client, tmp_path, hubfile_service, monkeypatch):
+    hubfile_service.blob_store.add(upload(tmp_path, "orphan.car"), SHA256)
+    os.utime(hubfile_service.blob_store.path(SHA256), (0, 0))
+    feature_model = FeatureModel.query.first()
+    referenced = []
+    set_aside = hubfile_service.blob_store.set_aside
+
+    def set_aside_then_reference(sha256):
+        aside_path = set_aside(sha256)
+        # An upload commits its reference after the collector listed the blob as an orphan
+        hubfile = Hubfile(
+            name="late.car", checksum="md5", sha256=sha256, size=len(CONTENT), feature_model_id=feature_model.id
+        )
+        db.session.add(hubfile)
+        db.session.commit()
+        referenced.append(hubfile)
+        return aside_path
+
+    monkeypatch.setattr(hubfile_service.blob_store, "set_aside", set_aside_then_reference)
+    assert hubfile_service.collect_blob_garbage() == 0
+    monkeypatch.setattr(hubfile_service.blob_store, "set_aside", set_aside)
+
+    assert list(hubfile_service.blob_store) == [SHA256]
+    db.session.delete(referenced[0])
+    db.session.commit()
+    assert hubfile_service.collect_blob_garbage() == 1
+
+
+def test_legacy_files_move_to_the_blob_store(test_client, hubfile_service):
+    feature_model = FeatureModel.query.first()
+    hubfile = Hubfile(name="legacy.car", checksum="md5", size=len(CONTENT), feature_model_id=feature_model.id)
+    db.session.add(hubfile)
+    db.session.commit()
+    legacy_path = hubfile_service.get_legacy_path_by_hubfile(hubfile)
+    os.makedirs(os.path.dirname(legacy_path))
+    with open(legacy_path, "wb") as f:
+        f.write(CONTENT)
+
+    assert hubfile_service.migrate_to_blob_store() == (1, 0)
+    assert hubfile.sha256 == SHA256
+    assert db.session.get(FileBlob, SHA256).ref_count == 1
+    assert not os.path.exists(legacy_path)
+    assert hubfile_service.get_path_by_hubfile(hubfile) == hubfile_service.blob_store.path(SHA256)
+
+    db.session.delete(hubfile)
+    db.session.commit()
+
+
+def test_legacy_path_is_resolved_once(test_client, hubfile_service):
+    feature_model = FeatureModel.query.first()
+    hubfile = Hubfile(name="located.car", checksum="md5", size=1, feature_model_id=feature_model.id)
+    db.session.add(hubfile)
+    db.session.commit()
+    db.session.expire_all()
+    hubfile = db.session.get(Hubfile, hubfile.id)
+    hubfile_location_cache.clear()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        path = hubfile_service.get_path_by_hubfile(hubfile)
+        assert len(statements) == 1
+        assert HubfileService().get_path_by_hubfile(hubfile) == path
+        assert len(statements) == 1
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    assert path.endswith(
+        os.path.join(f"user_{feature_model.data_set.user_id}", f"dataset_{feature_model.data_set_id}", "located.car")
+    )
+
+    db.session.delete(hubfile)
+    db.session.commit()
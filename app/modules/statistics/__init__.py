@@ -0,0 +1,3 @@
+from core.blueprints.base_blueprint import BaseBlueprint
+
+statistics_bp = BaseBlueprint("statistics", __name__, template_folder="templates")
@@ -0,0 +1,12 @@
+from app import db
+
+
+class StatCounter(db.Model):
+    """Named counter of the public statistics, kept up to date as records are created and deleted."""
+
+    __tablename__ = "stat_counter"
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"StatCounter<{self.name}={self.value}>"
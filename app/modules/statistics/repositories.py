@@ -0,0 +1,56 @@
+from typing import Dict
+
+from sqlalchemy import event, func, insert, select, update
+
+from app.modules.dataset.models import DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+from app.modules.statistics.models import StatCounter
+from core.repositories.BaseRepository import BaseRepository
+
+# How each counter is computed from scratch, used to initialise and recompute them
+COUNTER_QUERIES = {
+    "datasets": select(func.count(DataSet.id)).join(DSMetaData).where(DSMetaData.dataset_doi.isnot(None)),
+    "feature_models": select(func.count(FeatureModel.id)),
+    "dataset_downloads": select(func.count(DSDownloadRecord.id)),
+    "dataset_views": select(func.count(DSViewRecord.id)),
+    "feature_model_downloads": select(func.count(HubfileDownloadRecord.id)),
+    "feature_model_views": select(func.count(HubfileViewRecord.id)),
+}
+
+
+@event.listens_for(StatCounter.__table__, "after_create")
+def _create_counters(table, connection, **kwargs):
+    # A new table comes with empty record tables, so every counter starts at 0
+    connection.execute(insert(table), [{"name": name, "value": 0} for name in COUNTER_QUERIES])
+
+
+class StatCounterRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(StatCounter)
+
+    def get_all(self) -> Dict[str, int]:
+        """Every counter in a single query; missing counters are 0."""
+        values = dict.fromkeys(COUNTER_QUERIES, 0)
+        values.update(self.session.execute(select(StatCounter.name, StatCounter.value)).all())
+        return values
+
+    @staticmethod
+    def increment(connection, name: str, delta: int = 1):
+        """
+        Atomically add `delta` to a counter on `connection`, so it commits or rolls back together with the
+        records it counts. Counters are created with their table or by the migration; one that went missing is
+        recreated from `delta` until `rosemary statistics:recompute` runs.
+        """
+        result = connection.execute(
+            update(StatCounter).where(StatCounter.name == name).values(value=StatCounter.value + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(StatCounter).values(name=name, value=delta))
+
+    def recompute(self) -> Dict[str, int]:
+        values = {name: self.session.execute(query).scalar() for name, query in COUNTER_QUERIES.items()}
+        for name, value in values.items():
+            self.session.merge(StatCounter(name=name, value=value))
+        self.session.commit()
+        return values
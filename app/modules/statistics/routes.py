@@ -0,0 +1,9 @@
+from flask import jsonify
+
+from app.modules.statistics import statistics_bp
+from app.modules.statistics.services import StatisticsService
+
+
+@statistics_bp.route("/statistics", methods=["GET"])
+def statistics():
+    return jsonify(StatisticsService().get_counters())
@@ -0,0 +1,95 @@
+import os
+from typing import Dict
+
+from sqlalchemy import event, inspect, select
+
+from app.modules.dataset.models import DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+from app.modules.statistics.repositories import StatCounterRepository
+from core.caching.cache import LRUCache
+from core.services.BaseService import BaseService
+
+# Counters are read from the database at most once per worker every STATISTICS_CACHE_TTL seconds
+statistics_cache = LRUCache(maxsize=1, ttl=float(os.getenv("STATISTICS_CACHE_TTL", "30")))
+
+
+class StatisticsService(BaseService):
+    def __init__(self, cache: LRUCache = None):
+        super().__init__(StatCounterRepository())
+        self.cache = cache if cache is not None else statistics_cache
+
+    def get_counters(self) -> Dict[str, int]:
+        counters = self.cache.get("counters")
+        if counters is None:
+            counters = self.repository.get_all()
+            self.cache.set("counters", counters)
+        return counters
+
+    def homepage_stats(self) -> Dict[str, int]:
+        """Every statistic of the public index, from a single cached query."""
+        counters = self.get_counters()
+        return {
+            "datasets_counter": counters["datasets"],
+            "feature_models_counter": counters["feature_models"],
+            "total_dataset_downloads": counters["dataset_downloads"],
+            "total_feature_model_downloads": counters["feature_model_downloads"],
+            "total_dataset_views": counters["dataset_views"],
+            "total_feature_model_views": counters["feature_model_views"],
+        }
+
+    def recompute(self) -> Dict[str, int]:
+        values = self.repository.recompute()
+        self.cache.clear()
+        return values
+
+
+# Counter maintenance: mapper events run inside the flush, on the connection that writes the records
+
+
+def _counts(name, delta):
+    def listener(mapper, connection, target):
+        StatCounterRepository.increment(connection, name, delta)
+
+    return listener
+
+
+for _model, _name in (
+    (FeatureModel, "feature_models"),
+    (DSDownloadRecord, "dataset_downloads"),
+    (DSViewRecord, "dataset_views"),
+    (HubfileDownloadRecord, "feature_model_downloads"),
+    (HubfileViewRecord, "feature_model_views"),
+):
+    event.listen(_model, "after_insert", _counts(_name, 1))
+event.listen(FeatureModel, "after_delete", _counts("feature_models", -1))
+
+
+def _is_synchronized(connection, ds_meta_data_id) -> bool:
+    doi = connection.execute(select(DSMetaData.dataset_doi).where(DSMetaData.id == ds_meta_data_id)).scalar()
+    return doi is not None
+
+
+@event.listens_for(DataSet, "after_insert")
+def _dataset_inserted(mapper, connection, target):
+    if _is_synchronized(connection, target.ds_meta_data_id):
+        StatCounterRepository.increment(connection, "datasets", 1)
+
+
+@event.listens_for(DataSet, "after_delete")
+def _dataset_deleted(mapper, connection, target):
+    if _is_synchronized(connection, target.ds_meta_data_id):
+        StatCounterRepository.increment(connection, "datasets", -1)
+
+
+@event.listens_for(DSMetaData, "before_update")
+def _dataset_doi_changed(mapper, connection, target):
+    if not inspect(target).attrs.dataset_doi.history.has_changes():
+        return
+    # The old DOI may not be loaded in the session, but the row still holds it
+    was_synchronized = _is_synchronized(connection, target.id)
+    if was_synchronized == (target.dataset_doi is not None):
+        return
+    has_dataset = connection.execute(select(DataSet.id).where(DataSet.ds_meta_data_id == target.id)).first()
+    if has_dataset:
+        StatCounterRepository.increment(connection, "datasets", -1 if was_synchronized else 1)
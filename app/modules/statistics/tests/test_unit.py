@@ -0,0 +1,178 @@
+import pytest
+from sqlalchemy.dialects import mysql
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSDownloadRecord, DSMetaData, DSViewRecord, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.statistics.repositories import StatCounterRepository
+from app.modules.statistics.services import StatisticsService, statistics_cache
+from app.modules.statistics.tracking import TRACKED_RECORDS, RecordTracker, count_recorded, insert_ignoring_duplicates
+from core.buffering.write_behind import WriteBehindBuffer
+from core.caching.cache import LRUCache
+
+
+@pytest.fixture(scope="module")
+def test_client(test_client):
+    """
+    Extends the test_client fixture to add additional specific data for module testing.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email="test@example.com").first()
+        for i, doi in enumerate(["10.1234/stats0", None]):
+            meta = DSMetaData(
+                title=f"Stats {i}",
+                description="stats",
+                publication_type=PublicationType.NONE,
+                dataset_doi=doi,
+                tags="stats",
+            )
+            db.session.add(meta)
+            db.session.flush()
+            dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+            fm_meta = FMMetaData(
+                car_filename=f"stats{i}.car", title="stats", description="stats", publication_type=PublicationType.NONE
+            )
+            db.session.add_all([dataset, fm_meta])
+            db.session.flush()
+            db.session.add(FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id))
+            db.session.add(DSViewRecord(dataset_id=dataset.id, view_cookie=f"view{i}"))
+        db.session.commit()
+    statistics_cache.clear()
+
+    yield test_client
+
+
+def test_counters_follow_records(test_client):
+    repository = StatCounterRepository()
+    counters = repository.get_all()
+    assert counters["datasets"] == 1
+    assert counters["feature_models"] == 2
+    assert counters["dataset_views"] == 2
+    assert counters["dataset_downloads"] == 0
+
+    dataset = DataSet.query.first()
+    db.session.add(DSDownloadRecord(dataset_id=dataset.id, download_cookie="download"))
+    db.session.commit()
+    assert repository.get_all()["dataset_downloads"] == 1
+    assert repository.get_all() == repository.recompute()
+
+
+def test_publishing_a_dataset_counts_it(test_client):
+    meta = DSMetaData.query.filter_by(dataset_doi=None).first()
+    meta.dataset_doi = "10.1234/stats1"
+    db.session.commit()
+    assert StatCounterRepository().get_all()["datasets"] == 2
+
+    meta.dataset_doi = None
+    db.session.commit()
+    assert StatCounterRepository().get_all()["datasets"] == 1
+
+
+def test_homepage_stats_are_cached(test_client):
+    cache = LRUCache(maxsize=1, ttl=60)
+    service = StatisticsService(cache=cache)
+    views = service.homepage_stats()["total_dataset_views"]
+
+    db.session.add(DSViewRecord(dataset_id=DataSet.query.first().id, view_cookie="cached"))
+    db.session.commit()
+    assert service.homepage_stats()["total_dataset_views"] == views
+
+    cache.clear()
+    assert service.homepage_stats()["total_dataset_views"] == views + 1
+
+
+def test_index_renders_statistics(test_client):
+    response = test_client.get("/")
+    assert response.status_code == 200
+    assert test_client.get("/statistics").get_json()["feature_models"] == 2
+
+
+def test_tracker_deduplicates_and_writes_in_batches(test_client):
+    tracker = RecordTracker(batch_size=100, interval=3600)
+    tracker.configure(test_client.application)
+    dataset = DataSet.query.first()
+    views = StatCounterRepository().get_all()["dataset_views"]
+
+    assert tracker.track("dataset_view", dataset.id, "batched-a")
+    assert not tracker.track("dataset_view", dataset.id, "batched-a")
+    assert tracker.track("dataset_view", dataset.id, "batched-b")
+    assert tracker.track("dataset_view", dataset.id, "view0")  # already in the database
+    assert DSViewRecord.query.filter(DSViewRecord.view_cookie.like("batched-%")).count() == 0
+
+    assert tracker.flush() == 3
+    assert DSViewRecord.query.filter(DSViewRecord.view_cookie.like("batched-%")).count() == 2
+    assert DSViewRecord.query.filter_by(view_cookie="view0").count() == 1
+    assert StatCounterRepository().get_all()["dataset_views"] == views + 2
+
+
+def test_tracker_remembers_only_written_triples(test_client, monkeypatch):
+    tracker = RecordTracker(batch_size=100, interval=3600)
+    tracker.configure(test_client.application)
+    tracker.buffer.max_pending = 1
+    dataset = DataSet.query.first()
+
+    def unavailable(record, rows):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(RecordTracker, "_insert_new", staticmethod(unavailable))
+    assert tracker.track("dataset_view", dataset.id, "dropped-a")
+    assert tracker.track("dataset_view", dataset.id, "dropped-b")
+    # The batch fails: "dropped-a" is put back, "dropped-b" does not fit and is dropped
+    assert tracker.flush() == 0
+    assert len(tracker.buffer) == 1
+    assert len(tracker.seen) == 0
+
+    monkeypatch.undo()
+    assert not tracker.track("dataset_view", dataset.id, "dropped-a")  # still waiting
+    assert tracker.track("dataset_view", dataset.id, "dropped-b")
+    assert tracker.flush() == 2
+    assert not tracker.track("dataset_view", dataset.id, "dropped-b")
+    assert DSViewRecord.query.filter(DSViewRecord.view_cookie.like("dropped-%")).count() == 2
+
+
+def test_failed_batches_are_retried():
+    written = []
+
+    def flush_batch(rows):
+        if not written:
+            written.append(None)
+            raise RuntimeError("database unavailable")
+        written.extend(rows)
+
+    buffer = WriteBehindBuffer(flush_batch, batch_size=10, interval=3600)
+    buffer.add("a", 1)
+    assert buffer.flush() == 0
+    assert len(buffer) == 1
+    assert buffer.flush() == 1
+    assert written == [None, 1]
+
+
+def test_concurrent_trackers_record_a_triple_once(test_client):
+    workers = [RecordTracker(batch_size=100, interval=3600) for _ in range(2)]
+    dataset = DataSet.query.first()
+    views = StatCounterRepository().get_all()["dataset_views"]
+
+    for tracker in workers:
+        tracker.configure(test_client.application)
+        tracker.track("dataset_view", dataset.id, "shared-cookie")
+        tracker.flush()
+
+    assert DSViewRecord.query.filter_by(view_cookie="shared-cookie").count() == 1
+    assert StatCounterRepository().get_all()["dataset_views"] == views + 1
+
+
+def test_mariadb_skips_only_duplicates(test_client):
+    record = TRACKED_RECORDS["dataset_view"]
+    statement = str(insert_ignoring_duplicates(record.model.__table__, "mariadb").compile(dialect=mysql.dialect()))
+    # INSERT IGNORE would also turn foreign key, NOT NULL and truncation errors into warnings
+    assert "IGNORE" not in statement
+    assert statement.endswith("ON DUPLICATE KEY UPDATE id = ds_view_record.id")
+
+    dataset = DataSet.query.first()
+    rows = [
+        {"user_id": None, "dataset_id": dataset.id, "view_cookie": "view0"},
+        {"user_id": 1, "dataset_id": dataset.id, "view_cookie": "view0"},
+        {"user_id": None, "dataset_id": dataset.id, "view_cookie": "never-seen"},
+    ]
+    assert db.session.execute(count_recorded(record, rows)).scalar() == 1
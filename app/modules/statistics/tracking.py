@@ -0,0 +1,133 @@
+from collections import defaultdict, namedtuple
+from datetime import datetime, timezone
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.modules.dataset.models import DSDownloadRecord, DSViewRecord
+from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+from app.modules.statistics.repositories import StatCounterRepository
+from core.buffering.write_behind import WriteBehindBuffer
+from core.caching.cache import LRUCache
+
+TrackedRecord = namedtuple("TrackedRecord", "model object_column date_column cookie_column counter")
+
+TRACKED_RECORDS = {
+    "dataset_view": TrackedRecord(DSViewRecord, "dataset_id", "view_date", "view_cookie", "dataset_views"),
+    "dataset_download": TrackedRecord(
+        DSDownloadRecord, "dataset_id", "download_date", "download_cookie", "dataset_downloads"
+    ),
+    "file_view": TrackedRecord(HubfileViewRecord, "file_id", "view_date", "view_cookie", "feature_model_views"),
+    "file_download": TrackedRecord(
+        HubfileDownloadRecord, "file_id", "download_date", "download_cookie", "feature_model_downloads"
+    ),
+}
+
+
+class RecordTracker:
+    """
+    Write-behind tracking of dataset and file views and downloads.
+
+    A (user, object, cookie) triple is recorded once: repeats are dropped in memory, recently written triples
+    are remembered so they never reach the database again, and each batch is written with one INSERT per
+    record type that skips the triples the database already holds.
+    """
+
+    def __init__(self, batch_size: int = None, interval: float = None, seen_size: int = 100_000):
+        # Unset batch size and interval are read from the app config (TRACKING_*) on first use
+        self.batch_size = batch_size
+        self.interval = interval
+        self.buffer = WriteBehindBuffer(self._write, name="record-tracker")
+        self.seen = LRUCache(maxsize=seen_size)
+        self.app = None
+
+    def configure(self, app):
+        self.app = app
+        if self.batch_size is None:
+            self.buffer.batch_size = app.config.get("TRACKING_BATCH_SIZE", self.buffer.batch_size)
+        else:
+            self.buffer.batch_size = self.batch_size
+        self.buffer.interval = (
+            app.config.get("TRACKING_FLUSH_INTERVAL", 2.0) if self.interval is None else self.interval
+        )
+
+    def track(self, kind: str, object_id: int, cookie: str, user_id: Optional[int] = None) -> bool:
+        """Record a view or download; returns False when it was already recorded."""
+        record = TRACKED_RECORDS[kind]
+        key = (kind, user_id, object_id, cookie)
+        if self.seen.get(key):
+            return False
+        if self.app is None:
+            self.configure(current_app._get_current_object())
+        row = {
+            "user_id": user_id,
+            record.object_column: object_id,
+            record.date_column: datetime.now(timezone.utc),
+            record.cookie_column: cookie,
+        }
+        return self.buffer.add(key, (key, row))
+
+    def flush(self) -> int:
+        return self.buffer.flush()
+
+    def _write(self, items):
+        by_kind = defaultdict(list)
+        for key, row in items:
+            by_kind[key[0]].append(row)
+
+        with self.app.app_context():
+            try:
+                for kind, rows in by_kind.items():
+                    self._insert_new(TRACKED_RECORDS[kind], rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+        # Only now: a triple whose batch failed or was dropped is tracked again the next time it is seen
+        for key, _ in items:
+            self.seen.set(key, True)
+
+    @staticmethod
+    def _insert_new(record: TrackedRecord, rows):
+        # Single statement: the unique (object, cookie, user) index drops the triples already recorded
+        connection = db.session.connection()
+        statement = insert_ignoring_duplicates(record.model.__table__, connection.dialect.name)
+        if connection.dialect.name in ("mysql", "mariadb"):
+            # SQLAlchemy connects with the FOUND_ROWS flag, so the rowcount includes the duplicates. Both counts
+            # read the transaction's REPEATABLE READ snapshot: a triple another worker records meanwhile is a
+            # duplicate here but not in the second count, so only that worker counts it
+            recorded = count_recorded(record, rows)
+            before = connection.execute(recorded).scalar()
+            connection.execute(statement, rows)
+            inserted = connection.execute(recorded).scalar() - before
+        else:
+            inserted = connection.execute(statement, rows).rowcount
+        if inserted > 0:
+            StatCounterRepository.increment(connection, record.counter, inserted)
+
+
+def insert_ignoring_duplicates(table, dialect_name: str):
+    """
+    INSERT that skips rows violating a unique index: ON DUPLICATE KEY UPDATE id = id on MariaDB/MySQL, which
+    unlike INSERT IGNORE still raises every other error, and ON CONFLICT DO NOTHING on SQLite.
+    """
+    if dialect_name in ("mysql", "mariadb"):
+        return mysql_insert(table).on_duplicate_key_update(id=table.c.id)
+    return sqlite_insert(table).on_conflict_do_nothing()
+
+
+def count_recorded(record: TrackedRecord, rows):
+    """How many of the rows' (object, cookie, user) triples are already recorded."""
+    table = record.model.__table__
+    triples = {(row[record.object_column], row[record.cookie_column], row["user_id"] or 0) for row in rows}
+    key = tuple_(table.c[record.object_column], table.c[record.cookie_column], table.c.user_key)
+    return select(func.count()).select_from(table).where(key.in_(triples))
+
+
+record_tracker = RecordTracker()
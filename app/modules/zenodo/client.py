@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Rate limiting and transient server errors; Retry-After is honoured when Zenodo sends it
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Spaces out calls, from any thread, so that at most `rate` of them start per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RateLimitedRetry(Retry):
+    """
+    urllib3 re-sends a failed request without going back through the adapter, so each retry waits for the
+    rate limiter itself, after its backoff.
+    """
+
+    def __init__(self, *args, rate_limiter: RateLimiter = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.rate_limiter = self.rate_limiter
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """Waits for the rate limiter before sending a request, redirects included."""
+
+    def __init__(self, rate_limiter: RateLimiter = None, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, *args, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+        return super().send(request, *args, **kwargs)
+
+
+def build_session(
+    pool_size: int = None, retries: int = None, backoff_factor: float = None, rate_limit: float = None
+) -> requests.Session:
+    """
+    HTTP session for the Zenodo API: keeps up to `pool_size` connections alive per host, retries failed
+    requests with exponential backoff (`backoff_factor` * 2 ** (attempt - 1) seconds) and, with a
+    `rate_limit`, sends at most that many requests per second.
+    """
+    pool_size = int(os.getenv("ZENODO_POOL_SIZE", "8")) if pool_size is None else pool_size
+    retries = int(os.getenv("ZENODO_MAX_RETRIES", "3")) if retries is None else retries
+    backoff_factor = float(os.getenv("ZENODO_BACKOFF_FACTOR", "0.5")) if backoff_factor is None else backoff_factor
+    if rate_limit is None:
+        rate_limit = float(os.getenv("ZENODO_RATE_LIMIT", "0"))
+
+    rate_limiter = RateLimiter(rate_limit) if rate_limit > 0 else None
+
+    retry = RateLimitedRetry(
+        total=retries,
+        status_forcelist=RETRY_STATUSES,
+        # POSTs are retried too: 429 and 503 are answered before anything is created, and a stray draft
+        # deposition is cheaper than a dataset left unpublished
+        allowed_methods=None,
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        rate_limiter=rate_limiter,
+    )
+    adapter = RateLimitedAdapter(rate_limiter, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Session shared by every ZenodoService of this process (a forked worker builds its own)."""
+    pid = os.getpid()
+    with _sessions_lock:
+        session = _sessions.get(pid)
+        if session is None:
+            session = _sessions[pid] = build_session()
+        return session
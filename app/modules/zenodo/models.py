@@ -1,5 +1,50 @@
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import Enum as SQLAlchemyEnum
+
 from app import db
 
 
 class Zenodo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+
+
+class ZenodoSyncStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    PUBLISHED = "published"
+    FAILED = "failed"
+
+
+class ZenodoSync(db.Model):
+    """Progress of the publication of a dataset on Zenodo, advanced stage by stage by the rq workers."""
+
+    __tablename__ = "zenodo_sync"
+    data_set_id = db.Column(db.Integer, db.ForeignKey("data_set.id"), primary_key=True, autoincrement=False)
+    status = db.Column(SQLAlchemyEnum(ZenodoSyncStatus), nullable=False, default=ZenodoSyncStatus.QUEUED)
+    # Stage running, or to resume from after a failure
+    stage = db.Column(db.String(20), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    job_id = db.Column(db.String(64))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    data_set = db.relationship(
+        "DataSet", backref=db.backref("zenodo_sync", uselist=False, cascade="all, delete-orphan")
+    )
+
+    def to_dict(self):
+        return {
+            "dataset_id": self.data_set_id,
+            "status": self.status.value,
+            "stage": self.stage,
+            "attempts": self.attempts,
+            "error": self.error,
+            "deposition_id": self.data_set.ds_meta_data.deposition_id,
+            "dataset_doi": self.data_set.ds_meta_data.dataset_doi,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f"ZenodoSync<{self.data_set_id}:{self.status.value}:{self.stage}>"
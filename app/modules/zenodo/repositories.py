@@ -1,7 +1,53 @@
-from app.modules.zenodo.models import Zenodo
+from datetime import datetime
+from typing import List, Optional
+
+from app.modules.dataset.models import DataSet, DSMetaData
+from app.modules.zenodo.models import Zenodo, ZenodoSync, ZenodoSyncStatus
 from core.repositories.BaseRepository import BaseRepository
 
 
 class ZenodoRepository(BaseRepository):
     def __init__(self):
         super().__init__(Zenodo)
+
+
+class ZenodoSyncRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(ZenodoSync)
+
+    def get_by_dataset(self, dataset_id: int):
+        return self.session.get(ZenodoSync, dataset_id)
+
+    def unfinished(self):
+        return self.model.query.filter(ZenodoSync.status != ZenodoSyncStatus.PUBLISHED).order_by(ZenodoSync.data_set_id)
+
+    def queued(self) -> List[ZenodoSync]:
+        """Queued syncs of datasets without a DOI."""
+        return (
+            self.model.query.join(DataSet, ZenodoSync.data_set_id == DataSet.id)
+            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
+            .filter(ZenodoSync.status == ZenodoSyncStatus.QUEUED, DSMetaData.dataset_doi.is_(None))
+            .all()
+        )
+
+    def unsynchronized_dataset_ids(
+        self, include_active: bool = False, stale_before: Optional[datetime] = None
+    ) -> List[int]:
+        """
+        Datasets without a DOI. Unless `include_active`, those queued or running on the workers are left out,
+        except the ones still running since before `stale_before`, whose worker must have died.
+        """
+        query = (
+            self.session.query(DataSet.id)
+            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
+            .outerjoin(ZenodoSync, ZenodoSync.data_set_id == DataSet.id)
+            .filter(DSMetaData.dataset_doi.is_(None))
+        )
+        if not include_active:
+            resumable = (ZenodoSync.status.is_(None)) | ZenodoSync.status.notin_(
+                [ZenodoSyncStatus.QUEUED, ZenodoSyncStatus.RUNNING]
+            )
+            if stale_before is not None:
+                resumable |= (ZenodoSync.status == ZenodoSyncStatus.RUNNING) & (ZenodoSync.updated_at < stale_before)
+            query = query.filter(resumable)
+        return [dataset_id for (dataset_id,) in query.order_by(DataSet.id)]
@@ -1,7 +1,15 @@
-from flask import render_template
+import logging
 
+from flask import abort, jsonify, render_template
+from flask_login import current_user, login_required
+
+from app.modules.dataset.models import DataSet
 from app.modules.zenodo import zenodo_bp
-from app.modules.zenodo.services import ZenodoService
+from app.modules.zenodo.services import ZenodoService, ZenodoSyncService
+
+logger = logging.getLogger(__name__)
+
+zenodo_sync_service = ZenodoSyncService()
 
 
 @zenodo_bp.route("/zenodo", methods=["GET"])
@@ -13,3 +21,32 @@ def index():
 def zenodo_test() -> dict:
     service = ZenodoService()
     return service.test_full_connection()
+
+
+@zenodo_bp.route("/zenodo/datasets/<int:dataset_id>/status", methods=["GET"])
+@login_required
+def sync_status(dataset_id):
+    dataset = DataSet.query.get_or_404(dataset_id)
+    if dataset.user_id != current_user.id:
+        abort(403)
+    sync = zenodo_sync_service.get_by_dataset(dataset_id)
+    if sync is None:
+        return jsonify({"dataset_id": dataset_id, "status": None, "dataset_doi": dataset.ds_meta_data.dataset_doi})
+    return jsonify(sync.to_dict())
+
+
+@zenodo_bp.route("/zenodo/datasets/<int:dataset_id>/sync", methods=["POST"])
+@login_required
+def resume_sync(dataset_id):
+    dataset = DataSet.query.get_or_404(dataset_id)
+    if dataset.user_id != current_user.id:
+        abort(403)
+    sync = zenodo_sync_service.get_by_dataset(dataset_id)
+    if dataset.ds_meta_data.dataset_doi or not zenodo_sync_service.is_resumable(sync):
+        return jsonify({"message": "The dataset is already published or being published"}), 409
+    try:
+        sync = zenodo_sync_service.enqueue(dataset)
+    except Exception as exc:
+        logger.exception(f"Exception while queueing dataset {dataset_id} for Zenodo {exc}")
+        return jsonify({"message": "The synchronization could not be queued, try again later"}), 503
+    return jsonify(sync.to_dict()), 202
@@ -1,21 +1,38 @@
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional
 
 import requests
 from dotenv import load_dotenv
-from flask import Response, jsonify
+from flask import Response, current_app, jsonify
 from flask_login import current_user
+from rq import Queue, Retry, get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
 
+from app import db
 from app.modules.dataset.models import DataSet
+from app.modules.dataset.services import DataSetArchiveService, DataSetService
 from app.modules.featuremodel.models import FeatureModel
-from app.modules.zenodo.repositories import ZenodoRepository
+from app.modules.hubfile.services import HubfileService
+from app.modules.zenodo.client import get_session
+from app.modules.zenodo.models import ZenodoSync, ZenodoSyncStatus
+from app.modules.zenodo.repositories import ZenodoRepository, ZenodoSyncRepository
+from core.caching.cache import LRUCache, get_redis_client
 from core.configuration.configuration import uploads_folder_name
+from core.jobs.context import job_app_context
 from core.services.BaseService import BaseService
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Deposition metadata by deposition URL, as (ETag, fetched at, deposition)
+zenodo_deposition_cache = LRUCache(maxsize=int(os.getenv("ZENODO_DEPOSITION_CACHE_SIZE", "1024")))
+
 
 class ZenodoService(BaseService):
 
@@ -36,12 +53,23 @@ class ZenodoService(BaseService):
     def get_zenodo_access_token(self):
         return os.getenv("ZENODO_ACCESS_TOKEN")
 
-    def __init__(self):
+    def __init__(
+        self, session: requests.Session = None, upload_concurrency: int = None, deposition_cache: LRUCache = None
+    ):
         super().__init__(ZenodoRepository())
         self.ZENODO_ACCESS_TOKEN = self.get_zenodo_access_token()
         self.ZENODO_API_URL = self.get_zenodo_url()
         self.headers = {"Content-Type": "application/json"}
         self.params = {"access_token": self.ZENODO_ACCESS_TOKEN}
+        # Pooled connections with retries on 429/5xx, shared by every service of the process
+        self.session = session or get_session()
+        self.timeout = float(os.getenv("ZENODO_TIMEOUT", "300"))
+        if upload_concurrency is None:
+            upload_concurrency = int(os.getenv("ZENODO_UPLOAD_CONCURRENCY", "4"))
+        self.upload_concurrency = max(1, upload_concurrency)
+        self.deposition_cache = deposition_cache if deposition_cache is not None else zenodo_deposition_cache
+        # Seconds a draft deposition is served from the cache before it is revalidated with its ETag
+        self.deposition_ttl = float(os.getenv("ZENODO_DEPOSITION_TTL", "60"))
 
     def test_connection(self) -> bool:
         """
@@ -50,7 +78,7 @@ class ZenodoService(BaseService):
         Returns:
             bool: True if the connection is successful, False otherwise.
         """
-        response = requests.get(self.ZENODO_API_URL, params=self.params, headers=self.headers)
+        response = self.session.get(self.ZENODO_API_URL, params=self.params, headers=self.headers, timeout=self.timeout)
         return response.status_code == 200
 
     def test_full_connection(self) -> Response:
@@ -82,7 +110,9 @@ class ZenodoService(BaseService):
             }
         }
 
-        response = requests.post(self.ZENODO_API_URL, json=data, params=self.params, headers=self.headers)
+        response = self.session.post(
+            self.ZENODO_API_URL, json=data, params=self.params, headers=self.headers, timeout=self.timeout
+        )
 
         if response.status_code != 201:
             return jsonify(
@@ -98,7 +128,7 @@ class ZenodoService(BaseService):
         data = {"name": "test_file.txt"}
         files = {"file": open(file_path, "rb")}
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
-        response = requests.post(publish_url, params=self.params, data=data, files=files)
+        response = self.session.post(publish_url, params=self.params, data=data, files=files, timeout=self.timeout)
         files["file"].close()  # Close the file after uploading
 
         logger.info(f"Publish URL: {publish_url}")
@@ -113,24 +143,51 @@ class ZenodoService(BaseService):
             success = False
 
         # Step 3: Delete the deposition
-        response = requests.delete(f"{self.ZENODO_API_URL}/{deposition_id}", params=self.params)
+        response = self.session.delete(
+            f"{self.ZENODO_API_URL}/{deposition_id}", params=self.params, timeout=self.timeout
+        )
 
         if os.path.exists(file_path):
             os.remove(file_path)
 
         return jsonify({"success": success, "messages": messages})
 
-    def get_all_depositions(self) -> dict:
+    def get_all_depositions(self) -> list:
         """
         Get all depositions from Zenodo.
 
         Returns:
-            dict: The response in JSON format with the depositions.
+            list: The depositions in JSON format, from every page.
         """
-        response = requests.get(self.ZENODO_API_URL, params=self.params, headers=self.headers)
-        if response.status_code != 200:
-            raise Exception("Failed to get depositions")
-        return response.json()
+        return list(self.iter_depositions())
+
+    def iter_depositions(self, page_size: int = None, **filters) -> Iterator[dict]:
+        """
+        Iterate over the depositions in Zenodo, one page request at a time.
+
+        Args:
+            page_size (int): Depositions per request (ZENODO_PAGE_SIZE by default).
+            filters: Other query parameters of the API, e.g. `status="published"`.
+
+        Yields:
+            dict: Each deposition in JSON format. It is also cached for `get_deposition`.
+        """
+        page_size = page_size or int(os.getenv("ZENODO_PAGE_SIZE", "100"))
+        params = {**self.params, **filters, "size": page_size, "page": 1}
+        while True:
+            response = self.session.get(self.ZENODO_API_URL, params=params, headers=self.headers, timeout=self.timeout)
+            if response.status_code != 200:
+                raise Exception("Failed to get depositions")
+            depositions = response.json()
+            now = time.monotonic()
+            for deposition in depositions:
+                self.deposition_cache.set(f"{self.ZENODO_API_URL}/{deposition['id']}", (None, now, deposition))
+                yield deposition
+            # Zenodo links the next page; without Link headers, a short page is the last one
+            last_page = "next" not in response.links if response.links else len(depositions) < page_size
+            if not depositions or last_page:
+                return
+            params["page"] += 1
 
     def create_new_deposition(self, dataset: DataSet) -> dict:
         """
@@ -172,7 +229,9 @@ class ZenodoService(BaseService):
 
         data = {"metadata": metadata}
 
-        response = requests.post(self.ZENODO_API_URL, params=self.params, json=data, headers=self.headers)
+        response = self.session.post(
+            self.ZENODO_API_URL, params=self.params, json=data, headers=self.headers, timeout=self.timeout
+        )
         if response.status_code != 201:
             error_message = f"Failed to create deposition. Error details: {response.json()}"
             raise Exception(error_message)
@@ -190,14 +249,48 @@ class ZenodoService(BaseService):
         Returns:
             dict: The response in JSON format with the details of the uploaded file.
         """
+        return self._upload(deposition_id, *self._feature_model_file(dataset, feature_model, user))
+
+    def upload_files(
+        self, dataset: DataSet, deposition_id: int, feature_models: Iterable[FeatureModel], user=None
+    ) -> List[dict]:
+        """
+        Upload the files of several feature models to a deposition, up to ZENODO_UPLOAD_CONCURRENCY at a time.
+
+        Returns:
+            list: The responses in JSON format, in the order of `feature_models`.
+
+        Raises:
+            Exception: The first upload that failed, once every upload has finished.
+        """
+        # Paths are resolved here: the worker threads only talk to Zenodo, without the app or database
+        files = [self._feature_model_file(dataset, feature_model, user) for feature_model in feature_models]
+        if len(files) <= 1 or self.upload_concurrency == 1:
+            return [self._upload(deposition_id, name, path) for name, path in files]
+        with ThreadPoolExecutor(max_workers=min(self.upload_concurrency, len(files))) as executor:
+            futures = [executor.submit(self._upload, deposition_id, name, path) for name, path in files]
+        return [future.result() for future in futures]
+
+    def _feature_model_file(self, dataset: DataSet, feature_model: FeatureModel, user=None):
         car_filename = feature_model.fm_meta_data.car_filename
-        data = {"name": car_filename}
-        user_id = current_user.id if user is None else user.id
-        file_path = os.path.join(uploads_folder_name(), f"user_{str(user_id)}", f"dataset_{dataset.id}/", car_filename)
-        files = {"file": open(file_path, "rb")}
+        hubfile = next((file for file in feature_model.files if file.name == car_filename), None)
+        if hubfile is not None:
+            file_path = HubfileService().get_path_by_hubfile(hubfile)
+        else:
+            user_id = current_user.id if user is None else user.id
+            file_path = os.path.join(
+                uploads_folder_name(), f"user_{str(user_id)}", f"dataset_{dataset.id}/", car_filename
+            )
+        return car_filename, file_path
 
+    def _upload(self, deposition_id: int, name: str, file_path: str) -> dict:
+        data = {"name": name}
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
-        response = requests.post(publish_url, params=self.params, data=data, files=files)
+        with open(file_path, "rb") as f:
+            response = self.session.post(
+                publish_url, params=self.params, data=data, files={"file": f}, timeout=self.timeout
+            )
+        self.deposition_cache.delete(f"{self.ZENODO_API_URL}/{deposition_id}")
         if response.status_code != 201:
             error_message = f"Failed to upload files. Error details: {response.json()}"
             raise Exception(error_message)
@@ -214,25 +307,63 @@ class ZenodoService(BaseService):
             dict: The response in JSON format with the details of the published deposition.
         """
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/actions/publish"
-        response = requests.post(publish_url, params=self.params, headers=self.headers)
+        response = self.session.post(publish_url, params=self.params, headers=self.headers, timeout=self.timeout)
+        self.deposition_cache.delete(f"{self.ZENODO_API_URL}/{deposition_id}")
         if response.status_code != 202:
             raise Exception("Failed to publish deposition")
         return response.json()
 
-    def get_deposition(self, deposition_id: int) -> dict:
+    def get_deposition(self, deposition_id: int, revalidate: bool = False) -> dict:
         """
         Get a deposition from Zenodo.
 
+        Published depositions never change and are served from the cache. Drafts are served from it for
+        ZENODO_DEPOSITION_TTL seconds, or never with `revalidate`; then a conditional request with their
+        ETag refreshes them, and Zenodo only sends them again if they changed.
+
         Args:
             deposition_id (int): The ID of the deposition in Zenodo.
+            revalidate (bool): Check with Zenodo that a cached draft is still current.
 
         Returns:
             dict: The response in JSON format with the details of the deposition.
         """
         deposition_url = f"{self.ZENODO_API_URL}/{deposition_id}"
-        response = requests.get(deposition_url, params=self.params, headers=self.headers)
+        cached = self.deposition_cache.get(deposition_url)
+        headers = self.headers
+        if cached is not None:
+            etag, fetched_at, deposition = cached
+            if is_published(deposition):
+                return deposition
+            if not revalidate and time.monotonic() - fetched_at < self.deposition_ttl:
+                return deposition
+            if etag:
+                headers = {**self.headers, "If-None-Match": etag}
+
+        response = self.session.get(deposition_url, params=self.params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached is not None:
+            self.deposition_cache.set(deposition_url, (etag, time.monotonic(), deposition))
+            return deposition
         if response.status_code != 200:
             raise Exception("Failed to get deposition")
+        deposition = response.json()
+        self.deposition_cache.set(deposition_url, (response.headers.get("ETag"), time.monotonic(), deposition))
+        return deposition
+
+    def get_deposition_files(self, deposition_id: int) -> List[dict]:
+        """
+        Get the files already uploaded to a deposition in Zenodo.
+
+        Args:
+            deposition_id (int): The ID of the deposition in Zenodo.
+
+        Returns:
+            list: The response in JSON format with one entry (filename, filesize, checksum) per file.
+        """
+        files_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
+        response = self.session.get(files_url, params=self.params, headers=self.headers, timeout=self.timeout)
+        if response.status_code != 200:
+            raise Exception("Failed to get deposition files")
         return response.json()
 
     def get_doi(self, deposition_id: int) -> str:
@@ -246,3 +377,207 @@ class ZenodoService(BaseService):
             str: The DOI of the deposition.
         """
         return self.get_deposition(deposition_id).get("doi")
+
+
+def is_published(deposition: dict) -> bool:
+    """Published depositions are immutable until someone unlocks them for editing in Zenodo."""
+    return bool(deposition.get("submitted")) and deposition.get("state") == "done"
+
+
+ZENODO_QUEUE = "zenodo"
+# Every stage can run again: each one first checks what Zenodo (or the database) already has
+SYNC_STAGES = ("deposit", "upload", "publish", "doi")
+
+
+def get_zenodo_queue() -> Optional[Queue]:
+    """rq queue of the Zenodo publication pipeline, or None when REDIS_URL is not configured."""
+    connection = get_redis_client()
+    if connection is None:
+        return None
+    return Queue(ZENODO_QUEUE, connection=connection)
+
+
+def run_sync_stage(dataset_id: int, stage: str):
+    """rq job: run one stage of the publication of a dataset, then enqueue the next one."""
+    job = get_current_job()
+    final_attempt = not (job and job.retries_left)
+    with job_app_context():
+        service = ZenodoSyncService()
+        next_stage = service.run_stage(dataset_id, stage, final_attempt=final_attempt)
+        if next_stage is not None:
+            service.enqueue_stage(dataset_id, next_stage)
+
+
+class ZenodoSyncService(BaseService):
+    """
+    Publishes datasets on Zenodo in the background: deposit, upload the files, publish and store the DOI.
+
+    Each stage is its own rq job with its own retries (ZENODO_JOB_RETRIES, ZENODO_JOB_RETRY_INTERVALS), and
+    the deposition id is stored as soon as Zenodo returns it, so a failed synchronization resumes where it
+    stopped. Without REDIS_URL the stages run inline, in the request that enqueued them.
+    """
+
+    def __init__(self, zenodo_service: ZenodoService = None, queue: Queue = None):
+        super().__init__(ZenodoSyncRepository())
+        self.zenodo_service = zenodo_service or ZenodoService()
+        self.queue = queue if queue is not None else get_zenodo_queue()
+        self.dataset_service = DataSetService()
+        self.retries = int(os.getenv("ZENODO_JOB_RETRIES", "5"))
+        self.retry_intervals = [
+            int(interval) for interval in os.getenv("ZENODO_JOB_RETRY_INTERVALS", "30,120,600,1800").split(",")
+        ]
+        self.job_timeout = int(os.getenv("ZENODO_JOB_TIMEOUT", "3600"))
+
+    def get_by_dataset(self, dataset_id: int) -> Optional[ZenodoSync]:
+        return self.repository.get_by_dataset(dataset_id)
+
+    def stale_before(self) -> datetime:
+        """A sync still running since before this moment outlived its job timeout: its worker died."""
+        return datetime.utcnow() - timedelta(seconds=self.job_timeout)
+
+    def is_resumable(self, sync: Optional[ZenodoSync]) -> bool:
+        if sync is None or sync.status == ZenodoSyncStatus.FAILED:
+            return True
+        if sync.status == ZenodoSyncStatus.QUEUED:
+            return not self.has_live_job(sync)
+        return sync.status == ZenodoSyncStatus.RUNNING and sync.updated_at < self.stale_before()
+
+    def has_live_job(self, sync: ZenodoSync) -> bool:
+        """Whether rq still holds a job that will run the sync; it is lost if Redis was down or flushed."""
+        if self.queue is None or not sync.job_id:
+            return False
+        try:
+            job = Job.fetch(sync.job_id, connection=self.queue.connection)
+        except NoSuchJobError:
+            return False
+        return job.get_status(refresh=False) not in (JobStatus.FAILED, JobStatus.STOPPED, JobStatus.CANCELED)
+
+    def unsynchronized_dataset_ids(self, include_active: bool = False) -> List[int]:
+        dataset_ids = self.repository.unsynchronized_dataset_ids(include_active, stale_before=self.stale_before())
+        if include_active:
+            return dataset_ids
+        stranded = [sync.data_set_id for sync in self.repository.queued() if not self.has_live_job(sync)]
+        return sorted(dataset_ids + stranded)
+
+    def enqueue(self, dataset: DataSet) -> ZenodoSync:
+        """Start or resume the publication of a dataset, from the stage it stopped at."""
+        sync = self._queued(dataset)
+        if self.queue is None:
+            self.run(dataset.id, sync.stage)
+        else:
+            self.enqueue_stage(dataset.id, sync.stage)
+        return sync
+
+    def sync(self, dataset: DataSet) -> ZenodoSync:
+        """Like `enqueue`, but always runs the remaining stages in this process."""
+        sync = self._queued(dataset)
+        self.run(dataset.id, sync.stage)
+        return sync
+
+    def _queued(self, dataset: DataSet) -> ZenodoSync:
+        sync = self.get_by_dataset(dataset.id)
+        if sync is None:
+            sync = self.repository.create(commit=False, data_set_id=dataset.id, stage=SYNC_STAGES[0])
+        sync.status = ZenodoSyncStatus.QUEUED
+        sync.error = None
+        db.session.commit()
+        return sync
+
+    def enqueue_stage(self, dataset_id: int, stage: str):
+        try:
+            job = self.queue.enqueue(
+                run_sync_stage,
+                dataset_id,
+                stage,
+                retry=Retry(max=self.retries, interval=self.retry_intervals) if self.retries else None,
+                job_timeout=self.job_timeout,
+                description=f"Zenodo {stage} of dataset {dataset_id}",
+            )
+        except Exception as exc:
+            # Nothing would ever run a sync left queued: mark it failed, so it can be resumed
+            self.repository.update(dataset_id, status=ZenodoSyncStatus.FAILED, stage=stage, error=str(exc))
+            raise
+        self.repository.update(dataset_id, job_id=job.id)
+        return job
+
+    def run(self, dataset_id: int, stage: str = SYNC_STAGES[0]):
+        """Run the remaining stages in this process. Failures are recorded, not raised."""
+        try:
+            while stage is not None:
+                stage = self.run_stage(dataset_id, stage, final_attempt=True)
+        except Exception as exc:
+            logger.exception(f"Exception while publishing dataset {dataset_id} in Zenodo {exc}")
+
+    def run_stage(self, dataset_id: int, stage: str, final_attempt: bool = True) -> Optional[str]:
+        """
+        Run one stage and return the next one, or None once the dataset is published.
+
+        A failure is recorded on the ZenodoSync row and raised again, so rq can retry the stage. After the
+        final attempt the synchronization is marked as failed, to be resumed later.
+        """
+        sync = self.get_by_dataset(dataset_id)
+        if sync is None:
+            raise ValueError(f"Dataset {dataset_id} is not queued for Zenodo")
+        sync.status = ZenodoSyncStatus.RUNNING
+        sync.stage = stage
+        sync.attempts += 1
+        db.session.commit()
+
+        try:
+            getattr(self, f"_{stage}")(sync.data_set)
+        except Exception as exc:
+            db.session.rollback()
+            sync.status = ZenodoSyncStatus.FAILED if final_attempt else ZenodoSyncStatus.QUEUED
+            sync.error = str(exc)
+            db.session.commit()
+            raise
+
+        next_index = SYNC_STAGES.index(stage) + 1
+        if next_index == len(SYNC_STAGES):
+            sync.status = ZenodoSyncStatus.PUBLISHED
+            sync.error = None
+            db.session.commit()
+            self._build_archive(sync.data_set)
+            return None
+        sync.stage = SYNC_STAGES[next_index]
+        db.session.commit()
+        return sync.stage
+
+    def _deposit(self, dataset: DataSet):
+        if dataset.ds_meta_data.deposition_id:
+            return
+        deposition = self.zenodo_service.create_new_deposition(dataset)
+        if not deposition.get("conceptrecid"):
+            raise Exception(f"Zenodo did not return a deposition: {deposition}")
+        self.dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition.get("id"))
+
+    def _upload(self, dataset: DataSet):
+        deposition_id = dataset.ds_meta_data.deposition_id
+        uploaded = {file.get("filename") for file in self.zenodo_service.get_deposition_files(deposition_id)}
+        pending = [
+            feature_model
+            for feature_model in dataset.feature_models
+            if feature_model.fm_meta_data.car_filename not in uploaded
+        ]
+        self.zenodo_service.upload_files(dataset, deposition_id, pending, user=dataset.user)
+
+    def _publish(self, dataset: DataSet):
+        deposition_id = dataset.ds_meta_data.deposition_id
+        if not self.zenodo_service.get_deposition(deposition_id, revalidate=True).get("submitted"):
+            self.zenodo_service.publish_deposition(deposition_id)
+
+    def _doi(self, dataset: DataSet):
+        deposition_doi = self.zenodo_service.get_doi(dataset.ds_meta_data.deposition_id)
+        if not deposition_doi:
+            raise Exception("Zenodo has not assigned a DOI yet")
+        self.dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
+
+    def _build_archive(self, dataset: DataSet):
+        if not current_app.config.get("DATASET_ARCHIVE_ON_PUBLISH"):
+            return
+        archive_service = DataSetArchiveService()
+        if archive_service.is_cacheable(dataset):
+            try:
+                archive_service.get_or_build(dataset)
+            except Exception as exc:
+                logger.exception(f"Exception while building the archive of dataset {dataset.id}: {exc}")
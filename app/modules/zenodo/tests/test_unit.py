@@ -0,0 +1,401 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from click.testing import CliRunner
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.conftest import login, logout
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.zenodo.client import build_session
+from app.modules.zenodo.models import ZenodoSync, ZenodoSyncStatus
+from app.modules.zenodo.routes import zenodo_sync_service
+from app.modules.zenodo.services import (
+    ZenodoService,
+    ZenodoSyncService,
+    run_sync_stage,
+    zenodo_deposition_cache,
+)
+from core.caching.cache import LRUCache
+from rosemary.commands.zenodo_sync import zenodo_sync
+
+FILES = 6
+LISTED = 25
+
+
+class FakeZenodo(BaseHTTPRequestHandler):
+    """
+    Deposition API for a single deposition. It rate-limits the first file upload, can reject the first
+    publication, and records how many uploads overlap.
+    """
+
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls, reject_publish=False):
+        cls.created = 0
+        cls.uploads = []
+        cls.in_flight = 0
+        cls.max_in_flight = 0
+        cls.rate_limited = False
+        cls.reject_publish = reject_publish
+        cls.submitted = False
+        cls.deposition_requests = 0
+        cls.pages = 0
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=None, headers=None):
+        payload = json.dumps({} if body is None else body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        cls = type(self)
+        url = urlparse(self.path)
+        if url.path.endswith("/files"):
+            with cls.lock:
+                return self.reply(200, [{"filename": name} for name in cls.uploaded_names()])
+        if url.path.endswith("/depositions"):
+            query = parse_qs(url.query)
+            page, size = int(query["page"][0]), int(query["size"][0])
+            cls.pages += 1
+            ids = range((page - 1) * size, min(page * size, LISTED))
+            return self.reply(200, [{"id": 100 + i, "submitted": True, "state": "done"} for i in ids])
+        cls.deposition_requests += 1
+        etag = f'"{cls.submitted}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        deposition = {"id": 1, "submitted": cls.submitted, "state": "done" if cls.submitted else "unsubmitted"}
+        deposition["doi"] = "10.5281/zenodo.1" if cls.submitted else None
+        self.reply(200, deposition, headers={"ETag": etag})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        cls = type(self)
+        path = self.path.split("?")[0]
+        if path.endswith("/actions/publish"):
+            if cls.reject_publish:
+                cls.reject_publish = False
+                return self.reply(400, {"message": "Validation error"})
+            cls.submitted = True
+            return self.reply(202, {"id": 1, "submitted": True})
+        if not path.endswith("/files"):
+            cls.created += 1
+            return self.reply(201, {"id": 1, "conceptrecid": "1"})
+        with cls.lock:
+            if not cls.rate_limited:
+                cls.rate_limited = True
+                return self.reply(429, headers={"Retry-After": "0"})
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+            cls.uploads.append(body)
+        self.reply(201, {"filename": "uploaded"})
+
+    @classmethod
+    def uploaded_names(cls):
+        return [f"zenodo{i}.car" for i in range(FILES) if any(f'"zenodo{i}.car"'.encode() in b for b in cls.uploads)]
+
+
+class FakeQueue:
+    connection = None
+
+    def __init__(self):
+        self.jobs = []
+        self.enqueued = 0
+
+    def enqueue(self, func, *args, **kwargs):
+        self.jobs.append((func, args, kwargs))
+        self.enqueued += 1
+        return type("Job", (), {"id": f"job-{self.enqueued}"})()
+
+
+@pytest.fixture(scope="module")
+def test_client(test_client):
+    """
+    Extends the test_client fixture to add additional specific data for module testing.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email="test@example.com").first()
+        for title in ("Zenodo", "Pipeline", "Queued", "Command", "Stalled"):
+            meta = DSMetaData(title=title, description="zenodo", publication_type=PublicationType.NONE, tags="zenodo")
+            db.session.add(meta)
+            db.session.flush()
+            dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+            db.session.add(dataset)
+            db.session.flush()
+            for i in range(FILES):
+                fm_meta = FMMetaData(
+                    car_filename=f"zenodo{i}.car",
+                    title="zenodo",
+                    description="zenodo",
+                    publication_type=PublicationType.NONE,
+                )
+                db.session.add(fm_meta)
+                db.session.flush()
+                db.session.add(FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id))
+        db.session.commit()
+
+    yield test_client
+
+
+@pytest.fixture
+def fake_zenodo():
+    FakeZenodo.reset()
+    zenodo_deposition_cache.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeZenodo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/api/deposit/depositions"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def dataset_with_files(title, tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    dataset = DataSet.query.join(DSMetaData).filter(DSMetaData.title == title).one()
+    folder = tmp_path / f"user_{dataset.user_id}" / f"dataset_{dataset.id}"
+    folder.mkdir(parents=True)
+    for feature_model in dataset.feature_models:
+        (folder / feature_model.fm_meta_data.car_filename).write_bytes(b"Company: ACME\n")
+    return dataset
+
+
+def zenodo_service(url, deposition_cache=None):
+    service = ZenodoService(
+        session=build_session(pool_size=2, retries=2, backoff_factor=0),
+        upload_concurrency=2,
+        deposition_cache=deposition_cache,
+    )
+    service.ZENODO_API_URL = url
+    return service
+
+
+def test_sample_assertion(test_client):
+    """
+    Sample test to verify that the test framework and environment are working correctly.
+    It does not communicate with the Flask application; it only performs a simple assertion to
+    confirm that the tests in this module can be executed.
+    """
+    greeting = "Hello, World!"
+    assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_upload_files_retries_and_bounds_concurrency(test_client, fake_zenodo, tmp_path, monkeypatch):
+    dataset = dataset_with_files("Zenodo", tmp_path, monkeypatch)
+
+    responses = zenodo_service(fake_zenodo).upload_files(dataset, 1, dataset.feature_models, user=dataset.user)
+
+    assert responses == [{"filename": "uploaded"}] * FILES
+    assert FakeZenodo.rate_limited
+    assert len(FakeZenodo.uploads) == FILES
+    assert FakeZenodo.max_in_flight == 2
+    assert len(FakeZenodo.uploaded_names()) == FILES
+
+
+def test_rate_limit_applies_to_retries(test_client, fake_zenodo, tmp_path, monkeypatch):
+    dataset = dataset_with_files("Zenodo", tmp_path, monkeypatch)
+    service = zenodo_service(fake_zenodo)
+    service.session = build_session(pool_size=2, retries=2, backoff_factor=0, rate_limit=1000)
+    rate_limiter = service.session.get_adapter(fake_zenodo).rate_limiter
+    waits = []
+    wait = rate_limiter.wait
+    monkeypatch.setattr(rate_limiter, "wait", lambda: waits.append(wait()))
+
+    service.upload_files(dataset, 1, dataset.feature_models, user=dataset.user)
+
+    # Every upload, plus the one re-sent by urllib3 after the 429
+    assert FakeZenodo.rate_limited
+    assert len(waits) == FILES + 1
+
+
+def test_failed_sync_resumes_from_its_stage(test_client, fake_zenodo, tmp_path, monkeypatch):
+    dataset = dataset_with_files("Pipeline", tmp_path, monkeypatch)
+    FakeZenodo.reset(reject_publish=True)
+    # Without Redis the stages run inline
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    service = ZenodoSyncService(zenodo_service=zenodo_service(fake_zenodo))
+
+    sync = service.enqueue(dataset)
+    assert sync.status == ZenodoSyncStatus.FAILED
+    assert sync.stage == "publish"
+    assert "Failed to publish" in sync.error
+    assert dataset.ds_meta_data.deposition_id == 1
+
+    sync = service.enqueue(dataset)
+    assert sync.status == ZenodoSyncStatus.PUBLISHED
+    assert dataset.ds_meta_data.dataset_doi == "10.5281/zenodo.1"
+    # Resumed at the publication: neither a second deposition nor a second upload
+    assert FakeZenodo.created == 1
+    assert len(FakeZenodo.uploads) == FILES
+
+
+def test_stages_run_as_chained_jobs(test_client, fake_zenodo, tmp_path, monkeypatch):
+    dataset = dataset_with_files("Queued", tmp_path, monkeypatch)
+    queue = FakeQueue()
+    monkeypatch.setattr("app.modules.zenodo.services.get_zenodo_queue", lambda: queue)
+    monkeypatch.setattr("app.modules.zenodo.services.ZenodoService", lambda: zenodo_service(fake_zenodo))
+
+    sync = ZenodoSyncService().enqueue(dataset)
+    assert sync.status == ZenodoSyncStatus.QUEUED
+
+    stages = []
+    while queue.jobs:
+        func, args, kwargs = queue.jobs.pop(0)
+        assert func is run_sync_stage
+        assert kwargs["retry"].max == 5
+        stages.append(args[1])
+        func(*args)
+
+    assert stages == ["deposit", "upload", "publish", "doi"]
+    db.session.refresh(sync)
+    assert sync.status == ZenodoSyncStatus.PUBLISHED
+    assert sync.job_id == "job-4"
+    assert dataset.ds_meta_data.dataset_doi == "10.5281/zenodo.1"
+
+    login(test_client, "test@example.com", "test1234")
+    response = test_client.get(f"/zenodo/datasets/{dataset.id}/status")
+    assert response.json["status"] == "published"
+    assert response.json["dataset_doi"] == "10.5281/zenodo.1"
+    assert test_client.post(f"/zenodo/datasets/{dataset.id}/sync").status_code == 409
+    logout(test_client)
+
+
+def test_stale_running_sync_can_be_resumed(test_client, monkeypatch):
+    dataset = DataSet.query.join(DSMetaData).filter(DSMetaData.title == "Stalled").one()
+    queue = FakeQueue()
+    monkeypatch.setattr(zenodo_sync_service, "queue", queue)
+    sync = ZenodoSync(data_set_id=dataset.id, status=ZenodoSyncStatus.RUNNING, stage="upload", attempts=1)
+    db.session.add(sync)
+    db.session.commit()
+
+    login(test_client, "test@example.com", "test1234")
+    assert test_client.post(f"/zenodo/datasets/{dataset.id}/sync").status_code == 409
+    assert dataset.id not in zenodo_sync_service.unsynchronized_dataset_ids()
+
+    # Its worker died: no update for longer than the job timeout
+    sync.updated_at = datetime.utcnow() - timedelta(seconds=zenodo_sync_service.job_timeout + 60)
+    db.session.commit()
+    assert dataset.id in zenodo_sync_service.unsynchronized_dataset_ids()
+    response = test_client.post(f"/zenodo/datasets/{dataset.id}/sync")
+    assert response.status_code == 202
+    assert response.json["status"] == "queued" and response.json["stage"] == "upload"
+    assert queue.jobs[0][1] == (dataset.id, "upload")
+    logout(test_client)
+
+
+def no_such_job(job_id, connection):
+    raise NoSuchJobError(job_id)
+
+
+def test_stranded_queued_sync_can_be_resumed(test_client, monkeypatch):
+    dataset = DataSet.query.join(DSMetaData).filter(DSMetaData.title == "Stalled").one()
+    sync = zenodo_sync_service.get_by_dataset(dataset.id)
+
+    # The fake queue's jobs are unknown to rq
+    monkeypatch.setattr(Job, "fetch", no_such_job)
+
+    class RedisDown(FakeQueue):
+        def enqueue(self, func, *args, **kwargs):
+            raise ConnectionError("Redis is down")
+
+    # Enqueueing fails: the sync is marked failed instead of being left queued forever
+    monkeypatch.setattr(zenodo_sync_service, "queue", RedisDown())
+    login(test_client, "test@example.com", "test1234")
+    assert test_client.post(f"/zenodo/datasets/{dataset.id}/sync").status_code == 503
+    db.session.refresh(sync)
+    assert sync.status == ZenodoSyncStatus.FAILED and sync.stage == "upload" and "Redis is down" in sync.error
+
+    queue = FakeQueue()
+    monkeypatch.setattr(zenodo_sync_service, "queue", queue)
+    assert test_client.post(f"/zenodo/datasets/{dataset.id}/sync").status_code == 202
+    assert sync.status == ZenodoSyncStatus.QUEUED
+
+    # Its job is still known to rq
+    scheduled = type("Job", (), {"get_status": lambda job, refresh=True: JobStatus.SCHEDULED})()
+    monkeypatch.setattr(Job, "fetch", lambda job_id, connection: scheduled)
+    assert test_client.post(f"/zenodo/datasets/{dataset.id}/sync").status_code == 409
+    assert dataset.id not in zenodo_sync_service.unsynchronized_dataset_ids()
+
+    # Its job was lost, e.g. Redis was flushed
+    monkeypatch.setattr(Job, "fetch", no_such_job)
+    assert dataset.id in zenodo_sync_service.unsynchronized_dataset_ids()
+    assert test_client.post(f"/zenodo/datasets/{dataset.id}/sync").status_code == 202
+    logout(test_client)
+
+    # Published elsewhere, so that the other tests leave it alone
+    dataset.ds_meta_data.dataset_doi = "10.5281/zenodo.stalled"
+    db.session.commit()
+
+
+def test_sync_command_publishes_and_checkpoints(test_client, fake_zenodo, tmp_path, monkeypatch):
+    dataset = dataset_with_files("Command", tmp_path, monkeypatch)
+    monkeypatch.setenv("ZENODO_API_URL", fake_zenodo)
+    monkeypatch.setenv("ZENODO_BACKOFF_FACTOR", "0")
+    checkpoint = tmp_path / "checkpoint.ndjson"
+    # The "Zenodo" dataset has no files: a previous run recorded it as failed
+    skipped = DataSet.query.join(DSMetaData).filter(DSMetaData.title == "Zenodo").one()
+    checkpoint.write_text(json.dumps({"dataset_id": skipped.id, "status": "failed", "stage": "upload"}) + "\n")
+
+    result = CliRunner().invoke(zenodo_sync, ["--workers", "2", "--rate", "100", "--checkpoint", str(checkpoint)])
+
+    assert result.exit_code == 0, result.output
+    assert "Published 1 of 1 datasets" in result.output
+    assert "1 skipped by the checkpoint" in result.output
+    db.session.expire_all()
+    assert db.session.get(DataSet, dataset.id).ds_meta_data.dataset_doi == "10.5281/zenodo.1"
+    lines = [json.loads(line) for line in checkpoint.read_text().splitlines()]
+    assert lines[-1] == {"dataset_id": dataset.id, "status": "published", "stage": "doi"}
+
+
+def test_depositions_are_cached_and_revalidated(test_client, fake_zenodo, monkeypatch):
+    monkeypatch.setenv("ZENODO_DEPOSITION_TTL", "3600")
+    service = zenodo_service(fake_zenodo, deposition_cache=LRUCache(maxsize=8))
+
+    assert service.get_deposition(1)["submitted"] is False
+    assert service.get_deposition(1)["submitted"] is False
+    assert FakeZenodo.deposition_requests == 1
+
+    # Unchanged: Zenodo answers 304 and the cached draft is kept
+    assert service.get_deposition(1, revalidate=True)["submitted"] is False
+    assert FakeZenodo.deposition_requests == 2
+
+    service.publish_deposition(1)
+    assert service.get_doi(1) == "10.5281/zenodo.1"
+    # Published depositions are never requested again
+    assert service.get_doi(1) == "10.5281/zenodo.1"
+    assert service.get_deposition(1, revalidate=True)["submitted"] is True
+    assert FakeZenodo.deposition_requests == 3
+
+
+def test_depositions_are_listed_page_by_page(test_client, fake_zenodo):
+    service = zenodo_service(fake_zenodo, deposition_cache=LRUCache(maxsize=64))
+
+    depositions = list(service.iter_depositions(page_size=10))
+
+    assert [deposition["id"] for deposition in depositions] == [100 + i for i in range(LISTED)]
+    assert FakeZenodo.pages == 3
+    assert service.get_deposition(124)["state"] == "done"
+    assert FakeZenodo.deposition_requests == 0
@@ -0,0 +1,59 @@
+from typing import Iterable, Iterator, Tuple
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+COMPRESSION_METHODS = {"stored": ZIP_STORED, "deflate": ZIP_DEFLATED}
+
+# Bytes read from each source file at a time; also bounds the output held in memory
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ChunkBuffer:
+    """Write-only, unseekable file object: ZipFile then writes data descriptors instead of seeking back."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(
+    entries: Iterable[Tuple[str, str]], compression: str = "deflate", chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Generate a ZIP archive of `(path, arcname)` entries chunk by chunk, without a temporary file.
+
+    Entries and archives over 4 GiB use ZIP64 records, which ZipFile adds from the size of each source file
+    and the offsets reached.
+    """
+    compress_type = COMPRESSION_METHODS[compression]
+    buffer = _ChunkBuffer()
+    with ZipFile(buffer, "w", compression=compress_type, allowZip64=True) as zipf:
+        for path, arcname in entries:
+            zinfo = ZipInfo.from_file(path, arcname, strict_timestamps=False)
+            zinfo.compress_type = compress_type
+            with open(path, "rb") as source, zipf.open(zinfo, "w") as dest:
+                while True:
+                    data = source.read(chunk_size)
+                    if not data:
+                        break
+                    dest.write(data)
+                    chunk = buffer.drain()
+                    if chunk:
+                        yield chunk
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    # The central directory is written when the archive is closed
+    chunk = buffer.drain()
+    if chunk:
+        yield chunk
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import os
+import threading
+from typing import Callable, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Collects rows in memory, dropping duplicates by key, and hands them to `flush_batch` in batches from a
+    background thread: every `interval` seconds, as soon as `batch_size` rows are waiting, and at interpreter
+    exit. With an interval of 0 every row is written synchronously instead.
+
+    A batch that fails is put back once there is room for it (up to `max_pending` rows), so a database blip
+    delays rows instead of losing them.
+    """
+
+    def __init__(
+        self,
+        flush_batch: Callable[[List], None],
+        batch_size: int = 500,
+        interval: float = 2.0,
+        max_pending: int = None,
+        name: str = "write-behind",
+    ):
+        self.flush_batch = flush_batch
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_pending = max_pending or 20 * self.batch_size
+        self.name = name
+        self._rows = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def add(self, key: Hashable, row) -> bool:
+        """Queue a row; returns False when a row with the same key is already waiting."""
+        if self.interval <= 0:
+            self.flush_batch([row])
+            return True
+        with self._lock:
+            if key in self._rows:
+                return False
+            self._rows[key] = row
+            full = len(self._rows) >= self.batch_size
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+        return True
+
+    def flush(self) -> int:
+        """Write every waiting row now; returns how many rows were written."""
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                pending, self._rows = self._rows, {}
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start : start + self.batch_size]
+                try:
+                    self.flush_batch([row for _, row in batch])
+                    written += len(batch)
+                except Exception as exc:
+                    self._requeue(batch, exc)
+        return written
+
+    def _requeue(self, batch, exc):
+        with self._lock:
+            room = self.max_pending - len(self._rows)
+            for key, row in batch[: max(room, 0)]:
+                self._rows.setdefault(key, row)
+        dropped = len(batch) - max(min(room, len(batch)), 0)
+        logger.error(f"{self.name}: flush of {len(batch)} rows failed ({exc}); {dropped} rows dropped")
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so each (gunicorn) worker process starts its own flusher
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def __len__(self):
+        return len(self._rows)
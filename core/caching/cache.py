@@ -0,0 +1,100 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from core.configuration.configuration import redis_url
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an optional per-entry time to live (in seconds)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """JSON cache on Redis. Connection errors are logged and treated as cache misses."""
+
+    def __init__(self, client, prefix: str, ttl: Optional[int] = None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key, default=None):
+        try:
+            raw = self.client.get(self._key(key))
+        except Exception as exc:
+            logger.warning(f"Redis cache get failed for {self._key(key)}: {exc}")
+            return default
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self._key(key), json.dumps(value), ex=self.ttl)
+        except Exception as exc:
+            logger.warning(f"Redis cache set failed for {self._key(key)}: {exc}")
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as exc:
+            logger.warning(f"Redis cache delete failed for {self._key(key)}: {exc}")
+
+
+def get_redis_client():
+    """Return a Redis client for REDIS_URL, or None when Redis is not configured or not installed."""
+    url = redis_url()
+    if not url:
+        return None
+    try:
+        import redis
+    except ImportError:
+        logger.warning("REDIS_URL is set but the 'redis' package is not installed")
+        return None
+    return redis.Redis.from_url(url)
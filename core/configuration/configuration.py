@@ -24,3 +24,7 @@ def is_develop():
 
 def is_production():
     return os.getenv("FLASK_ENV") == "production"
+
+
+def redis_url():
+    return os.getenv("REDIS_URL")
@@ -0,0 +1,43 @@
+import os
+from typing import Optional
+from urllib.parse import quote
+
+from flask import Response, current_app, send_file
+
+
+def uploads_root() -> str:
+    return os.path.abspath(os.path.join(os.getenv("WORKING_DIR", ""), "uploads"))
+
+
+def send_download(
+    path: str, download_name: str, mimetype: Optional[str] = None, etag: Optional[str] = None
+) -> Response:
+    """
+    Send a file from the uploads folder as an attachment.
+
+    With DOWNLOAD_OFFLOAD set, the response only carries headers telling the web server which file to send,
+    so the transfer (including Range and conditional requests) no longer occupies an app worker.
+    """
+    mode = current_app.config.get("DOWNLOAD_OFFLOAD")
+    path = os.path.abspath(path)
+    relative_path = os.path.relpath(path, uploads_root())
+    if not mode or relative_path.startswith(os.pardir):
+        return send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=download_name,
+            conditional=True,
+            etag=etag if etag is not None else True,
+        )
+
+    resp = Response(mimetype=mimetype or "application/octet-stream")
+    resp.headers.set("Content-Disposition", "attachment", filename=download_name)
+    if mode == "nginx":
+        prefix = current_app.config.get("DOWNLOAD_OFFLOAD_PREFIX", "/protected-uploads/").rstrip("/")
+        resp.headers["X-Accel-Redirect"] = f"{prefix}/{quote(relative_path.replace(os.sep, '/'))}"
+    elif mode == "sendfile":
+        resp.headers["X-Sendfile"] = path
+    else:
+        raise ValueError(f"Unknown download offload mode: {mode}")
+    return resp
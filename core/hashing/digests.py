@@ -0,0 +1,46 @@
+import hashlib
+from typing import BinaryIO, NamedTuple
+
+# Bytes hashed at a time: large enough to amortise the Python overhead, small enough to keep memory flat
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileDigests(NamedTuple):
+    md5: str
+    sha256: str
+    size: int
+
+
+class MultiHasher:
+    """Computes the MD5 (legacy checksum) and SHA-256 of a byte stream in a single pass."""
+
+    def __init__(self):
+        self._md5 = hashlib.md5(usedforsecurity=False)
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def update(self, data: bytes):
+        self._md5.update(data)
+        self._sha256.update(data)
+        self.size += len(data)
+
+    def digests(self) -> FileDigests:
+        return FileDigests(self._md5.hexdigest(), self._sha256.hexdigest(), self.size)
+
+
+def hash_file(path: str, chunk_size: int = CHUNK_SIZE) -> FileDigests:
+    hasher = MultiHasher()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.digests()
+
+
+def save_and_hash(stream: BinaryIO, path: str, chunk_size: int = CHUNK_SIZE) -> FileDigests:
+    """Write `stream` to `path`, hashing each chunk on its way to disk so the file never has to be re-read."""
+    hasher = MultiHasher()
+    with open(path, "wb") as out:
+        while chunk := stream.read(chunk_size):
+            hasher.update(chunk)
+            out.write(chunk)
+    return hasher.digests()
@@ -0,0 +1,12 @@
+from contextlib import nullcontext
+
+from flask import has_app_context
+
+
+def job_app_context():
+    """App context for code run by an rq worker, which imports the app but never pushes a context of its own."""
+    if has_app_context():
+        return nullcontext()
+    from app import app
+
+    return app.app_context()
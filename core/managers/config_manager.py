@@ -33,6 +33,19 @@ class Config:
     TIMEZONE = "Europe/Madrid"
     TEMPLATES_AUTO_RELOAD = True
     UPLOAD_FOLDER = "uploads"
+    # Views and downloads are written in batches of up to TRACKING_BATCH_SIZE every TRACKING_FLUSH_INTERVAL seconds
+    TRACKING_BATCH_SIZE = int(os.getenv("TRACKING_BATCH_SIZE", "500"))
+    TRACKING_FLUSH_INTERVAL = float(os.getenv("TRACKING_FLUSH_INTERVAL", "2"))
+    # Build the download archive of a dataset as soon as it is published, instead of on its first download
+    DATASET_ARCHIVE_ON_PUBLISH = os.getenv("DATASET_ARCHIVE_ON_PUBLISH", "False").lower() == "true"
+    # Hand file downloads over to the web server: "nginx" (X-Accel-Redirect to DOWNLOAD_OFFLOAD_PREFIX, an internal
+    # location aliasing the uploads folder) or "sendfile" (X-Sendfile). Empty serves them from the app.
+    DOWNLOAD_OFFLOAD = os.getenv("DOWNLOAD_OFFLOAD", "").lower()
+    DOWNLOAD_OFFLOAD_PREFIX = os.getenv("DOWNLOAD_OFFLOAD_PREFIX", "/protected-uploads/")
+    # Convert the files of a new dataset to Glencoe, SPLOT and DIMACS on the rq workers, instead of on first request
+    FLAMAPY_PRECOMPUTE_ON_UPLOAD = os.getenv("FLAMAPY_PRECOMPUTE_ON_UPLOAD", "False").lower() == "true"
+    # Seconds browsers and proxies may reuse a conversion, which never changes for a given file
+    FLAMAPY_ARTIFACT_MAX_AGE = int(os.getenv("FLAMAPY_ARTIFACT_MAX_AGE", "86400"))
 
 
 class DevelopmentConfig(Config):
@@ -49,6 +62,7 @@ class TestingConfig(Config):
         f"{os.getenv('MARIADB_TEST_DATABASE', 'default_db')}"
     )
     WTF_CSRF_ENABLED = False
+    TRACKING_FLUSH_INTERVAL = 0
 
 
 class ProductionConfig(Config):
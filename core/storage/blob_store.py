@@ -0,0 +1,97 @@
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from typing import Iterator, Optional
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    """
+    Files stored once, by the SHA-256 of their content, as `<root>/ab/cd/abcd...`.
+
+    Blobs are written to a temporary name next to their final one and renamed into place, so a blob that
+    exists is always complete. The store knows nothing about who uses a blob: reference counting and garbage
+    collection belong to its callers.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.path.join(os.getenv("WORKING_DIR", ""), "uploads", "blobs")
+
+    def path(self, sha256: str) -> str:
+        if not _SHA256_RE.match(sha256 or ""):
+            raise ValueError(f"Not a SHA-256 hex digest: {sha256!r}")
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def add(self, source_path: str, sha256: str, move: bool = True) -> bool:
+        """
+        Store the file at `source_path` (whose digest the caller has computed) under `sha256`, moving it into
+        the store or copying it. Returns False, without writing anything, when the blob is already stored.
+        """
+        path = self.path(sha256)
+        if os.path.exists(path):
+            if move:
+                os.remove(source_path)
+            return False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if move:
+            try:
+                os.replace(source_path, path)
+                return True
+            except OSError:
+                # Another file system: copy, then remove the source
+                pass
+        fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out, open(source_path, "rb") as source:
+                shutil.copyfileobj(source, out, 1024 * 1024)
+            os.replace(partial_path, path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        if move:
+            os.remove(source_path)
+        return True
+
+    def remove(self, sha256: str) -> bool:
+        try:
+            os.remove(self.path(sha256))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def set_aside(self, sha256: str) -> Optional[str]:
+        """
+        Rename a blob out of the way before deleting it, returning its new path (None if it was not stored).
+        Until it is discarded, `restore` can put it back.
+        """
+        path = self.path(sha256)
+        aside_path = f"{path}.{uuid.uuid4().hex}.deleting"
+        try:
+            os.rename(path, aside_path)
+        except FileNotFoundError:
+            return None
+        return aside_path
+
+    def restore(self, sha256: str, aside_path: str):
+        os.replace(aside_path, self.path(sha256))
+
+    def discard(self, aside_path: str):
+        try:
+            os.remove(aside_path)
+        except FileNotFoundError:
+            pass
+
+    def __iter__(self) -> Iterator[str]:
+        """SHA-256 of every stored blob."""
+        for _, _, files in os.walk(self.root):
+            for name in files:
+                if _SHA256_RE.match(name):
+                    yield name
@@ -0,0 +1,49 @@
+"""unique view and download records
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 18:02:44.615238
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+# table, object column, cookie column, unique index, statistics counter
+RECORD_TABLES = [
+    ('ds_download_record', 'dataset_id', 'download_cookie', 'uq_ds_download_record_dataset_cookie_user',
+     'dataset_downloads'),
+    ('ds_view_record', 'dataset_id', 'view_cookie', 'uq_ds_view_record_dataset_cookie_user', 'dataset_views'),
+    ('file_view_record', 'file_id', 'view_cookie', 'uq_file_view_record_file_cookie_user', 'feature_model_views'),
+    ('file_download_record', 'file_id', 'download_cookie', 'uq_file_download_record_file_cookie_user',
+     'feature_model_downloads'),
+]
+
+
+def upgrade():
+    for table, object_column, cookie_column, index, counter in RECORD_TABLES:
+        # Keep the first record of every (object, cookie, user) triple; the derived table lets MariaDB
+        # delete from the table it reads
+        op.execute(
+            f"DELETE FROM {table} WHERE id NOT IN (SELECT id FROM ("
+            f"SELECT MIN(id) AS id FROM {table} "
+            f"GROUP BY {object_column}, {cookie_column}, COALESCE(user_id, 0)) AS first_records)"
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('user_key', sa.Integer(),
+                                          sa.Computed('coalesce(user_id, 0)', persisted=True), nullable=True))
+            batch_op.create_index(index, [object_column, cookie_column, 'user_key'], unique=True)
+        op.execute(f"UPDATE stat_counter SET value = (SELECT COUNT(id) FROM {table}) WHERE name = '{counter}'")
+
+
+def downgrade():
+    for table, _, _, index, _ in reversed(RECORD_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(index)
+            batch_op.drop_column('user_key')
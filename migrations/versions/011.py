@@ -0,0 +1,54 @@
+"""file view cookie not null
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 23:12:05.318742
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Views recorded without a cookie never collided in the unique index: give each one its own cookie, so that
+    # they keep counting as separate views
+    file_view_record = sa.table('file_view_record', sa.column('id', sa.Integer), sa.column('view_cookie', sa.String))
+    op.execute(
+        file_view_record.update()
+        .where(file_view_record.c.view_cookie.is_(None))
+        .values(view_cookie=sa.literal('legacy-') + sa.cast(file_view_record.c.id, sa.String))
+    )
+    # SQLite rebuilds the table to change the column and cannot copy a generated column: drop user_key and its
+    # index around the change
+    with op.batch_alter_table('file_view_record', schema=None) as batch_op:
+        batch_op.drop_index('uq_file_view_record_file_cookie_user')
+        batch_op.drop_column('user_key')
+        batch_op.alter_column('view_cookie',
+               existing_type=sa.String(length=36),
+               nullable=False)
+    add_user_key()
+
+
+def downgrade():
+    with op.batch_alter_table('file_view_record', schema=None) as batch_op:
+        batch_op.drop_index('uq_file_view_record_file_cookie_user')
+        batch_op.drop_column('user_key')
+        batch_op.alter_column('view_cookie',
+               existing_type=sa.String(length=36),
+               nullable=True)
+    add_user_key()
+
+
+def add_user_key():
+    with op.batch_alter_table('file_view_record', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_key', sa.Integer(),
+                                      sa.Computed('coalesce(user_id, 0)', persisted=True), nullable=True))
+        batch_op.create_index('uq_file_view_record_file_cookie_user', ['file_id', 'view_cookie', 'user_key'],
+                              unique=True)
@@ -0,0 +1,60 @@
+import time
+
+import click
+
+from app.modules.car_check.check_car import DEFAULT_CHUNK_SIZE, RESULT_WRITERS, iter_car_examples_dir, write_results
+
+
+@click.command("car:check", help="Validates every .car file in a directory, optionally in parallel.")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=0),
+    default=1,
+    show_default=True,
+    help="Worker processes (0 = one per CPU).",
+)
+@click.option("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, show_default=True, help="Files per worker task.")
+@click.option("-o", "--output", type=click.Path(dir_okay=False), help="Stream the results to this file.")
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(sorted(RESULT_WRITERS)),
+    default="ndjson",
+    show_default=True,
+    help="Output file format: one JSON object per line, or a single JSON array.",
+)
+def car_check(directory, workers, chunk_size, output, output_format):
+    start = time.perf_counter()
+
+    results = iter_car_examples_dir(directory, workers=workers, chunk_size=chunk_size)
+    out = open(output, "w", encoding="utf-8") if output else None
+    if out:
+        results = write_results(results, out, fmt=output_format)
+
+    total = invalid = failed = 0
+    try:
+        for result in results:
+            total += 1
+            if "error" in result:
+                failed += 1
+                click.echo(click.style(f"{result['file']}: {result['error']}", fg="red"))
+            elif not result["valid"]:
+                invalid += 1
+                click.echo(click.style(f"{result['file']}: {'; '.join(result['errors'])}", fg="yellow"))
+    finally:
+        if out:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0
+    click.echo(
+        click.style(
+            f"Checked {total} files in {elapsed:.2f}s ({rate:.0f} files/s): "
+            f"{total - invalid - failed} valid, {invalid} invalid, {failed} unreadable.",
+            fg="green" if not (invalid or failed) else "yellow",
+        )
+    )
+    if output:
+        click.echo(click.style(f"Results written to {output}", fg="green"))
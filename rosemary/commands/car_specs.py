@@ -0,0 +1,16 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.car_check.services import CarSpecService
+
+
+@click.command("car:specs", help="Stores parsed car specs for uploaded files that do not have them yet.")
+@click.option("--rebuild", is_flag=True, help="Also re-parse specs stored by an older version of the checker.")
+@click.option("--batch-size", type=int, default=100, show_default=True, help="Files committed per batch.")
+@with_appcontext
+def car_specs(rebuild, batch_size):
+    click.echo(click.style("Backfilling car specs...", fg="yellow"))
+    created, refreshed, failed = CarSpecService().backfill(rebuild=rebuild, batch_size=batch_size)
+    click.echo(click.style(f"Created {created} specs, refreshed {refreshed}.", fg="green"))
+    if failed:
+        click.echo(click.style(f"{failed} files could not be parsed, see the log for details.", fg="red"))
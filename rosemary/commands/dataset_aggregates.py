@@ -0,0 +1,12 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.dataset.services import DataSetService
+
+
+@click.command("dataset:aggregates", help="Recomputes the stored file count and total size of every dataset.")
+@with_appcontext
+def dataset_aggregates():
+    click.echo(click.style("Recomputing dataset file aggregates...", fg="yellow"))
+    updated = DataSetService().refresh_file_aggregates()
+    click.echo(click.style(f"Updated {updated} datasets.", fg="green"))
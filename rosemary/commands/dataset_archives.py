@@ -0,0 +1,31 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.dataset.models import DataSet, DSMetaData
+from app.modules.dataset.services import DataSetArchiveService
+
+
+@click.command("dataset:archives", help="Pre-builds the download archives of published datasets and prunes the cache.")
+@click.option("--all", "all_datasets", is_flag=True, help="Also build the archives of unpublished datasets.")
+@click.option("--gc-only", is_flag=True, help="Only remove archives over the cache budget.")
+@with_appcontext
+def dataset_archives(all_datasets, gc_only):
+    service = DataSetArchiveService()
+    if not gc_only:
+        query = DataSet.query
+        if not all_datasets:
+            query = query.join(DSMetaData).filter(DSMetaData.dataset_doi.isnot(None))
+        built = 0
+        for dataset in query.order_by(DataSet.id).all():
+            if not service.is_cacheable(dataset):
+                # Too large to cache: always streamed on download
+                continue
+            try:
+                service.get_or_build(dataset)
+                built += 1
+            except OSError as exc:
+                click.echo(click.style(f"Dataset {dataset.id}: {exc}", fg="red"))
+        click.echo(click.style(f"{built} dataset archives are up to date.", fg="green"))
+
+    freed = service.collect_garbage()
+    click.echo(click.style(f"Freed {freed} bytes from {service.archive_dir}.", fg="green"))
@@ -0,0 +1,25 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.hubfile.services import HubfileService
+
+
+@click.command("hubfile:blobs", help="Maintains the content-addressed store of uploaded files.")
+@click.option("--migrate", is_flag=True, help="Move the files still stored per dataset into the blob store.")
+@click.option("--recount", is_flag=True, help="Recompute the reference count of every blob.")
+@click.option("--gc", is_flag=True, help="Remove the blobs no file refers to.")
+@with_appcontext
+def hubfile_blobs(migrate, recount, gc):
+    if not (migrate or recount or gc):
+        raise click.UsageError("Choose at least one of --migrate, --recount and --gc.")
+    service = HubfileService()
+    if migrate:
+        click.echo(click.style("Moving dataset files into the blob store...", fg="yellow"))
+        moved, duplicates = service.migrate_to_blob_store()
+        click.echo(click.style(f"Moved {moved} files ({duplicates} were duplicates).", fg="green"))
+    if recount:
+        updated = service.file_blob_repository.recompute_ref_counts()
+        click.echo(click.style(f"Recounted the references of {updated} blobs.", fg="green"))
+    if gc:
+        removed = service.collect_blob_garbage()
+        click.echo(click.style(f"Removed {removed} unreferenced blobs from {service.blob_store.root}.", fg="green"))
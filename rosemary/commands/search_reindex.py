@@ -0,0 +1,13 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.explore.search import SearchIndexService
+
+
+@click.command("search:reindex", help="Rebuilds the Explore search documents of every dataset.")
+@click.option("--batch-size", type=int, default=200, show_default=True, help="Datasets committed per batch.")
+@with_appcontext
+def search_reindex(batch_size):
+    click.echo(click.style("Reindexing datasets...", fg="yellow"))
+    indexed = SearchIndexService().reindex_all(batch_size=batch_size)
+    click.echo(click.style(f"Indexed {indexed} datasets.", fg="green"))
@@ -0,0 +1,12 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.statistics.services import StatisticsService
+
+
+@click.command("statistics:recompute", help="Recomputes the public statistics counters from their records.")
+@with_appcontext
+def statistics_recompute():
+    for name, value in StatisticsService().recompute().items():
+        click.echo(f"{name}: {value}")
+    click.echo(click.style("Statistics counters recomputed.", fg="green"))
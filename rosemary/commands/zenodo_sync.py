@@ -0,0 +1,106 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.modules.zenodo.client import build_session
+from app.modules.zenodo.services import ZenodoService, ZenodoSyncService, get_zenodo_queue
+
+
+def read_checkpoint(path):
+    """Outcome of the datasets processed by earlier runs, by dataset id (the last line wins)."""
+    outcomes = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    outcomes[entry["dataset_id"]] = entry["status"]
+    return outcomes
+
+
+@click.command("zenodo:sync", help="Publishes every dataset without a DOI on Zenodo, several at a time.")
+@click.option("-w", "--workers", type=int, default=4, show_default=True, help="Datasets published at a time.")
+@click.option("--rate", type=float, help="Maximum Zenodo requests per second [default: ZENODO_RATE_LIMIT or none].")
+@click.option("--checkpoint", type=click.Path(dir_okay=False), help="Record outcomes here and skip those recorded.")
+@click.option("--retry-failed", is_flag=True, help="Retry the datasets the checkpoint records as failed.")
+@click.option(
+    "--include-active",
+    is_flag=True,
+    help="Also take over datasets queued or running on the rq workers (stale runs are always retried).",
+)
+@click.option("--enqueue", "use_queue", is_flag=True, help="Queue the datasets for the rq workers instead.")
+@with_appcontext
+def zenodo_sync(workers, rate, checkpoint, retry_failed, include_active, use_queue):
+    outcomes = read_checkpoint(checkpoint)
+    unsynchronized = ZenodoSyncService().unsynchronized_dataset_ids(include_active=include_active)
+    dataset_ids = [
+        dataset_id
+        for dataset_id in unsynchronized
+        if dataset_id not in outcomes or (retry_failed and outcomes[dataset_id] != "published")
+    ]
+    skipped = len(unsynchronized) - len(dataset_ids)
+
+    if use_queue:
+        queue = get_zenodo_queue()
+        if queue is None:
+            raise click.UsageError("--enqueue needs REDIS_URL.")
+        service = ZenodoSyncService(queue=queue)
+        for dataset_id in dataset_ids:
+            service.enqueue(service.dataset_service.get_by_id(dataset_id))
+        click.echo(click.style(f"Queued {len(dataset_ids)} datasets for the rq workers.", fg="green"))
+        return
+
+    app = current_app._get_current_object()
+    upload_concurrency = ZenodoService().upload_concurrency
+    # One pooled, rate limited session for every thread, with a connection for each concurrent upload
+    session = build_session(pool_size=max(1, workers) * upload_concurrency, rate_limit=rate)
+
+    def publish(dataset_id):
+        with app.app_context():
+            service = ZenodoSyncService(zenodo_service=ZenodoService(session=session))
+            sync = service.sync(service.dataset_service.get_by_id(dataset_id))
+            return sync.status.value, sync.stage, sync.error
+
+    start = time.perf_counter()
+    published = failed = 0
+    out = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {executor.submit(publish, dataset_id): dataset_id for dataset_id in dataset_ids}
+        for future in as_completed(futures):
+            dataset_id = futures[future]
+            try:
+                status, stage, error = future.result()
+            except Exception as exc:
+                status, stage, error = "failed", None, str(exc)
+            if status == "published":
+                published += 1
+            else:
+                failed += 1
+                click.echo(click.style(f"Dataset {dataset_id} ({stage}): {error}", fg="red"))
+            if out:
+                out.write(json.dumps({"dataset_id": dataset_id, "status": status, "stage": stage}) + "\n")
+                out.flush()
+    except KeyboardInterrupt:
+        click.echo(click.style("Interrupted: waiting for the datasets being published.", fg="yellow"))
+        executor.shutdown(cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown()
+        if out:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    throughput = published / elapsed if elapsed > 0 else 0
+    click.echo(
+        click.style(
+            f"Published {published} of {len(dataset_ids)} datasets in {elapsed:.2f}s ({throughput:.2f} datasets/s): "
+            f"{failed} failed, {skipped} skipped by the checkpoint.",
+            fg="green" if not failed else "yellow",
+        )
+    )